@@ -0,0 +1,260 @@
+"""
+End-to-end latency of `ask` against the stand-in vendor server in bench/fake_vendor.py.
+
+Starts the fake server, then measures what a user waits for:
+  - cold start: `ask --help` in a fresh process
+  - one-off query: `ask <question>` in a fresh process, time to first output and to exit
+  - chat actions: a chat turn, a shell command and \\compress, run in this process.
+    `ask chat` needs a terminal for its prompt, so its actions are driven directly.
+
+For each it reports p50/p95 of wall time and time to first token, and the number of
+round trips to the vendor. The fake server's latency and token rate are fixed, so
+differences between runs come from `ask` itself. Runs in a throwaway HOME with the
+response cache off.
+
+    python bench/e2e.py
+    python bench/e2e.py --vendor openai --repeat 20 --latency-ms 100
+    python bench/e2e.py --json > e2e.json
+
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess as sp
+import urllib.request
+from pathlib import Path
+from contextlib import redirect_stdout
+
+ROOT_DIR = Path(__file__).parent.parent
+ASK_COMMAND = [sys.executable, "-c", "from src.cli import cli; cli()"]
+QUESTION = "how do I flatten a list of lists in python"
+# Long enough to be compressed, see COMPRESS_THRESHOLD
+LONG_MESSAGE = "Some earlier output that is worth keeping in short form. " * 12
+
+
+class Result:
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_s = []
+        self.ttft_s = []
+        self.round_trips = []
+
+    def to_dict(self) -> dict:
+        # The same percentiles as `ask stats` and `ask batch`, src is importable by now
+        from src.usage import percentile
+
+        return {
+            "name": self.name,
+            "runs": len(self.wall_s),
+            "wall_p50": percentile(self.wall_s, 50),
+            "wall_p95": percentile(self.wall_s, 95),
+            "ttft_p50": percentile(self.ttft_s, 50),
+            "ttft_p95": percentile(self.ttft_s, 95),
+            "round_trips": max(self.round_trips, default=None),
+        }
+
+
+class FakeVendor:
+    """
+    The fake vendor server, running in a subprocess
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.process = sp.Popen(
+            [
+                sys.executable,
+                str(Path(__file__).parent / "fake_vendor.py"),
+                "--port=0",
+                f"--latency-ms={args.latency_ms}",
+                f"--tokens-per-second={args.tokens_per_second}",
+                f"--output-tokens={args.output_tokens}",
+                "--seed=0",
+            ],
+            stdout=sp.PIPE,
+            text=True,
+        )
+        self.url = self.process.stdout.readline().strip()
+
+    def get_total_requests(self) -> int:
+        with urllib.request.urlopen(f"{self.url}/_fake/stats") as response:
+            return json.load(response)["total"]
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def get_env(vendor: str, url: str, home_dir: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("ANTHROPIC_", "OPENAI_"))}
+    env["HOME"] = home_dir
+    env.pop("ASK_TRACE", None)
+    env.pop("ASK_PROFILE", None)
+    if vendor == "anthropic":
+        env.update(ANTHROPIC_API_KEY="fake", ANTHROPIC_BASE_URL=url)
+    else:
+        env.update(OPENAI_API_KEY="fake", OPENAI_BASE_URL=f"{url}/v1")
+
+    return env
+
+
+def run_ask(args: list[str], env: dict) -> tuple[float, float | None]:
+    """
+    Run ask in a new process, returns the time until it exits and until its first output
+    """
+    start_time = time.perf_counter()
+    process = sp.Popen(
+        [*ASK_COMMAND, *args], cwd=ROOT_DIR, env=env, stdin=sp.DEVNULL, stdout=sp.PIPE
+    )
+    first_byte = process.stdout.read(1)
+    first_byte_s = time.perf_counter() - start_time if first_byte else None
+    process.stdout.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ask {' '.join(args)} exited with {process.returncode}")
+
+    return time.perf_counter() - start_time, first_byte_s
+
+
+def bench_cold_start(env: dict, repeat: int) -> Result:
+    result = Result("cold start (ask --help)")
+    for _ in range(repeat):
+        wall_s, _ = run_ask(["--help"], env)
+        result.wall_s.append(wall_s)
+
+    return result
+
+
+def bench_one_off(fake_vendor: FakeVendor, env: dict, repeat: int) -> Result:
+    result = Result("one-off query (ask <question>)")
+    for _ in range(repeat):
+        num_requests = fake_vendor.get_total_requests()
+        wall_s, first_byte_s = run_ask(["--no-cache", QUESTION], env)
+        result.wall_s.append(wall_s)
+        if first_byte_s is not None:
+            result.ttft_s.append(first_byte_s)
+
+        result.round_trips.append(fake_vendor.get_total_requests() - num_requests)
+
+    return result
+
+
+def bench_actions(fake_vendor: FakeVendor, vendor_name: str, repeat: int) -> list[Result]:
+    """
+    Run chat actions in this process, with their output thrown away.
+    Time to first token is that of the action's first vendor call, from the usage log.
+    """
+    from rich.console import Console
+
+    from src import vendors
+    from src.cache import disable_response_cache
+    from src.usage import current_action, get_usage_store
+    from src.schema import ChatState, ChatMessage, ChatMode, Role
+    from src.cli.chat.actions import ChatAction, ShellAction, CompressHistoryAction
+
+    disable_response_cache()
+    vendor = getattr(vendors, vendor_name)
+    model_option = vendor.DEFAULT_MODEL_OPTION
+    console = Console(file=io.StringIO(), width=100)
+
+    def make_state(messages: list[ChatMessage]) -> ChatState:
+        return ChatState(
+            mode=ChatMode.Chat, messages=messages, ssh_config=None, task_thread=[], task_slug=None
+        )
+
+    def make_history(num_messages: int) -> list[ChatMessage]:
+        roles = (Role.User, Role.Asssistant)
+        return [
+            ChatMessage(role=roles[idx % 2], content=f"{idx} {LONG_MESSAGE}")
+            for idx in range(num_messages)
+        ]
+
+    scenarios = [
+        ("chat turn", ChatAction(console, vendor, model_option), QUESTION, 4),
+        ("shell command", ShellAction(console, vendor, model_option), r"\shell say hello", 4),
+        (
+            "compress 24 messages",
+            CompressHistoryAction(console, vendor, model_option),
+            r"\compress",
+            24,
+        ),
+    ]
+    results = []
+    for name, action, query_text, num_messages in scenarios:
+        result = Result(name)
+        for _ in range(repeat):
+            state = make_state(make_history(num_messages))
+            num_requests = fake_vendor.get_total_requests()
+            started_at = time.time()
+            start_time = time.perf_counter()
+            # The shell action asks before running the command
+            stdin, sys.stdin = sys.stdin, io.StringIO("y\n")
+            try:
+                with redirect_stdout(io.StringIO()), current_action(type(action).__name__):
+                    action.run(query_text, state)
+            finally:
+                sys.stdin = stdin
+
+            result.wall_s.append(time.perf_counter() - start_time)
+            result.round_trips.append(fake_vendor.get_total_requests() - num_requests)
+            calls = get_usage_store().get_calls(started_at)
+            if calls and calls[0][7] is not None:
+                first_call_started_at, ttfb_ms = calls[0][0], calls[0][7]
+                result.ttft_s.append(first_call_started_at - started_at + ttfb_ms / 1000)
+
+        results.append(result)
+
+    return results
+
+
+def print_results(results: list[Result]):
+    def format_seconds(value: float | None) -> str:
+        return "" if value is None else f"{value:.3f}"
+
+    print(f"{'':<32} {'p50 s':>8} {'p95 s':>8} {'TTFT p50':>9} {'TTFT p95':>9} {'trips':>6}")
+    for result in results:
+        row = result.to_dict()
+        print(
+            f"{result.name:<32} {format_seconds(row['wall_p50']):>8} "
+            f"{format_seconds(row['wall_p95']):>8} {format_seconds(row['ttft_p50']):>9} "
+            f"{format_seconds(row['ttft_p95']):>9} {row['round_trips'] or '':>6}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--vendor", choices=["anthropic", "openai"], default="anthropic")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each scenario")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake time to first byte")
+    parser.add_argument("--tokens-per-second", type=float, default=100)
+    parser.add_argument("--output-tokens", type=int, default=60)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    fake_vendor = FakeVendor(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="ask-e2e-") as home_dir:
+            env = get_env(args.vendor, fake_vendor.url, home_dir)
+            results = [
+                bench_cold_start(env, args.repeat),
+                bench_one_off(fake_vendor, env, args.repeat),
+            ]
+            # Settings and the usage log are found through HOME, so it's set before importing src
+            os.environ.clear()
+            os.environ.update(env)
+            sys.path.insert(0, str(ROOT_DIR))
+            results.extend(bench_actions(fake_vendor, args.vendor, args.repeat))
+    finally:
+        fake_vendor.stop()
+
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Benchmark HTML text extraction over the saved pages in bench/corpus.
+
+Compares `src.web.extract_html_text` with the old extraction, which cleaned every page with
+html5lib before handing it to trafilatura. Reports the time and peak memory for each page
+(as seen by tracemalloc, so memory allocated inside lxml isn't counted),
+and how similar the new text is to the old. Exits with an error if any page falls below
+--min-similarity, so it can be used to check a change to the extractor.
+
+    python bench/extract_html.py
+    python bench/extract_html.py --repeat 10 --min-similarity 0.95
+    python bench/extract_html.py --save https://example.com/some/article
+
+"""
+
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+from difflib import SequenceMatcher
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.web import extract_html_text, get_session
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+
+def legacy_extract_html_text(html: str) -> str | None:
+    from bs4 import BeautifulSoup
+    from trafilatura import extract
+
+    cleaned_html = BeautifulSoup(html, "html5lib").prettify()
+    contents_raw = extract(cleaned_html, output_format="json")
+    if contents_raw is None:
+        return None
+
+    return json.loads(contents_raw)["text"]
+
+
+def measure(extract_func, html: str, repeat: int) -> tuple[str | None, float, int]:
+    """
+    Returns the extracted text, the best time of `repeat` runs and the peak memory of one run
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        text = extract_func(html)
+        times.append(time.perf_counter() - start_time)
+
+    # Measured separately because tracemalloc slows everything down
+    tracemalloc.start()
+    extract_func(html)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return text, min(times), peak_bytes
+
+
+def similarity(a: str | None, b: str | None) -> float:
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+
+    # Compare words so that differences in whitespace don't count
+    return SequenceMatcher(None, a.split(), b.split(), autojunk=False).ratio()
+
+
+def save_pages(urls: list[str], corpus_dir: Path):
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    for url in urls:
+        resp = get_session().get(url, timeout=30)
+        resp.raise_for_status()
+        name = "".join(c if c.isalnum() else "-" for c in url.split("://")[-1]).strip("-")
+        path = corpus_dir / f"{name[:80]}.html"
+        path.write_text(resp.text)
+        print(f"Saved {url} to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=CORPUS_DIR)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page, the best is kept")
+    parser.add_argument("--min-similarity", type=float, default=0.9)
+    parser.add_argument("--save", nargs="+", metavar="URL", help="Add pages to the corpus")
+    args = parser.parse_args()
+
+    if args.save:
+        save_pages(args.save, args.corpus)
+        return
+
+    paths = sorted(args.corpus.glob("*.html"))
+    if not paths:
+        sys.exit(f"No .html files in {args.corpus}")
+
+    print(
+        f"{'page':<28} {'size':>8} {'old ms':>9} {'new ms':>9} {'speedup':>8} "
+        f"{'old peak':>9} {'new peak':>9} {'similar':>8}"
+    )
+    total_old, total_new, failures = 0.0, 0.0, []
+    for path in paths:
+        html = path.read_text()
+        old_text, old_time, old_peak = measure(legacy_extract_html_text, html, args.repeat)
+        new_text, new_time, new_peak = measure(extract_html_text, html, args.repeat)
+        ratio = similarity(old_text, new_text)
+        total_old += old_time
+        total_new += new_time
+        if ratio < args.min_similarity:
+            failures.append(path.name)
+
+        print(
+            f"{path.stem[:28]:<28} {len(html) // 1024:>6}KB "
+            f"{old_time * 1000:>9.1f} {new_time * 1000:>9.1f} {old_time / new_time:>7.1f}x "
+            f"{old_peak / 2**20:>7.1f}MB {new_peak / 2**20:>7.1f}MB {ratio:>8.3f}"
+        )
+
+    print(
+        f"\nTotal {total_old * 1000:.1f}ms -> {total_new * 1000:.1f}ms "
+        f"({total_old / total_new:.1f}x faster) over {len(paths)} pages"
+    )
+    if failures:
+        sys.exit(f"Similarity below {args.min_similarity} for: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""
+A local stand-in for the Anthropic and OpenAI APIs, for measuring `ask` without spending credit.
+
+Serves the endpoints that src/vendors uses: Anthropic's /v1/messages and OpenAI's
+/v1/chat/completions and /v1/embeddings, with or without streaming. Replies are made up
+but shaped like the real thing, including usage fields, forced tool calls and structured
+outputs. Latency, token rate and errors are configurable, so that results don't swing
+with vendor load.
+
+    python bench/fake_vendor.py --port 8900 --latency-ms 300 --tokens-per-second 80
+    ANTHROPIC_API_KEY=fake ANTHROPIC_BASE_URL=http://127.0.0.1:8900 ask --no-cache hello
+
+Control endpoints:
+    GET  /_fake/stats   requests served per endpoint, and errors injected
+    POST /_fake/reset   zero the stats
+    POST /_fake/config  update the options below with a JSON object, eg. {"error_rate": 0.2}
+
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = (
+    "the quick answer is to use a list comprehension which flattens each nested list into "
+    "one sequence without copying more than needed and keeps the original order intact"
+).split()
+MESSAGE_TAG_PATTERN = re.compile(r'<message id="(\d+)"')
+DEFAULT_COMMAND = "echo hello from the fake vendor"
+
+
+class FakeVendorConfig:
+    def __init__(
+        self,
+        latency_ms: float = 300,
+        latency_jitter_ms: float = 0,
+        tokens_per_second: float = 100,
+        output_tokens: int = 60,
+        error_rate: float = 0.0,
+        error_status: int = 529,
+        retry_after: float | None = None,
+        embedding_dimensions: int = 1536,
+        seed: int | None = None,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.embedding_dimensions = embedding_dimensions
+        self.random = random.Random(seed)
+
+    def get_latency_ms(self) -> float:
+        # Exponential jitter gives the long tail that real vendors have
+        if not self.latency_jitter_ms:
+            return self.latency_ms
+
+        return self.latency_ms + self.random.expovariate(1 / self.latency_jitter_ms)
+
+    def update(self, values: dict):
+        for name, value in values.items():
+            if name == "seed":
+                self.random.seed(value)
+            elif hasattr(self, name):
+                setattr(self, name, value)
+            else:
+                raise ValueError(f"Unknown option {name!r}")
+
+
+class FakeVendorStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.errors = 0
+
+    def add(self, path: str, is_error: bool):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.errors += int(is_error)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            total = sum(self.requests.values())
+            return {"requests": dict(self.requests), "total": total, "errors": self.errors}
+
+
+class FakeVendorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: FakeVendorConfig
+    stats: FakeVendorStats
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/_fake/stats":
+            self.send_json(200, self.stats.to_dict())
+        else:
+            self.send_json(404, {"error": {"message": f"No route for GET {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0]
+        if path == "/_fake/reset":
+            with self.stats.lock:
+                self.stats.requests, self.stats.errors = {}, 0
+
+            return self.send_json(200, {})
+        elif path == "/_fake/config":
+            try:
+                self.config.update(body)
+            except ValueError as e:
+                return self.send_json(400, {"error": {"message": str(e)}})
+
+            return self.send_json(200, {})
+
+        routes = {
+            "/v1/messages": self.anthropic_messages,
+            "/v1/chat/completions": self.openai_chat_completions,
+            "/v1/embeddings": self.openai_embeddings,
+        }
+        route = routes.get(path)
+        if route is None:
+            return self.send_json(404, {"error": {"message": f"No route for POST {path}"}})
+
+        is_error = self.config.random.random() < self.config.error_rate
+        self.stats.add(path, is_error)
+        time.sleep(self.config.get_latency_ms() / 1000)
+        if is_error:
+            return self.send_error_response(path)
+
+        route(body)
+
+    def anthropic_messages(self, body: dict):
+        prompt = get_prompt_text(body.get("messages", []), body.get("system"))
+        input_tokens = count_words(prompt)
+        text = self.make_reply(prompt, body.get("max_tokens"))
+        message_id = f"msg_{self.config.random.getrandbits(64):016x}"
+        tool_choice = body.get("tool_choice") or {}
+        if tool_choice.get("type") == "tool":
+            content = [
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_{self.config.random.getrandbits(64):016x}",
+                    "name": tool_choice["name"],
+                    "input": {"explanation": text, "command": DEFAULT_COMMAND},
+                }
+            ]
+            stop_reason = "tool_use"
+        else:
+            content = [{"type": "text", "text": text}]
+            stop_reason = "end_turn"
+
+        usage = {"input_tokens": input_tokens, "output_tokens": count_words(text)}
+        message = {
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage,
+        }
+        if not body.get("stream"):
+            self.wait_for_tokens(usage["output_tokens"])
+            return self.send_json(200, message)
+
+        self.start_event_stream()
+        start_message = {**message, "content": [], "stop_reason": None}
+        start_message["usage"] = {"input_tokens": input_tokens, "output_tokens": 1}
+        self.send_event("message_start", {"type": "message_start", "message": start_message})
+        self.send_event(
+            "content_block_start",
+            {
+                "type": "content_block_start",
+                "index": 0,
+                "content_block": {"type": "text", "text": ""},
+            },
+        )
+        for word in self.iter_words(text):
+            delta = {"type": "text_delta", "text": word}
+            self.send_event(
+                "content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta}
+            )
+
+        self.send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self.send_event(
+            "message_delta",
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                "usage": {"output_tokens": usage["output_tokens"]},
+            },
+        )
+        self.send_event("message_stop", {"type": "message_stop"})
+        self.end_event_stream()
+
+    def openai_chat_completions(self, body: dict):
+        prompt = get_prompt_text(body.get("messages", []))
+        input_tokens = count_words(prompt)
+        text = self.make_reply(prompt, body.get("max_tokens"))
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            text = json.dumps({"explanation": text, "command": DEFAULT_COMMAND})
+
+        output_tokens = count_words(text)
+        usage = {
+            "prompt_tokens": input_tokens,
+            "completion_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        common = {
+            "id": f"chatcmpl-{self.config.random.getrandbits(64):016x}",
+            "created": int(time.time()),
+            "model": body.get("model"),
+        }
+        if not body.get("stream"):
+            self.wait_for_tokens(output_tokens)
+            choice = {
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }
+            completion = {**common, "object": "chat.completion", "choices": [choice]}
+            return self.send_json(200, {**completion, "usage": usage})
+
+        def send_chunk(choices: list[dict], **extra):
+            chunk = {**common, "object": "chat.completion.chunk", "choices": choices, **extra}
+            self.send_event(None, chunk)
+
+        self.start_event_stream()
+        send_chunk([{"index": 0, "delta": {"role": "assistant", "content": ""}}])
+        for word in self.iter_words(text):
+            send_chunk([{"index": 0, "delta": {"content": word}, "finish_reason": None}])
+
+        send_chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            send_chunk([], usage=usage)
+
+        self.send_event(None, "[DONE]")
+        self.end_event_stream()
+
+    def openai_embeddings(self, body: dict):
+        texts = body.get("input")
+        texts = [texts] if isinstance(texts, str) else texts
+        data = [
+            {"object": "embedding", "index": idx, "embedding": make_embedding(text, self.config)}
+            for idx, text in enumerate(texts)
+        ]
+        num_tokens = sum(count_words(text) for text in texts)
+        usage = {"prompt_tokens": num_tokens, "total_tokens": num_tokens}
+        self.send_json(
+            200, {"object": "list", "data": data, "model": body.get("model"), "usage": usage}
+        )
+
+    def make_reply(self, prompt: str, max_tokens: int | None) -> str:
+        """
+        Made up text, or <compressed> blocks for each message of a \\compress batch request
+        """
+        num_words = min(self.config.output_tokens, max_tokens or self.config.output_tokens)
+        message_ids = MESSAGE_TAG_PATTERN.findall(prompt)
+        if message_ids:
+            per_message = max(num_words // len(message_ids), 1)
+            return "\n".join(
+                f'<compressed id="{idx}">{make_words(per_message, self.config)}</compressed>'
+                for idx in message_ids
+            )
+
+        return make_words(num_words, self.config)
+
+    def iter_words(self, text: str):
+        """
+        Yields the words of the text at the configured token rate
+        """
+        start_time = time.perf_counter()
+        for idx, word in enumerate(re.findall(r"\S+\s*", text)):
+            if self.config.tokens_per_second:
+                wait_until = start_time + idx / self.config.tokens_per_second
+                time.sleep(max(wait_until - time.perf_counter(), 0))
+
+            yield word
+
+    def wait_for_tokens(self, num_tokens: int):
+        if self.config.tokens_per_second:
+            time.sleep(num_tokens / self.config.tokens_per_second)
+
+    def send_error_response(self, path: str):
+        status = self.config.error_status
+        headers = {}
+        if self.config.retry_after is not None:
+            headers["retry-after"] = str(self.config.retry_after)
+
+        if path == "/v1/messages":
+            error_type = "overloaded_error" if status == 529 else "api_error"
+            error = {"type": "error", "error": {"type": error_type, "message": "Injected error"}}
+        else:
+            error = {"error": {"message": "Injected error", "type": "server_error", "code": None}}
+
+        self.send_json(status, error, headers)
+
+    def send_json(self, status: int, data: dict, headers: dict | None = None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_event_stream(self):
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+
+    def send_event(self, event: str | None, data: dict | str):
+        data_text = data if isinstance(data, str) else json.dumps(data)
+        event_text = f"event: {event}\ndata: {data_text}\n\n" if event else f"data: {data_text}\n\n"
+        self.send_chunk(event_text.encode())
+
+    def end_event_stream(self):
+        self.send_chunk(b"")
+
+    def send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def get_prompt_text(messages: list[dict], system=None) -> str:
+    parts = [system] if isinstance(system, str) else [b.get("text", "") for b in system or []]
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get("text", "") for block in content or [])
+
+    return "\n".join(parts)
+
+
+def count_words(text: str) -> int:
+    return max(len(text.split()), 1)
+
+
+def make_words(num_words: int, config: FakeVendorConfig) -> str:
+    return " ".join(config.random.choice(WORDS) for _ in range(num_words))
+
+
+def make_embedding(text: str, config: FakeVendorConfig) -> list[float]:
+    # The same text always gets the same vector
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    vector = [rng.gauss(0, 1) for _ in range(config.embedding_dimensions)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+def make_server(host: str, port: int, config: FakeVendorConfig) -> ThreadingHTTPServer:
+    handler = type("Handler", (FakeVendorHandler,), {"config": config, "stats": FakeVendorStats()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900, help="0 picks a free port")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Time to first byte")
+    parser.add_argument(
+        "--latency-jitter-ms", type=float, default=0, help="Mean extra, exponentially distributed"
+    )
+    parser.add_argument("--tokens-per-second", type=float, default=100, help="0 for no limit")
+    parser.add_argument("--output-tokens", type=int, default=60, help="Words in each reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests")
+    parser.add_argument("--error-status", type=int, default=529, help="Status of errors")
+    parser.add_argument("--retry-after", type=float, default=None, help="Seconds, sent on errors")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    config = FakeVendorConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server = make_server(args.host, args.port, config)
+    host, port = server.server_address[:2]
+    # Printed first, so that scripts which start the server on port 0 can find it
+    print(f"http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+import json
+import time
+import atexit
+import hashlib
+import sqlite3
+import threading
+from functools import cache
+
+from .settings import CONFIG_DIR, load_settings
+from .schema import ChatMessage
+
+RESPONSE_CACHE_FILE = CONFIG_DIR / "responses.sqlite3"
+PAGE_CACHE_FILE = CONFIG_DIR / "pages.sqlite3"
+
+_cache_disabled = False
+
+
+class SqliteStore:
+    """
+    Base for small on-disk stores under ~/.ask that can be shared by many `ask` processes.
+    """
+
+    schema: str = ""
+    # Changes to the schema for files made by older versions, each is run once, in order
+    migrations: tuple[str, ...] = ()
+
+    def __init__(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode, transactions are opened explicitly where needed.
+        self.conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.schema)
+        if self.migrations:
+            self.migrate()
+
+    def migrate(self):
+        """
+        Apply the migrations that haven't been yet, tracked with SQLite's user_version
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(self.migrations):
+            return
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Read again now that no other process can be migrating at the same time
+                version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+                for migration in self.migrations[version:]:
+                    self.conn.execute(migration)
+
+                self.conn.execute(f"PRAGMA user_version = {len(self.migrations)}")
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def evict_lru(self, table: str, key_column: str, max_bytes: int) -> int:
+        """
+        Delete least recently accessed rows until the table's `size` column sums to under max_bytes.
+        Must be called inside a transaction, returns the number of rows deleted.
+        """
+        total_size = self.conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+        evicted_keys = []
+        rows = self.conn.execute(f"SELECT {key_column}, size FROM {table} ORDER BY accessed_at")
+        for key, size in rows:
+            if total_size <= max_bytes:
+                break
+
+            evicted_keys.append((key,))
+            total_size -= size
+
+        self.conn.executemany(f"DELETE FROM {table} WHERE {key_column} = ?", evicted_keys)
+        return len(evicted_keys)
+
+
+class ResponseCache(SqliteStore):
+    """
+    Model responses keyed on the request, with a TTL and LRU eviction once over a size cap.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, path, ttl: int, max_bytes: int):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Reads are recorded in memory and written with the next write, so a hit isn't a write
+        self.accessed_at: dict[str, float] = {}
+        self.counts = {"hits": 0, "misses": 0}
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < now - self.ttl:
+                self.counts["misses"] += 1
+                return None
+
+            self.accessed_at[key] = now
+            self.counts["hits"] += 1
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode())
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                self.write_reads()
+                self.evict(now)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def flush(self):
+        """
+        Write the reads recorded since the last write
+        """
+        with self.lock:
+            if not self.accessed_at and not any(self.counts.values()):
+                return
+
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.write_reads()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def write_reads(self):
+        """
+        Must be called inside a transaction
+        """
+        self.conn.executemany(
+            "UPDATE responses SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self.accessed_at.items()],
+        )
+        for name, amount in self.counts.items():
+            self.increment(name, amount)
+
+        self.accessed_at.clear()
+        self.counts = dict.fromkeys(self.counts, 0)
+
+    def evict(self, now: float):
+        """
+        Drop expired responses, then least recently used ones until under the size cap.
+        """
+        expired = self.conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        evicted = self.evict_lru("responses", "key", self.max_bytes)
+        self.increment("evictions", expired + evicted)
+
+    def increment(self, name: str, amount: int = 1):
+        if amount:
+            self.conn.execute(
+                "INSERT INTO counters VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, amount),
+            )
+
+    def get_counters(self) -> dict[str, int]:
+        self.flush()
+        with self.lock:
+            counters = dict(self.conn.execute("SELECT name, value FROM counters"))
+            num_entries, total_size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "entries": num_entries,
+            "bytes": total_size,
+        }
+
+
+class PageCache(SqliteStore):
+    """
+    Text extracted from web pages, with the validators needed to make conditional requests.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        body_hash TEXT NOT NULL,
+        text TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        fetched_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at);
+    """
+
+    def __init__(self, path, max_bytes: int):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+
+    def get(self, url: str) -> dict | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, body_hash, text, fetched_at FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        etag, last_modified, body_hash, text, fetched_at = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "body_hash": body_hash,
+            "text": text,
+            "fetched_at": fetched_at,
+        }
+
+    def touch(self, url: str, is_revalidated: bool):
+        """
+        Mark a page as read, and as fresh again if the server said it hasn't changed.
+        """
+        now = time.time()
+        with self.lock:
+            if is_revalidated:
+                self.conn.execute(
+                    "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                    (now, now, url),
+                )
+            else:
+                self.conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, url))
+
+    def set(self, url: str, etag: str | None, last_modified: str | None, body_hash: str, text: str):
+        now = time.time()
+        size = len(text.encode())
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, etag, last_modified, body_hash, text, size, now, now),
+                )
+                self.evict_lru("pages", "url", self.max_bytes)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+
+@cache
+def get_response_cache() -> ResponseCache | None:
+    settings = load_settings()
+    if not settings.RESPONSE_CACHE:
+        return None
+
+    try:
+        response_cache = ResponseCache(
+            RESPONSE_CACHE_FILE,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+        )
+    except sqlite3.Error:
+        return None
+
+    atexit.register(flush_response_cache, response_cache)
+    return response_cache
+
+
+@cache
+def get_page_cache() -> PageCache | None:
+    try:
+        settings = load_settings()
+    except ValueError:
+        # No API keys configured, which `ask web` doesn't need
+        return None
+
+    if not settings.WEB_CACHE or _cache_disabled:
+        return None
+
+    try:
+        return PageCache(PAGE_CACHE_FILE, max_bytes=settings.WEB_CACHE_MAX_BYTES)
+    except sqlite3.Error:
+        return None
+
+
+def disable_response_cache():
+    global _cache_disabled
+    _cache_disabled = True
+
+
+def flush_response_cache(response_cache: ResponseCache):
+    try:
+        response_cache.flush()
+    except sqlite3.Error:
+        # Only LRU order and counters are lost
+        pass
+
+
+def get_response_cache_key(
+    vendor: str, base_url, model: str, max_tokens: int | None, messages: list[ChatMessage]
+) -> str:
+    """
+    base_url is the client's, so responses from a stand-in server are never used for the real one
+    """
+    request = {
+        "vendor": vendor,
+        "base_url": str(base_url),
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": [m.model_dump(mode="json") for m in messages],
+    }
+    request_json = json.dumps(request, sort_keys=True)
+    return hashlib.sha256(request_json.encode()).hexdigest()
+
+
+def load_cached_response(key: str) -> str | None:
+    response_cache = None if _cache_disabled else get_response_cache()
+    if response_cache is None:
+        return None
+
+    try:
+        return response_cache.get(key)
+    except sqlite3.Error:
+        # A busy or broken cache should never fail the request
+        return None
+
+
+def save_cached_response(key: str, value: str):
+    response_cache = None if _cache_disabled else get_response_cache()
+    if response_cache is None:
+        return
+
+    try:
+        response_cache.set(key, value)
+    except sqlite3.Error:
+        pass
@@ -1,6 +1,2 @@
+# Subcommands are registered lazily, see `lazy_commands` in cli.py
 from .cli import cli
-from .default import default
-from .chat import chat
-from .config import config
-from .img import img
-from .web import web
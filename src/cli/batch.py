@@ -0,0 +1,223 @@
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+
+import click
+from rich.console import Console
+
+from src.settings import load_settings
+from src.schema import ChatMessage, Role
+from src.usage import percentile
+from src import vendors
+from src.vendors.base import request_concurrency
+from .cli import cli
+
+console = Console(stderr=True)
+
+
+@cli.command()
+@click.argument("input_file", type=click.File("r"), default="-")
+@click.option(
+    "--output",
+    "-o",
+    "output_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Append results to this file instead of stdout, skipping IDs it already has",
+)
+@click.option(
+    "--jobs", "-j", type=click.IntRange(min=1), default=None, help="Max concurrent requests"
+)
+@click.option("--model", "model_option", default=None, help="Model option, eg. haiku or 4o-mini")
+def batch(input_file, output_path: Path | None, jobs: int | None, model_option: str | None):
+    """
+    Answer many JSONL prompts concurrently
+
+    \b
+    Each input line is a JSON object with a "prompt" (or "messages") and an "id":
+      {"id": "1", "prompt": "how do I flatten a list in python"}
+      {"id": "2", "messages": [{"role": "user", "content": "hello"}], "max_tokens": 256}
+
+    \b
+    Results are written as JSONL as soon as they finish:
+      {"id": "1", "output": "...", "error": null, "latency": 1.23}
+
+    \b
+    Examples:
+      ask batch prompts.jsonl > results.jsonl
+      cat prompts.jsonl | ask batch -o results.jsonl --jobs 16
+    """
+    settings = load_settings()
+    if settings.ANTHROPIC_API_KEY:
+        vendor = vendors.anthropic
+    elif settings.OPENAI_API_KEY:
+        vendor = vendors.openai
+    else:
+        raise click.ClickException("Set either ANTHROPIC_API_KEY or OPENAI_API_KEY as envars")
+
+    model_option = model_option or vendor.DEFAULT_MODEL_OPTION
+    if model_option not in vendor.MODEL_OPTIONS:
+        options = ", ".join(vendor.MODEL_OPTIONS)
+        raise click.ClickException(f"Unknown model option {model_option}, use one of: {options}")
+
+    jobs = jobs or settings.VENDOR_CONCURRENCY
+    done_ids = load_done_ids(output_path) if output_path else set()
+    output_file = open(output_path, "a") if output_path else sys.stdout
+    try:
+        # The vendor layer has its own limit on in-flight requests, raise it to match
+        with request_concurrency(jobs):
+            summary = asyncio.run(
+                run_batch(
+                    input_file,
+                    output_file,
+                    vendor,
+                    vendor.MODEL_OPTIONS[model_option],
+                    jobs,
+                    done_ids,
+                )
+            )
+    finally:
+        if output_path:
+            output_file.close()
+
+    print_summary(summary)
+
+
+async def run_batch(input_file, output_file, vendor, model: str, jobs: int, done_ids: set[str]):
+    loop = asyncio.get_running_loop()
+    summary = BatchSummary()
+    pending = set()
+
+    def write_results(tasks):
+        for task in tasks:
+            result = task.result()
+            summary.add(result)
+            output_file.write(json.dumps(result) + "\n")
+            output_file.flush()
+
+    line_num = 0
+    while True:
+        # Read in a thread so that a slow producer on stdin doesn't block finished results
+        line = await loop.run_in_executor(None, input_file.readline)
+        if not line:
+            break
+
+        line_num += 1
+        if not line.strip():
+            continue
+
+        item = parse_item(line, line_num)
+        if item["id"] in done_ids:
+            summary.num_skipped += 1
+            continue
+
+        if len(pending) >= jobs:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            write_results(done)
+
+        pending.add(asyncio.create_task(run_item(item, vendor, model)))
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        write_results(done)
+
+    summary.end_time = time.perf_counter()
+    return summary
+
+
+def parse_item(line: str, line_num: int) -> dict:
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {"id": str(line_num), "error": f"Invalid JSON: {e}"}
+
+    if not isinstance(item, dict):
+        return {"id": str(line_num), "error": "Expected a JSON object"}
+
+    item["id"] = str(item.get("id", line_num))
+    return item
+
+
+async def run_item(item: dict, vendor, model: str) -> dict:
+    result = {"id": item["id"], "output": None, "error": item.get("error"), "latency": None}
+    if result["error"]:
+        return result
+
+    start_time = time.perf_counter()
+    try:
+        if "messages" in item:
+            messages = [ChatMessage(**m) for m in item["messages"]]
+        elif "prompt" in item:
+            messages = [ChatMessage(role=Role.User, content=item["prompt"])]
+        else:
+            raise ValueError('Expected a "prompt" or "messages" key')
+
+        max_tokens = item.get("max_tokens", 1024)
+        message = await vendor.achat(messages, model, max_tokens=max_tokens)
+        result["output"] = message.content
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["latency"] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+def load_done_ids(output_path: Path) -> set[str]:
+    """
+    IDs that already have a successful result in the output file
+    """
+    done_ids = set()
+    if not output_path.exists():
+        return done_ids
+
+    with open(output_path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+            if isinstance(result, dict) and result.get("error") is None and "id" in result:
+                done_ids.add(str(result["id"]))
+
+    return done_ids
+
+
+class BatchSummary:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.num_ok = 0
+        self.num_failed = 0
+        self.num_skipped = 0
+        self.latencies = []
+
+    def add(self, result: dict):
+        if result["error"]:
+            self.num_failed += 1
+        else:
+            self.num_ok += 1
+
+        if result["latency"] is not None:
+            self.latencies.append(result["latency"])
+
+
+def print_summary(summary: BatchSummary):
+    elapsed = summary.end_time - summary.start_time
+    num_done = summary.num_ok + summary.num_failed
+    throughput = num_done / elapsed if elapsed else 0
+    console.print(
+        f"\n[bold]Batch complete[/bold] in {elapsed:.1f}s: "
+        f"[green]{summary.num_ok} ok[/green], [red]{summary.num_failed} failed[/red], "
+        f"[dim]{summary.num_skipped} skipped[/dim]"
+    )
+    if summary.latencies:
+        console.print(
+            f"Throughput {throughput:.2f} items/s, latency "
+            f"p50 {percentile(summary.latencies, 50):.2f}s, "
+            f"p95 {percentile(summary.latencies, 95):.2f}s, "
+            f"max {max(summary.latencies):.2f}s",
+            highlight=False,
+        )
@@ -1,5 +1,7 @@
 from .read_file import ReadFileAction
 from .read_web import ReadWebAction
+from .search import SearchAction
+from .recall import RecallAction
 from .compress import CompressHistoryAction
 from .clear import ClearHistoryAction
 from .shell import ShellAction
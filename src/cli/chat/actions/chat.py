@@ -1,9 +1,9 @@
 from rich.console import Console
-from rich.progress import Progress
-from rich.padding import Padding
-from rich.markup import escape
 
-from src.schema import ChatState, ChatMessage, Role, ChatMode, CommandOption
+from src.context import fit_context
+from src.schema import ChatState, ChatMessage, Role, ChatMode, CommandOption, ModelRoute
+from src.vendors.routing import use_route
+from src.cli.stream import print_stream
 from .base import BaseAction
 
 
@@ -43,18 +43,17 @@ class ChatAction(BaseAction):
         return state
 
     def run_chat(self, query_text: str, state: ChatState) -> ChatState:
-        model = self.vendor.MODEL_OPTIONS[self.model_option]
-        state.messages.append(ChatMessage(role=Role.User, content=query_text))
-        with Progress(transient=True) as progress:
-            progress.add_task(
-                f"[red]Asking {self.vendor.MODEL_NAME} ({self.model_option})...",
-                start=False,
-                total=None,
-            )
-            message = self.vendor.chat(state.messages, model)
-
-        state.messages.append(message)
+        # Only added to the history once it has been answered, so a failed call leaves no trace
+        user_msg = ChatMessage(role=Role.User, content=query_text)
         self.con.print(f"\nAssistant:")
-        formatted_text = Padding(escape(message.content), (1, 2))
-        self.con.print(formatted_text, width=80)
+        with use_route(self.vendor, self.model_option, ModelRoute.Chat) as model_option:
+            model = self.vendor.MODEL_OPTIONS[model_option]
+            deltas = self.vendor.stream_chat(fit_context([*state.messages, user_msg]), model)
+            content = print_stream(
+                self.con,
+                deltas,
+                f"[red]Asking {self.vendor.MODEL_NAME} ({model_option})...",
+                width=80,
+            )
+        state.messages.extend([user_msg, ChatMessage(role=Role.Asssistant, content=content)])
         return state
@@ -1,14 +1,28 @@
+from pathlib import Path
+
 from rich.padding import Padding
 from rich.markup import escape
+from rich.progress import Progress
 
+from src.pdf import split_page_selector, is_pdf_file
+from src.files import FileReader, FileRange, parse_file_location
+from src.settings import load_settings
 from src.schema import ChatState, ChatMessage, Role, ChatMode, CommandOption
 from .base import BaseAction
 
+PREVIEW_CHARS = 512
+LARGE_FILE_BYTES = 64 * 1024 * 1024
+
 
 class ReadFileAction(BaseAction):
 
     help_description = "read file"
-    help_examples = ["\\file /etc/hosts"]
+    help_examples = [
+        "\\file /etc/hosts",
+        "\\file app.log:1000-2000",
+        "\\file app.log --tail 500",
+        "\\file report.pdf#pages=10-20",
+    ]
     active_modes = [ChatMode.Chat, ChatMode.Shell]
 
     cmd_options = [
@@ -18,6 +32,30 @@ class ReadFileAction(BaseAction):
             prefix="\\file",
             example="\\file /etc/hosts",
         ),
+        CommandOption(
+            template="\\file <path>:<first line>-<last line>",
+            description="Read some lines of a file",
+            prefix="\\file",
+            example="\\file app.log:1000-2000",
+        ),
+        CommandOption(
+            template="\\file <path> --tail <lines>",
+            description="Read the end of a file",
+            prefix="\\file",
+            example="\\file app.log --tail 500",
+        ),
+        CommandOption(
+            template="\\file <path> --bytes <start>-<end>",
+            description="Read a byte range of a file",
+            prefix="\\file",
+            example="\\file app.log --bytes 0-4096",
+        ),
+        CommandOption(
+            template="\\file <path>#pages=<pages>",
+            description="Read some pages of a PDF",
+            prefix="\\file",
+            example="\\file report.pdf#pages=10-20",
+        ),
     ]
 
     def is_match(self, query_text: str, state: ChatState, cmd_options: list[CommandOption]) -> bool:
@@ -28,22 +66,23 @@ class ReadFileAction(BaseAction):
             return query_text.startswith(r"\file ")
 
     def run(self, query_text: str, state: ChatState) -> ChatState:
-        file_path = query_text[6:].strip()
+        location = query_text[6:].strip()
+        file_path, pages = split_page_selector(location)
         try:
-            with open(file_path, "r") as file:
-                file_content = file.read()
-            self.con.print(f"\n[bold blue]Content from {file_path}:[/bold blue]")
-            max_char = 512
-            if len(file_content) > max_char:
-                file_content_display = file_content[:512] + "..."
+            file_path, file_range = parse_file_location(file_path)
+            if is_pdf_file(file_path):
+                file_content = self.read_pdf(file_path, pages)
+            elif pages:
+                self.con.print(
+                    f"\n[bold red]Error: Pages can only be selected from PDFs.[/bold red]"
+                )
+                return state
             else:
-                file_content_display = file_content
+                file_content, location = self.read_text(file_path, file_range)
 
-            formatted_text = Padding(escape(file_content_display), (1, 2))
-            self.con.print(formatted_text)
             file_content_length = len(file_content)
             query_text = (
-                f"Content from {file_path} ({file_content_length} chars total):\n\n{file_content}"
+                f"Content from {location} ({file_content_length} chars total):\n\n{file_content}"
             )
             state.messages.append(ChatMessage(role=Role.User, content=query_text))
             return state
@@ -53,3 +92,76 @@ class ReadFileAction(BaseAction):
         except IOError:
             self.con.print(f"\n[bold red]Error: Unable to read file '{file_path}'.[/bold red]")
             return state
+        except ValueError as e:
+            self.con.print(f"\n[bold red]Error: {escape(str(e))}[/bold red]")
+            return state
+
+    def read_text(self, file_path: str, file_range: FileRange) -> tuple[str, str]:
+        """
+        Read the requested part of a text file, or as much of it as fits in the token budget.
+        Returns the text and a description of where it came from.
+        """
+        max_tokens = load_settings().FILE_TOKEN_BUDGET
+        with FileReader(file_path) as reader:
+            with Progress(transient=True, console=self.con) as progress:
+                if reader.size >= LARGE_FILE_BYTES:
+                    # Indexing the lines of a big file can take a few seconds
+                    progress.add_task(f"[red]Reading {file_path}...", start=False, total=None)
+
+                excerpt = reader.read(file_range, max_tokens)
+
+        location = file_path if excerpt.is_whole_file else f"{file_path}, {excerpt.describe()}"
+        self.print_preview(location, excerpt.text)
+        if excerpt.is_truncated:
+            if excerpt.is_tail:
+                more_hint = "use a line range to read more"
+            elif excerpt.first_line is not None:
+                next_line = excerpt.last_line + 1
+                more_hint = f"read on with \\file {file_path}:{next_line}-{next_line + excerpt.line_count - 1}"
+            else:
+                more_hint = f"read on with \\file {file_path} --bytes {excerpt.end_byte}-"
+
+            self.con.print(
+                f"[yellow]Only {excerpt.describe()} fit in the {max_tokens} token budget, "
+                f"{escape(more_hint)}[/yellow]"
+            )
+
+        return excerpt.text, location
+
+    def read_pdf(self, file_path: str, pages: str | None) -> str:
+        """
+        Extract the selected pages, showing a preview as soon as the first ones are ready
+        """
+        from src.pdf import count_pages, select_pages, iter_pdf_pages
+
+        page_idxs = select_pages(pages, count_pages(Path(file_path)))
+        page_texts = []
+        num_chars = 0
+        is_preview_shown = False
+        with Progress(transient=True, console=self.con) as progress:
+            task_id = progress.add_task(
+                f"[red]Reading {len(page_idxs)} pages...", total=len(page_idxs)
+            )
+            for _, page_text in iter_pdf_pages(Path(file_path), page_idxs):
+                page_texts.append(page_text)
+                progress.advance(task_id)
+                num_chars += len(page_text)
+                if not is_preview_shown and num_chars > PREVIEW_CHARS:
+                    self.print_preview(file_path, "\n\n".join(page_texts))
+                    is_preview_shown = True
+
+        file_content = "\n\n".join(page_texts)
+        if not is_preview_shown:
+            self.print_preview(file_path, file_content)
+
+        return file_content
+
+    def print_preview(self, file_path: str, file_content: str):
+        self.con.print(f"\n[bold blue]Content from {file_path}:[/bold blue]")
+        if len(file_content) > PREVIEW_CHARS:
+            file_content_display = file_content[:PREVIEW_CHARS] + "..."
+        else:
+            file_content_display = file_content
+
+        formatted_text = Padding(escape(file_content_display), (1, 2))
+        self.con.print(formatted_text)
@@ -2,7 +2,6 @@ from rich.padding import Padding
 from rich.markup import escape
 
 from src.schema import ChatState, ChatMessage, Role, CommandOption
-from src.web import fetch_text_for_url
 from .base import BaseAction
 
 
@@ -10,8 +9,8 @@ class ReadWebAction(BaseAction):
 
     cmd_options = [
         CommandOption(
-            template="\web <url>",
-            description="Read website",
+            template="\web <url> [<url> ...]",
+            description="Read websites",
             prefix="\web",
             example="\web example.com",
         ),
@@ -25,18 +24,21 @@ class ReadWebAction(BaseAction):
             return query_text.startswith(r"\web ")
 
     def run(self, query_text: str, state: ChatState) -> ChatState:
-        url = query_text[5:].strip()
-        url_text = fetch_text_for_url(url)
-        self.con.print(f"\n[bold blue]Content from {url}:[/bold blue]")
-        max_char = 512
-        if len(url_text) > max_char:
-            url_text_display = url_text[:512] + "..."
-        else:
-            url_text_display = url_text
+        from src.web import fetch_texts_for_urls
+
+        urls = query_text[5:].split()
+        for url, url_text in fetch_texts_for_urls(urls):
+            self.con.print(f"\n[bold blue]Content from {url}:[/bold blue]")
+            max_char = 512
+            if len(url_text) > max_char:
+                url_text_display = url_text[:512] + "..."
+            else:
+                url_text_display = url_text
+
+            formatted_text = Padding(escape(url_text_display), (1, 2))
+            self.con.print(formatted_text)
+            url_text_length = len(url_text)
+            query_text = f"Content from {url} ({url_text_length} chars total):\n\n{url_text}"
+            state.messages.append(ChatMessage(role=Role.User, content=query_text))
 
-        formatted_text = Padding(escape(url_text_display), (1, 2))
-        self.con.print(formatted_text)
-        url_text_length = len(url_text)
-        query_text = f"Content from {url} ({url_text_length} chars total):\n\n{url_text}"
-        state.messages.append(ChatMessage(role=Role.User, content=query_text))
         return state
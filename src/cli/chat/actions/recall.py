@@ -0,0 +1,57 @@
+from rich.padding import Padding
+from rich.markup import escape
+
+from src.schema import ChatState, ChatMessage, Role, CommandOption
+from .base import BaseAction
+
+RECALL_TOP_K = 5
+
+
+class RecallAction(BaseAction):
+
+    cmd_options = [
+        CommandOption(
+            template="\\recall <query>",
+            description="Find the most similar snippets of files embedded with `ask embed`",
+            prefix="\\recall",
+            example="\\recall where do we handle expired tokens",
+        ),
+    ]
+
+    def is_match(self, query_text: str, state: ChatState, cmd_options: list[CommandOption]) -> bool:
+        matches_other_cmd = self.matches_other_cmd(query_text, state, cmd_options)
+        if matches_other_cmd:
+            return False
+        else:
+            return query_text.startswith(r"\recall ")
+
+    def run(self, query_text: str, state: ChatState) -> ChatState:
+        # NumPy is slow to import, so only load it once it's needed
+        from src.embeddings import get_embedder
+        from src.vectors import get_vector_store
+
+        recall_query = query_text[8:].strip()
+        embedder = get_embedder()
+        query_vector = embedder.embed([recall_query])[0]
+        results = get_vector_store(embedder).search(query_vector, limit=RECALL_TOP_K)
+        if not results:
+            self.con.print(
+                "\n[bold yellow]Nothing to recall, embed indexed files with `ask embed`"
+                "[/bold yellow]\n"
+            )
+            return state
+
+        self.con.print(f"\n[bold blue]Top {len(results)} snippets:[/bold blue]")
+        for result in results:
+            self.con.print(
+                f"  {escape(result.location)} [dim](similarity {result.score:.2f})[/dim]"
+            )
+
+        formatted_text = Padding(escape(results[0].text[:512]), (1, 2))
+        self.con.print(formatted_text)
+        result_texts = [f"From {result.location}:\n\n{result.text}" for result in results]
+        content = f"Snippets related to '{recall_query}' from local files:\n\n" + "\n\n".join(
+            result_texts
+        )
+        state.messages.append(ChatMessage(role=Role.User, content=content))
+        return state
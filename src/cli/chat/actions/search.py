@@ -0,0 +1,51 @@
+from rich.padding import Padding
+from rich.markup import escape
+
+from src.schema import ChatState, ChatMessage, Role, CommandOption
+from .base import BaseAction
+
+SEARCH_TOP_K = 5
+
+
+class SearchAction(BaseAction):
+
+    cmd_options = [
+        CommandOption(
+            template="\\search <query>",
+            description="Search files indexed with `ask index`",
+            prefix="\\search",
+            example="\\search how are retries configured",
+        ),
+    ]
+
+    def is_match(self, query_text: str, state: ChatState, cmd_options: list[CommandOption]) -> bool:
+        matches_other_cmd = self.matches_other_cmd(query_text, state, cmd_options)
+        if matches_other_cmd:
+            return False
+        else:
+            return query_text.startswith(r"\search ")
+
+    def run(self, query_text: str, state: ChatState) -> ChatState:
+        from src.search import get_search_index
+
+        search_query = query_text[8:].strip()
+        results = get_search_index().search(search_query, limit=SEARCH_TOP_K)
+        if not results:
+            self.con.print(
+                "\n[bold yellow]No matches, add folders to the index with `ask index <dir>`"
+                "[/bold yellow]\n"
+            )
+            return state
+
+        self.con.print(f"\n[bold blue]Top {len(results)} matches:[/bold blue]")
+        for result in results:
+            self.con.print(f"  {escape(result.location)} [dim](score {result.score:.2f})[/dim]")
+
+        formatted_text = Padding(escape(results[0].text[:512]), (1, 2))
+        self.con.print(formatted_text)
+        result_texts = [f"From {result.location}:\n\n{result.text}" for result in results]
+        content = f"Search results for '{search_query}' from local files:\n\n" + "\n\n".join(
+            result_texts
+        )
+        state.messages.append(ChatMessage(role=Role.User, content=content))
+        return state
@@ -1,13 +1,15 @@
 import platform
-import subprocess as sp
 
 from rich.console import Console
 from rich.padding import Padding
 from rich.markup import escape
 from rich.progress import Progress
-import psutil
 
-from src.schema import ChatState, ChatMessage, Role, ChatMode, CommandOption
+from src.settings import load_settings
+from src.context import fit_context
+from src.shell import CommandResult, run_command
+from src.schema import ChatState, ChatMessage, Role, ChatMode, CommandOption, ModelRoute
+from src.vendors.routing import use_route
 from .base import BaseAction
 
 NO_COMMAND = "NO_COMMAND_EXTRACTED"
@@ -63,28 +65,33 @@ class ShellAction(BaseAction):
         shell_instruction = f"""
         Write a single shell command to help the user achieve this goal in the context of this chat: {goal}
         Do not suggest shell commands that require interactive or TTY mode: these commands get run in a non-interactive subprocess.
-        Include a brief explanation (1-2 sentences) of why you chose this shell command, but keep the explanation clearly separated from the command.
-        Structure your response so that you start with the explanation and emit the shell command at the end.
+        Include a brief explanation (1-2 sentences) of why you chose this shell command.
+        If no shell command can help with this goal then explain why and don't propose a command.
         System info (take this into consideration):
         {system_info}
         """
         shell_msg = ChatMessage(role=Role.User, content=shell_instruction)
-        state.messages.append(shell_msg)
-        model = self.vendor.MODEL_OPTIONS[self.model_option]
-        with Progress(transient=True) as progress:
+        route = use_route(self.vendor, self.model_option, ModelRoute.Chat)
+        with route as model_option, Progress(transient=True) as progress:
             progress.add_task(
-                f"[red]Generating shell command {self.vendor.MODEL_NAME} ({self.model_option})...",
+                f"[red]Generating shell command {self.vendor.MODEL_NAME} ({model_option})...",
                 start=False,
                 total=None,
             )
-            message = self.vendor.chat(state.messages, model)
+            model = self.vendor.MODEL_OPTIONS[model_option]
+            proposal = self.vendor.propose_command(fit_context([*state.messages, shell_msg]), model)
 
-        state.messages.append(message)
+        message = ChatMessage(role=Role.Asssistant, content=proposal.to_text())
+        state.messages.extend([shell_msg, message])
         self.con.print(f"\nAssistant:")
-        formatted_text = Padding(escape(message.content), (1, 2))
+        formatted_text = Padding(escape(proposal.explanation), (1, 2))
         self.con.print(formatted_text, width=80)
-        command_str = extract_shell_command(message.content, self.vendor, self.model_option)
-        if command_str == NO_COMMAND:
+        command_str = proposal.command
+        if command_str is None and not proposal.structured:
+            # The model ignored the schema, fall back to asking for the command
+            command_str = extract_shell_command(message.content, self.vendor, self.model_option)
+
+        if not command_str or command_str == NO_COMMAND:
             no_extract_msg = "No command could be extracted"
             self.con.print(f"\n[bold yellow]{no_extract_msg}[/bold yellow]")
             state.messages.append(ChatMessage(role=Role.User, content=no_extract_msg))
@@ -95,41 +102,40 @@ class ShellAction(BaseAction):
         user_input = input("Enter Y/n: ").strip().lower()
 
         if user_input == "y" or user_input == "":
+            self.con.print(
+                f"\n[bold blue]Shell Command Output:[/bold blue] [dim](Ctrl-C to stop)[/dim]\n"
+            )
             try:
-                result = sp.run(command_str, shell=True, text=True, capture_output=True)
-                output = f"Command: {command_str}\n\nExit Code: {result.returncode}"
-                if result.stdout:
-                    output += f"\n\nStdout:\n{result.stdout}"
-                if result.stderr:
-                    output += f"\n\nStderr:\n{result.stderr}"
-                self.con.print(f"\n[bold blue]Shell Command Output:[/bold blue]")
-                formatted_output = Padding(escape(output), (1, 2))
-                self.con.print(formatted_output)
-                state.messages.append(
-                    ChatMessage(role=Role.User, content=f"Shell command executed:\n\n{output}")
-                )
+                result = self.run_command(command_str)
             except Exception as e:
                 error_message = f"Error executing shell command: {str(e)}"
                 self.con.print(f"\n[bold red]{error_message}[/bold red]")
                 state.messages.append(ChatMessage(role=Role.User, content=error_message))
+            else:
+                output = result.to_text()
+                state.messages.append(
+                    ChatMessage(role=Role.User, content=f"Shell command executed:\n\n{output}")
+                )
+                if result.is_cancelled:
+                    return state
 
-            # FIXME: Shell output is using a lot of tokens, could we swap it for just the followup message?
             followup_instruction = f"""
             Write a brief (1 sentence) followup commentary on the result of the execution of the command: {command_str}
             based on the user's original request: {goal}
             """
             followup_msg = ChatMessage(role=Role.User, content=followup_instruction)
-            state.messages.append(followup_msg)
 
-            with Progress(transient=True) as progress:
+            route = use_route(self.vendor, self.model_option, ModelRoute.Chat)
+            with route as model_option, Progress(transient=True) as progress:
                 progress.add_task(
-                    f"[red]Analysing shell output {self.vendor.MODEL_NAME} ({self.model_option})...",
+                    f"[red]Analysing shell output {self.vendor.MODEL_NAME} ({model_option})...",
                     start=False,
                     total=None,
                 )
-                message = self.vendor.chat(state.messages, model)
+                model = self.vendor.MODEL_OPTIONS[model_option]
+                message = self.vendor.chat(fit_context([*state.messages, followup_msg]), model)
 
-            state.messages.append(message)
+            state.messages.extend([followup_msg, message])
             self.con.print(f"\nAssistant:")
             formatted_text = Padding(escape(message.content), (1, 2))
             self.con.print(formatted_text, width=80)
@@ -140,12 +146,42 @@ class ShellAction(BaseAction):
             state.messages.append(ChatMessage(role=Role.User, content=cancel_message))
             return state
 
+    def run_command(self, command_str: str) -> CommandResult:
+        """
+        Run a command, printing its output as it arrives
+        """
+        settings = load_settings()
+
+        def print_output(name: str, text: str):
+            style = "red" if name == "stderr" else None
+            self.con.print(text, end="", style=style, markup=False, highlight=False)
+
+        result = run_command(
+            command_str,
+            timeout=settings.SHELL_TIMEOUT or None,
+            max_bytes=settings.SHELL_OUTPUT_MAX_BYTES,
+            max_lines=settings.SHELL_OUTPUT_MAX_LINES,
+            on_output=print_output,
+        )
+        summary = (
+            f"Exit code {result.exit_code} after {result.duration:.1f}s, {result.num_bytes:,} bytes"
+        )
+        if result.is_truncated:
+            summary += ", truncated for the model"
+        if result.is_timed_out:
+            summary = f"Timed out after {settings.SHELL_TIMEOUT}s and killed. {summary}"
+        elif result.is_cancelled:
+            summary = f"Cancelled and killed. {summary}"
+
+        self.con.print(f"\n[dim]{summary}[/dim]")
+        return result
+
 
 def extract_shell_command(assistant_message: str, vendor, model_option: str) -> str:
     """
-    Extract a shell command to be executed from the assistant's message
+    Extract a shell command to be executed from the assistant's message.
+    Only needed when the model doesn't follow the command proposal schema.
     """
-    model = vendor.MODEL_OPTIONS[model_option]
     query_text = f"""
     Extract the proprosed shell command from this chat log.
     Return only a single shell command and nothing else.
@@ -154,10 +190,13 @@ def extract_shell_command(assistant_message: str, vendor, model_option: str) ->
 
     If there is not any command to extract then return only the exact string {NO_COMMAND}
     """
-    return vendor.answer_query(query_text, model)
+    with use_route(vendor, model_option, ModelRoute.CommandExtraction) as model_option:
+        return vendor.answer_query(query_text, vendor.MODEL_OPTIONS[model_option])
 
 
 def get_system_info() -> str:
+    import psutil
+
     system = platform.system()
     if system == "Windows":
         os_info = f"Windows {platform.release()}"
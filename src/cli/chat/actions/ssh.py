@@ -1,13 +1,14 @@
 # WORK IN PROGRESS
 import click
-import paramiko
 import os
 from rich.console import Console
 from rich.padding import Padding
 from rich.markup import escape
 from rich.progress import Progress
 
-from src.schema import ChatState, ChatMessage, Role, ChatMode, SshConfig, CommandOption
+from src.context import fit_context
+from src.schema import ChatState, ChatMessage, Role, ChatMode, SshConfig, CommandOption, ModelRoute
+from src.vendors.routing import use_route
 from .base import BaseAction
 
 NO_COMMAND = "NO_COMMAND_EXTRACTED"
@@ -139,8 +140,8 @@ class SSHAction(BaseAction):
         ssh_instruction = f"""
         Write a single shell command to help the user achieve this goal in the context of this chat: {goal}
         Do not suggest shell commands that require interactive or TTY mode: these commands get run in a non-interactive subprocess.
-        Include a brief explanation (1-2 sentences) of why you chose this shell command, but keep the explanation clearly separated from the command.
-        Structure your response so that you start with the explanation and emit the shell command at the end.
+        Include a brief explanation (1-2 sentences) of why you chose this shell command.
+        If no shell command can help with this goal then explain why and don't propose a command.
 
         This command will be executed over SSH on remote host {state.ssh_config.conn_name}
         You do not need to SSH into the host that has been taken care of. 
@@ -149,24 +150,28 @@ class SSHAction(BaseAction):
         """
 
         ssh_msg = ChatMessage(role=Role.User, content=ssh_instruction)
-        state.messages.append(ssh_msg)
-        model = self.vendor.MODEL_OPTIONS[self.model_option]
-
-        with Progress(transient=True) as progress:
+        route = use_route(self.vendor, self.model_option, ModelRoute.Chat)
+        with route as model_option, Progress(transient=True) as progress:
             progress.add_task(
-                f"[red]Generating SSH command {self.vendor.MODEL_NAME} ({self.model_option})...",
+                f"[red]Generating SSH command {self.vendor.MODEL_NAME} ({model_option})...",
                 start=False,
                 total=None,
             )
-            message = self.vendor.chat(state.messages, model)
+            model = self.vendor.MODEL_OPTIONS[model_option]
+            proposal = self.vendor.propose_command(fit_context([*state.messages, ssh_msg]), model)
 
-        state.messages.append(message)
+        message = ChatMessage(role=Role.Asssistant, content=proposal.to_text())
+        state.messages.extend([ssh_msg, message])
         self.con.print(f"\nAssistant:")
-        formatted_text = Padding(escape(message.content), (1, 2))
+        formatted_text = Padding(escape(proposal.explanation), (1, 2))
         self.con.print(formatted_text, width=80)
 
-        command_str = extract_ssh_command(message.content, self.vendor, self.model_option)
-        if command_str == NO_COMMAND:
+        command_str = proposal.command
+        if command_str is None and not proposal.structured:
+            # The model ignored the schema, fall back to asking for the command
+            command_str = extract_ssh_command(message.content, self.vendor, self.model_option)
+
+        if not command_str or command_str == NO_COMMAND:
             no_extract_msg = "No command could be extracted"
             self.con.print(f"\n[bold yellow]{no_extract_msg}[/bold yellow]")
             state.messages.append(ChatMessage(role=Role.User, content=no_extract_msg))
@@ -203,17 +208,18 @@ class SSHAction(BaseAction):
                 based on the user's original request: {goal}
                 """
                 followup_msg = ChatMessage(role=Role.User, content=followup_instruction)
-                state.messages.append(followup_msg)
 
-                with Progress(transient=True) as progress:
+                route = use_route(self.vendor, self.model_option, ModelRoute.Chat)
+                with route as model_option, Progress(transient=True) as progress:
                     progress.add_task(
-                        f"[red]Analysing SSH output {self.vendor.MODEL_NAME} ({self.model_option})...",
+                        f"[red]Analysing SSH output {self.vendor.MODEL_NAME} ({model_option})...",
                         start=False,
                         total=None,
                     )
-                    message = self.vendor.chat(state.messages, model)
+                    model = self.vendor.MODEL_OPTIONS[model_option]
+                    message = self.vendor.chat(fit_context([*state.messages, followup_msg]), model)
 
-                state.messages.append(message)
+                state.messages.extend([followup_msg, message])
                 self.con.print(f"\nAssistant:")
                 formatted_text = Padding(escape(message.content), (1, 2))
                 self.con.print(formatted_text, width=80)
@@ -239,6 +245,8 @@ class SSHAction(BaseAction):
         return SshConfig(host=host, username=username, port=port, key_filename=key_filename)
 
     def connect_ssh(self, ssh_config: SshConfig) -> tuple[bool, str]:
+        import paramiko
+
         try:
             self.ssh_client = paramiko.SSHClient()
             self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -266,9 +274,9 @@ class SSHAction(BaseAction):
 
 def extract_ssh_command(assistant_message: str, vendor, model_option: str) -> str:
     """
-    Extract an SSH command to be executed from the assistant's message
+    Extract an SSH command to be executed from the assistant's message.
+    Only needed when the model doesn't follow the command proposal schema.
     """
-    model = vendor.MODEL_OPTIONS[model_option]
     query_text = f"""
     Extract the proposed command from this chat log.
     Return only a single command and nothing else.
@@ -277,4 +285,5 @@ def extract_ssh_command(assistant_message: str, vendor, model_option: str) -> st
 
     If there is not any command to extract then return only the exact string {NO_COMMAND}
     """
-    return vendor.answer_query(query_text, model)
+    with use_route(vendor, model_option, ModelRoute.CommandExtraction) as model_option:
+        return vendor.answer_query(query_text, vendor.MODEL_OPTIONS[model_option])
@@ -8,7 +8,8 @@ from rich.markup import escape
 from rich.padding import Padding
 
 
-from src.schema import ChatState, ChatMessage, Role, ChatMode, CommandOption, TaskMeta
+from src.schema import ChatState, ChatMessage, Role, ChatMode, CommandOption, TaskMeta, ModelRoute
+from src.vendors.routing import use_route
 from src.tasks import (
     load_tasks,
     save_task,
@@ -71,7 +72,7 @@ class TaskAction(BaseAction):
         self.vendor = vendor
         self.model_option = model_option
         self.tasks = load_tasks()
-        self.system_info = get_system_info()
+        self.system_info = None
         self.task_step_initialised = False
 
     def is_match(self, query_text: str, state: ChatState, cmd_options: list[CommandOption]) -> bool:
@@ -214,6 +215,9 @@ class TaskAction(BaseAction):
 
             return instruction
 
+        if self.system_info is None:
+            self.system_info = get_system_info()
+
         existing_task = self.tasks.get(state.task_slug)
         other_tasks = {k: v for k, v in self.tasks.items() if k != state.task_slug}
         task_definition = get_task_definition(state.task_slug, other_tasks, self.system_info)
@@ -275,13 +279,14 @@ class TaskAction(BaseAction):
 
         if not proposed_task:
             state.task_thread.append(ChatMessage(role=Role.User, content=query_text))
-            model = self.vendor.MODEL_OPTIONS[self.model_option]
-            with Progress(transient=True) as progress:
+            route = use_route(self.vendor, self.model_option, ModelRoute.TaskGeneration)
+            with route as model_option, Progress(transient=True) as progress:
                 progress.add_task(
-                    f"[red]Fetching response {self.vendor.MODEL_NAME} ({self.model_option})...",
+                    f"[red]Fetching response {self.vendor.MODEL_NAME} ({model_option})...",
                     start=False,
                     total=None,
                 )
+                model = self.vendor.MODEL_OPTIONS[model_option]
                 message = self.vendor.chat(state.task_thread, model, max_tokens=8192)
 
             state.task_thread.append(message)
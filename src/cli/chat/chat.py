@@ -3,16 +3,30 @@ from rich.padding import Padding
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
+from rich.markup import escape
 from prompt_toolkit import PromptSession
 from prompt_toolkit.key_binding import KeyBindings
 
 from src.settings import load_settings
+from src.context import count_message_tokens
 from src.schema import ChatState, ChatMode, CommandOption
-from src import vendors
+from src.usage import current_action
+from src.trace import span
+from src.sessions import (
+    SessionLog,
+    LATEST_SESSION,
+    new_session,
+    resume_session,
+    compress_old_sessions,
+)
+from src.vendors.router import select_vendor
+from src.vendors.resilience import VendorError
 from ..cli import cli
 from .actions import (
     ReadFileAction,
     ReadWebAction,
+    SearchAction,
+    RecallAction,
     CompressHistoryAction,
     ClearHistoryAction,
     ShellAction,
@@ -32,24 +46,32 @@ CMD_OPTIONS = [
 
 
 @cli.command()
-def chat():
+@click.option(
+    "--resume",
+    is_flag=False,
+    flag_value=LATEST_SESSION,
+    default=None,
+    metavar="[ID]",
+    help="Carry on a saved chat session, the latest one if no ID is given",
+)
+def chat(resume: str | None):
     """
     Start an ongoing chat
 
     \b
     Examples:
       ask chat
+      ask chat --resume
+      ask chat --resume 20241031-093000-1a2b
 
     """
     settings = load_settings()
-    if settings.ANTHROPIC_API_KEY:
-        vendor = vendors.anthropic
-    elif settings.OPENAI_API_KEY:
-        vendor = vendors.openai
-    else:
+    # The vendor is picked once, so the whole conversation stays with one model
+    selected = select_vendor()
+    if selected is None:
         raise click.ClickException("Set either ANTHROPIC_API_KEY or OPENAI_API_KEY as envars")
 
-    model_option = vendor.DEFAULT_MODEL_OPTION
+    vendor, model_option = selected
     console.print(f"[green]Chatting with {vendor.MODEL_NAME} {model_option}")
     state = ChatState(
         mode=ChatMode.Chat,
@@ -58,9 +80,32 @@ def chat():
         task_thread=[],
         task_slug=None,
     )
+    session_log = None
+    if resume:
+        try:
+            state, session_log = resume_session(resume, is_logged=settings.CHAT_SESSIONS)
+        except FileNotFoundError as e:
+            raise click.ClickException(str(e))
+
+        console.print(
+            f"[green]Resumed session {session_log.session_id} with {len(state.messages)} messages"
+        )
+        print_separator(state)
+        if not settings.CHAT_SESSIONS:
+            # Carry on from the saved session without adding to it
+            session_log = None
+    elif settings.CHAT_SESSIONS:
+        session_log = new_session(vendor.MODEL_NAME, model_option)
+
+    if settings.CHAT_SESSIONS:
+        exclude = session_log.path if session_log else None
+        compress_old_sessions(settings.CHAT_SESSION_COMPRESS_DAYS, exclude=exclude)
+
     actions = [
         ReadWebAction(console),
         ReadFileAction(console),
+        SearchAction(console),
+        RecallAction(console),
         ClearHistoryAction(console),
         CompressHistoryAction(console, vendor, model_option),
         # Last so it can catch all cmds in shell mode.
@@ -87,18 +132,27 @@ def chat():
                 continue
 
             if query_text == r"\q":
-                console.print("\n\nAssistant: Bye 👋")
+                say_bye(vendor, session_log, state)
                 return
 
             for action in actions:
                 if action.is_match(query_text, state, cmd_options):
-                    state = action.run(query_text, state)
+                    action_name = type(action).__name__
+                    try:
+                        with current_action(action_name), span(action_name, cat="action"):
+                            state = action.run(query_text, state)
+                    except VendorError as e:
+                        console.print(f"\n[bold red]{escape(str(e))}[/bold red]")
+
+                    if session_log:
+                        session_log.record(state)
+
                     print_separator(state)
                     query_text = ""
                     break
 
         except (KeyboardInterrupt, click.exceptions.Abort):
-            console.print("\n\nAssistant: Bye 👋")
+            say_bye(vendor, session_log, state)
             return
 
 
@@ -126,7 +180,8 @@ def print_separator(state: ChatState):
         messages = state.messages
 
     num_messages = len(messages)
-    total_chars = sum(len(m.content) for m in messages)
+    total_tokens = count_message_tokens(messages)
+    token_budget = load_settings().CONTEXT_TOKEN_BUDGET
 
     mode_display = state.mode.replace("_", " ")
     msg_prefix = f"\[{mode_display} mode]"
@@ -134,7 +189,7 @@ def print_separator(state: ChatState):
     if state.ssh_config is not None:
         ssh_prefix = f"\[connected to {state.ssh_config.conn_name}]"
 
-    msg_suffix = f" [{num_messages} msgs, {total_chars} chars]"
+    msg_suffix = f" [{num_messages} msgs, ~{total_tokens}/{token_budget} tokens]"
     separator = "-" * (console.width - len(msg_prefix) - len(msg_suffix) - len(ssh_prefix))
 
     color_setting = ""
@@ -148,6 +203,33 @@ def print_separator(state: ChatState):
     console.print(f"{color_setting}{msg_prefix}{ssh_prefix}{separator}{msg_suffix}", style="dim")
 
 
+def say_bye(vendor, session_log: SessionLog | None, state: ChatState):
+    console.print("\n\nAssistant: Bye 👋")
+    print_prompt_cache_usage(vendor)
+    if session_log:
+        # Catch anything added by an action that was interrupted
+        session_log.record(state)
+        session_log.close()
+
+    if session_log and session_log.path.exists():
+        console.print(
+            f"[dim]Resume this chat with: ask chat --resume {session_log.session_id}[/dim]",
+            highlight=False,
+        )
+
+
+def print_prompt_cache_usage(vendor):
+    usage = vendor.get_prompt_cache_usage()
+    if not usage.input_tokens:
+        return
+
+    console.print(
+        f"[dim]Prompt cache: {usage.hit_rate:.0%} of {usage.input_tokens} input tokens "
+        f"read from cache ({usage.cache_write_tokens} tokens written)[/dim]",
+        highlight=False,
+    )
+
+
 def print_help(cmd_options: list[CommandOption]):
     table = Table(show_header=False, box=None, padding=(0, 1))
     table.add_column("Command", style="green")
@@ -1,8 +1,24 @@
+import importlib
+
 import click
 
+from src.trace import span, start_from_env, start_tracing, start_profiling, set_output_name
+
+start_from_env()
+
 
 class DefaultCommandGroup(click.Group):
-    """allow a default command for a group"""
+    """
+    allow a default command for a group
+
+    Commands listed in `lazy_commands` are only imported when they are resolved,
+    so a one-off query doesn't pay to import every other subcommand's dependencies.
+    """
+
+    def __init__(self, *args, lazy_commands: dict[str, str] | None = None, **kwargs):
+        self.default_command = kwargs.pop("default_command", None)
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
 
     def command(self, *args, **kwargs):
         default_command = kwargs.pop("default_command", False)
@@ -21,23 +37,64 @@ class DefaultCommandGroup(click.Group):
 
         return decorator
 
+    def list_commands(self, ctx):
+        return sorted({*self.commands, *self.lazy_commands})
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            # Importing the module registers the command on this group.
+            with span(f"import {self.lazy_commands[cmd_name]}", cat="import"):
+                importlib.import_module(self.lazy_commands[cmd_name])
+
+        return super(DefaultCommandGroup, self).get_command(ctx, cmd_name)
+
     def resolve_command(self, ctx, args):
         try:
             # Test if the command parses
             return super(DefaultCommandGroup, self).resolve_command(ctx, args)
         except click.UsageError:
             # Command did not parse, assume it is the default command
+            default_command = self.get_command(ctx, self.default_command)
+            default_param_names = {p.name for p in default_command.params}
             param_args = []
             for k, v in ctx.params.items():
-                if v:
+                # Group options are applied in `cli`, only pass on ones the default command takes
+                if v and k in default_param_names:
                     param_args.append(f"--{k}")
 
             args = [self.default_command, *param_args, *args]
             return super(DefaultCommandGroup, self).resolve_command(ctx, args)
 
 
-@click.group(cls=DefaultCommandGroup)
-def cli():
+@click.group(
+    cls=DefaultCommandGroup,
+    default_command="<default>",
+    lazy_commands={
+        "<default>": "src.cli.default",
+        "batch": "src.cli.batch",
+        "chat": "src.cli.chat",
+        "config": "src.cli.config",
+        "embed": "src.cli.embed",
+        "img": "src.cli.img",
+        "index": "src.cli.index",
+        "stats": "src.cli.stats",
+        "web": "src.cli.web",
+    },
+)
+@click.option("--no-cache", is_flag=True, default=False, help="Don't use cached responses")
+@click.option(
+    "--trace",
+    is_flag=True,
+    default=False,
+    help="Save a Chrome trace of where the time went to ~/.ask/traces (or set ASK_TRACE)",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Save a cProfile profile to ~/.ask/profiles (or set ASK_PROFILE)",
+)
+def cli(no_cache: bool, trace: bool, profile: bool):
     """
     Ask your language model a question.
 
@@ -51,4 +108,23 @@ def cli():
       ask chat
 
     """
-    pass
+    if no_cache:
+        from src.cache import disable_response_cache
+
+        disable_response_cache()
+
+    from src.usage import set_default_action
+
+    # Vendor calls are put down to the command that made them, unless an action says otherwise
+    ctx = click.get_current_context()
+    command_name = ctx.invoked_subcommand.strip("<>") if ctx.invoked_subcommand else "ask"
+    set_default_action(command_name)
+    set_output_name(command_name)
+    if trace:
+        start_tracing()
+
+    if profile:
+        start_profiling()
+
+    # Ends once the subcommand has finished
+    ctx.with_resource(span(f"ask {command_name}", cat="command"))
@@ -25,6 +25,7 @@ def config(show_list: bool):
             else:
                 rich_print(f"  {key}: {value}")
 
+        print_cache_stats()
         return
 
     openai_key = click.prompt(
@@ -55,3 +56,23 @@ def config(show_list: bool):
         config["DALLE_IMAGE_OPENER"] = dalle_opener
 
     save_config(config)
+
+
+def print_cache_stats():
+    from src.cache import get_response_cache
+
+    try:
+        response_cache = get_response_cache()
+    except ValueError:
+        # No API keys configured yet
+        return
+
+    if response_cache is None:
+        return
+
+    counters = response_cache.get_counters()
+    rich_print(f"\n[bold]Response cache:[/bold]\n")
+    rich_print(f"  entries: {counters['entries']} ({counters['bytes'] // 1024} KiB)")
+    rich_print(f"  hits: {counters['hits']}")
+    rich_print(f"  misses: {counters['misses']}")
+    rich_print(f"  evictions: {counters['evictions']}")
@@ -1,14 +1,14 @@
 import sys
 
 import click
-from rich.padding import Padding
-from rich.markup import escape
-from rich.progress import Progress
 from rich.console import Console
 
-from src.settings import load_settings
-from src import vendors
+from src.vendors.router import select_vendor
+from src.vendors.resilience import VendorError
+from src.vendors.routing import use_route
+from src.schema import ModelRoute
 from .cli import cli
+from .stream import print_stream
 
 console = Console(width=100)
 
@@ -19,32 +19,22 @@ def default(text: tuple[str, ...]):
     """
     Simple one-off queries with no chat history
     """
-    settings = load_settings()
-
     # Initialize with stdin/argument text if provided
     query_text = " ".join(text)
     if not sys.stdin.isatty():
         stdin_text = click.get_text_stream("stdin").read()
         query_text = f"{query_text}\n{stdin_text}" if query_text else stdin_text
 
-    if settings.ANTHROPIC_API_KEY:
-        vendor = vendors.anthropic
-    elif settings.OPENAI_API_KEY:
-        vendor = vendors.openai
-    else:
+    selected = select_vendor()
+    if selected is None:
         raise click.ClickException("Set either ANTHROPIC_API_KEY or OPENAI_API_KEY as envars")
 
-    model_option = vendor.DEFAULT_MODEL_OPTION
-    model = vendor.MODEL_OPTIONS[model_option]
-
     # User asks a single questions
-    with Progress(transient=True) as progress:
-        progress.add_task(
-            f"[red]Asking {vendor.MODEL_NAME} {model_option}...",
-            start=False,
-            total=None,
-        )
-        answer_text = vendor.answer_query(query_text, model)
-
-    formatted_text = Padding(escape(answer_text), (1, 2))
-    console.print(formatted_text)
+    vendor, model_option = selected
+    with use_route(vendor, model_option, ModelRoute.Chat) as model_option:
+        model = vendor.MODEL_OPTIONS[model_option]
+        deltas = vendor.stream_answer_query(query_text, model)
+        try:
+            print_stream(console, deltas, f"[red]Asking {vendor.MODEL_NAME} {model_option}...")
+        except VendorError as e:
+            raise click.ClickException(str(e))
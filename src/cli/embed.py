@@ -0,0 +1,31 @@
+from rich import print as rich_print
+from rich.progress import Progress
+
+from src.embeddings import get_embedder
+from src.vectors import embed_search_index, get_vector_store
+from .cli import cli
+
+
+@cli.command()
+def embed():
+    """
+    Embed the files indexed with `ask index` for \\recall in chat
+
+    \b
+    Only chunks that changed since the last run are embedded again:
+      ask index ~/notes && ask embed
+    """
+    embedder = get_embedder()
+    with Progress(transient=True) as progress:
+        task_id = progress.add_task(f"[red]Embedding with {embedder.name}...", total=None)
+        num_embedded, num_removed = embed_search_index(
+            embedder,
+            on_progress=lambda done, total: progress.update(task_id, completed=done, total=total),
+        )
+
+    store = get_vector_store(embedder)
+    rich_print(
+        f"[bold]Embedded with {embedder.name}:[/bold] [green]{num_embedded} new chunks[/green], "
+        f"[red]{num_removed} removed[/red]\n"
+        f"Vector store at {store.path} has {len(store.get_keys())} chunks"
+    )
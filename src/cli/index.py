@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import click
+from rich import print as rich_print
+from rich.progress import Progress
+
+from src.search import index_directory, get_search_index, SEARCH_INDEX_FILE
+from .cli import cli
+
+
+@cli.command()
+@click.argument("dirs", nargs=-1, type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option("--jobs", "-j", type=int, default=None, help="Number of worker processes")
+def index(dirs: tuple[Path, ...], jobs: int | None):
+    """
+    Index folders of text files for \\search in chat
+
+    \b
+    Only files that changed since the last run are read again:
+      ask index ~/notes ~/code/myproject
+    Run with no folders to see what's indexed:
+      ask index
+    """
+    search_index = get_search_index()
+    for dir_path in dirs:
+        with Progress(transient=True) as progress:
+            task_id = progress.add_task(f"[red]Indexing {dir_path}...", total=None)
+            summary = index_directory(
+                dir_path,
+                max_workers=jobs,
+                on_progress=lambda done, total: progress.update(
+                    task_id, completed=done, total=total
+                ),
+            )
+
+        rich_print(
+            f"[bold]Indexed {dir_path}:[/bold] {summary.num_files} files, "
+            f"[green]{summary.num_indexed} updated[/green] ({summary.num_chunks} chunks), "
+            f"{summary.num_unchanged} unchanged, {summary.num_skipped} not text, "
+            f"[red]{summary.num_removed} removed[/red]"
+        )
+
+    stats = get_search_index().get_stats()
+    rich_print(
+        f"\nIndex at {SEARCH_INDEX_FILE} has {stats['files']} files in {stats['chunks']} chunks"
+    )
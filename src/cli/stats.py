@@ -0,0 +1,139 @@
+import time
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from src.settings import load_settings
+from src.usage import summarize_usage, percentile, get_usage_store, USAGE_GROUPS, USAGE_FILE
+from .cli import cli
+
+console = Console()
+
+
+@cli.command()
+@click.option(
+    "--by",
+    "group_by",
+    type=click.Choice(USAGE_GROUPS),
+    default="day",
+    show_default=True,
+    help="Group calls by",
+)
+@click.option("--days", type=int, default=30, show_default=True, help="Include the last N days")
+@click.option("--prune", is_flag=True, default=False, help="Delete calls older than --days")
+def stats(group_by: str, days: int, prune: bool):
+    """
+    Show tokens, cost and latency of vendor API calls
+
+    \b
+    Examples:
+      ask stats
+      ask stats --by model --days 7
+      ask stats --by action
+    """
+    if get_usage_store() is None:
+        raise click.ClickException(
+            "Usage tracking is off, set USAGE_TRACKING to true to turn it on"
+        )
+
+    since = time.time() - days * 24 * 60 * 60
+    if prune:
+        num_pruned = get_usage_store().prune(since)
+        console.print(f"[dim]Deleted {num_pruned} calls older than {days} days[/dim]")
+
+    summaries = summarize_usage(group_by, since)
+    if not summaries:
+        console.print(f"No vendor calls in the last {days} days")
+        return
+
+    table = Table(
+        title=f"Vendor calls in the last {days} days (latency in seconds)", title_style="bold"
+    )
+    table.add_column(group_by.title(), no_wrap=True)
+    columns = (
+        "Calls",
+        "Errors",
+        "p50",
+        "p95",
+        "TTFB p50",
+        "TTFB p95",
+        "In tok",
+        "Out tok",
+        "Cost $",
+    )
+    for column in columns:
+        table.add_column(column, justify="right")
+
+    for summary in sorted(summaries, key=lambda summary: summary.group):
+        table.add_row(
+            summary.group,
+            str(summary.num_calls),
+            str(summary.num_errors) if summary.num_errors else "",
+            format_seconds(percentile(summary.wall_ms, 50)),
+            format_seconds(percentile(summary.wall_ms, 95)),
+            format_seconds(percentile(summary.ttfb_ms, 50)),
+            format_seconds(percentile(summary.ttfb_ms, 95)),
+            f"{summary.input_tokens:,}",
+            f"{summary.output_tokens:,}",
+            f"{summary.cost:.4f}",
+        )
+
+    total_cost = sum(summary.cost for summary in summaries)
+    total_calls = sum(summary.num_calls for summary in summaries)
+    console.print(table)
+    console.print(
+        f"[bold]{total_calls} calls, ${total_cost:.4f} estimated[/bold] [dim]({USAGE_FILE})[/dim]",
+        highlight=False,
+    )
+    if load_settings().ADAPTIVE_ROUTING:
+        print_vendor_health()
+
+
+def print_vendor_health():
+    """
+    What the adaptive router knows of each vendor's models, and what it last picked
+    """
+    from src.vendors.router import VendorRouter, ROUTER_FILE
+
+    if not ROUTER_FILE.exists():
+        return
+
+    router = VendorRouter(ROUTER_FILE)
+    now = time.time()
+    table = Table(title="Vendor health (moving averages, latency in seconds)", title_style="bold")
+    table.add_column("Vendor", no_wrap=True)
+    table.add_column("Model", no_wrap=True)
+    table.add_column("Class", no_wrap=True)
+    for column in ("TTFT", "Errors %", "Calls", "Chosen", "Score"):
+        table.add_column(column, justify="right")
+
+    for _, pair in sorted(router.pairs.items()):
+        score = pair.get_score(now)
+        option = router.get_option(pair.vendor, pair.model)
+        # The router file can name vendors, or hold catalogs, from an older run
+        quality = router.catalogs.get(pair.vendor, {}).get("classes", {}).get(option)
+        table.add_row(
+            pair.vendor,
+            option or pair.model,
+            quality or "",
+            format_seconds(pair.ttft_ms),
+            f"{pair.get_error_rate(now) * 100:.1f}",
+            str(pair.num_calls),
+            str(pair.num_chosen),
+            format_seconds(score),
+        )
+
+    console.print(table)
+    decision = router.last_decision
+    if decision:
+        decided_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(decision["at"]))
+        console.print(
+            f"Last picked [bold]{decision['vendor']} {decision['option']}[/bold] "
+            f"({decision['reason']}) at {decided_at}",
+            highlight=False,
+        )
+
+
+def format_seconds(ms: float | None) -> str:
+    return "" if ms is None else f"{ms / 1000:.2f}"
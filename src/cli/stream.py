@@ -0,0 +1,87 @@
+import sys
+import time
+from collections import deque
+from typing import Iterator
+
+from rich.console import Console
+from rich.constrain import Constrain
+from rich.live import Live
+from rich.markup import escape
+from rich.padding import Padding
+from rich.spinner import Spinner
+
+from src.trace import span
+
+
+def print_stream(
+    console: Console, deltas: Iterator[str], status: str, width: int | None = None
+) -> str:
+    """
+    Render streamed text deltas as they arrive and return the full text.
+    Raw text is written straight to stdout when it isn't a terminal.
+    """
+    if not console.is_terminal:
+        return write_stream(deltas)
+
+    start_time = time.perf_counter()
+    first_token_time = None
+    chunks = []
+    # Only show the tail of the answer while streaming, so it always fits on screen.
+    tail = TextTail(max(console.height - 4, 1))
+    spinner = Spinner("dots", text=status)
+    with Live(spinner, console=console, refresh_per_second=12, transient=True) as live:
+        for delta in deltas:
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start_time
+
+            chunks.append(delta)
+            tail.add(delta)
+            with span("render delta", cat="render"):
+                live.update(Constrain(Padding(escape(tail.get_text()), (1, 2)), width=width))
+
+    total_time = time.perf_counter() - start_time
+    text = "".join(chunks)
+    with span("render answer", cat="render", num_chars=len(text)):
+        console.print(Padding(escape(text), (1, 2)), width=width)
+    if first_token_time is not None:
+        console.print(
+            f"  [dim]first token {first_token_time:.2f}s, total {total_time:.2f}s[/dim]",
+            highlight=False,
+        )
+
+    return text
+
+
+class TextTail:
+    """
+    The last lines of text that arrives a piece at a time, kept up to date with each piece
+    rather than splitting everything received so far again
+    """
+
+    def __init__(self, max_lines: int):
+        self.max_lines = max_lines
+        self.lines = deque(maxlen=max_lines)
+        self.current_line = ""
+
+    def add(self, text: str):
+        first, *rest = text.split("\n")
+        self.current_line += first
+        for line in rest:
+            self.lines.append(self.current_line)
+            self.current_line = line
+
+    def get_text(self) -> str:
+        lines = [*self.lines, self.current_line] if self.current_line else [*self.lines]
+        return "\n".join(lines[-self.max_lines :])
+
+
+def write_stream(deltas: Iterator[str]) -> str:
+    chunks = []
+    for delta in deltas:
+        chunks.append(delta)
+        sys.stdout.write(delta)
+        sys.stdout.flush()
+
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+    return "".join(chunks)
@@ -1,25 +1,87 @@
+import sys
+
 import click
 from rich import print as rich_print
 from rich.padding import Padding
 from rich.markup import escape
+from rich.progress import (
+    Progress,
+    TextColumn,
+    BarColumn,
+    DownloadColumn,
+    TransferSpeedColumn,
+)
 
-from src.web import fetch_text_for_url
+from src.web import fetch_texts_for_urls, MAX_CONCURRENT_FETCHES
 from .cli import cli
 
+# Smaller downloads finish too quickly for a progress bar to be worth showing
+PROGRESS_MIN_BYTES = 1024 * 1024
+
 
 @cli.command()
 @click.argument("urls", nargs=-1)
 @click.option("--pretty", is_flag=True, default=False, help="Use rich text formatting for output")
-def web(urls, pretty):
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    default=MAX_CONCURRENT_FETCHES,
+    show_default=True,
+    help="Max number of URLs fetched at once",
+)
+@click.option(
+    "--max-age",
+    type=int,
+    default=None,
+    help="Use cached pages fetched within this many seconds without revalidating them",
+)
+@click.option(
+    "--pages",
+    default=None,
+    help="Only read these pages of PDFs, eg. 10-20 or 1-3,7 (or add #pages=10-20 to a URL)",
+)
+def web(urls, pretty, jobs, max_age, pages):
     """Scrape content from provided URLs (HTML, PDFs)"""
 
-    for url in urls:
-        url_text = fetch_text_for_url(url)
+    progress = Progress(
+        TextColumn("[blue]{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        transient=True,
+        disable=not sys.stdout.isatty(),
+    )
+    with progress:
+        for url, url_text in fetch_texts_for_urls(
+            list(urls),
+            max_workers=max(jobs, 1),
+            max_age=max_age,
+            pages=pages,
+            on_progress=track_downloads(progress),
+        ):
+            if pretty:
+                rich_print(f"\n[bold blue]Content from {url}:[/bold blue]")
+                formatted_text = Padding(escape(url_text), (1, 2))
+                rich_print(formatted_text)
+            else:
+                print(f"\nContent from {url}:")
+                print(url_text)
+
+
+def track_downloads(progress: Progress):
+    """
+    Returns a fetch progress callback that adds a bar for each large download
+    """
+    task_ids = {}
+
+    def on_progress(url: str, num_bytes: int, total_bytes: int | None):
+        if url not in task_ids:
+            if max(num_bytes, total_bytes or 0) < PROGRESS_MIN_BYTES:
+                return
+
+            task_ids[url] = progress.add_task(url, total=total_bytes)
+
+        progress.update(task_ids[url], completed=num_bytes)
 
-        if pretty:
-            rich_print(f"\n[bold blue]Content from {url}:[/bold blue]")
-            formatted_text = Padding(escape(url_text), (1, 2))
-            rich_print(formatted_text)
-        else:
-            print(f"\nContent from {url}:")
-            print(url_text)
+    return on_progress
@@ -0,0 +1,114 @@
+import re
+from functools import lru_cache
+
+from .settings import load_settings
+from .schema import ChatMessage, Role
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+MESSAGE_OVERHEAD_TOKENS = 4
+PINNED_MESSAGES = 4
+# Older messages are dropped in chunks of about budget / DROP_CHUNK_DIVISOR tokens, so that the
+# start of what's sent, which the vendor has cached, only changes every few turns
+DROP_CHUNK_DIVISOR = 4
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """
+    Local estimate of how many tokens a vendor will count for this text.
+    Errs on the high side: roughly one token per 4 chars of a word, and one per symbol.
+    """
+    return sum((len(piece) + 3) // 4 for piece in TOKEN_PATTERN.findall(text))
+
+
+def count_message_tokens(messages: list[ChatMessage]) -> int:
+    return sum(count_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def fit_context(messages: list[ChatMessage], budget: int | None = None) -> list[ChatMessage]:
+    """
+    Returns the messages to send so that a request stays under the token budget.
+    The most recent messages are always kept (truncated if they're huge on their own),
+    older ones are dropped, oldest first and a chunk at a time, and replaced with a note saying so.
+    """
+    if budget is None:
+        budget = load_settings().CONTEXT_TOKEN_BUDGET
+
+    if count_message_tokens(messages) <= budget:
+        return messages
+
+    pinned = messages[-PINNED_MESSAGES:]
+    older = messages[:-PINNED_MESSAGES]
+
+    # Reserve room for the note about omitted messages
+    remaining = budget - 32
+    pinned_budget = remaining // len(pinned)
+    pinned_tokens = count_message_tokens(pinned)
+    if pinned_tokens > remaining:
+        pinned = [truncate_message(m, pinned_budget) for m in pinned]
+        pinned_tokens = count_message_tokens(pinned)
+
+    remaining -= pinned_tokens
+    chunk_tokens = max(budget // DROP_CHUNK_DIVISOR, 1)
+    num_omitted = get_num_omitted(older, remaining, chunk_tokens)
+    kept = older[num_omitted:]
+    if not num_omitted:
+        return [*kept, *pinned]
+
+    omitted_tokens = count_message_tokens(older[:num_omitted])
+    note = ChatMessage(
+        role=Role.User,
+        content=(
+            f"[{num_omitted} earlier messages (~{omitted_tokens} tokens) "
+            "were omitted to fit the context window]"
+        ),
+    )
+    return [note, *kept, *pinned]
+
+
+def get_num_omitted(messages: list[ChatMessage], budget: int, chunk_tokens: int) -> int:
+    """
+    How many of the oldest messages to drop for the rest to fit in the budget.
+    They're only dropped up to where another chunk_tokens have been dropped, which depends on the
+    messages before that point and not after, so the same ones are dropped for as long as the rest
+    fit, rather than one more each turn.
+    """
+    message_tokens = [count_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in messages]
+    kept_tokens = sum(message_tokens)
+    if kept_tokens <= budget:
+        return 0
+
+    dropped_tokens = 0
+    next_boundary = chunk_tokens
+    for num_omitted, num_tokens in enumerate(message_tokens, start=1):
+        dropped_tokens += num_tokens
+        kept_tokens -= num_tokens
+        if dropped_tokens >= next_boundary:
+            if kept_tokens <= budget:
+                return num_omitted
+
+            next_boundary = (dropped_tokens // chunk_tokens + 1) * chunk_tokens
+
+    return len(messages)
+
+
+def truncate_message(message: ChatMessage, max_tokens: int) -> ChatMessage:
+    """
+    Keep the head and tail of a message that is too long to send in full
+    """
+    num_tokens = count_tokens(message.content)
+    if num_tokens <= max_tokens:
+        return message
+
+    # Scale chars by the token estimate for this text
+    max_chars = max(int(len(message.content) * max_tokens / num_tokens) - 64, 0)
+    while True:
+        head = message.content[: max_chars // 2]
+        tail = message.content[len(message.content) - max_chars // 2 :]
+        num_truncated = len(message.content) - len(head) - len(tail)
+        content = f"{head}\n\n[... {num_truncated} chars truncated ...]\n\n{tail}"
+        # The note and words cut in half can tip it over, eg. for text with many short words
+        if count_tokens(content) <= max_tokens or not max_chars:
+            return ChatMessage(role=message.role, content=content)
+
+        max_chars = int(max_chars * 0.9)
@@ -0,0 +1,92 @@
+import re
+import hashlib
+from typing import Protocol, TYPE_CHECKING
+
+from .settings import load_settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class Embedder(Protocol):
+    """
+    Turns texts into unit length float32 vectors, one row per text.
+    Vectors from different embedders can't be compared, so each has its own store, keyed by name.
+    """
+
+    name: str
+    dimensions: int
+
+    def embed(self, texts: list[str]) -> "np.ndarray": ...
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str | None = None, dimensions: int = 1536):
+        from src import vendors
+
+        self.model = model or vendors.openai.EMBEDDING_MODEL
+        self.name = f"openai-{self.model}"
+        self.dimensions = dimensions
+
+    def embed(self, texts: list[str]) -> "np.ndarray":
+        import numpy as np
+        from src import vendors
+
+        vectors = np.array(vendors.openai.get_embeddings(texts, self.model), dtype=np.float32)
+        return normalize(vectors)
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embeddings made by hashing words and word pairs into a fixed number
+    of buckets. Far less clever than a real model, but needs no network, so it's used for
+    tests and offline work.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.name = f"hashing-{dimensions}"
+        self.dimensions = dimensions
+
+    def embed(self, texts: list[str]) -> "np.ndarray":
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = WORD_PATTERN.findall(text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for feature in features:
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                # The top bit picks a sign, so that collisions tend to cancel out
+                vectors[row, value % self.dimensions] += 1 if value >> 63 else -1
+
+        return normalize(vectors)
+
+
+def normalize(vectors: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+def get_embedder() -> Embedder:
+    """
+    The embedder set by the EMBEDDER setting, otherwise OpenAI's if there's a key for it
+    """
+    try:
+        settings = load_settings()
+        name = settings.EMBEDDER or ("openai" if settings.OPENAI_API_KEY else "hashing")
+    except ValueError:
+        # No API keys configured
+        name = "hashing"
+
+    if name == "openai":
+        return OpenAIEmbedder()
+    elif name == "hashing":
+        return HashingEmbedder()
+    else:
+        raise ValueError(f"Unknown embedder {name!r}, use openai or hashing")
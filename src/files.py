@@ -0,0 +1,374 @@
+import re
+import mmap
+import codecs
+import threading
+from pathlib import Path
+from itertools import islice
+
+from .context import count_tokens
+
+# Every LINE_INDEX_STEP-th line's byte offset is indexed, so finding any line scans at most this many
+LINE_INDEX_STEP = 1024
+MAX_LINE_INDEXES = 32
+SAMPLE_BYTES = 8192
+# A high guess, so that a chunk is rarely trimmed after its tokens are counted
+BYTES_PER_TOKEN = 4
+NEWLINE_PATTERN = re.compile(b"\n")
+WIDE_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+WIDE_ENCODINGS = ("utf-16", "utf-32")
+LINES_SUFFIX_PATTERN = re.compile(r":(\d+)(?:-(\d*))?$")
+TAIL_OPTION_PATTERN = re.compile(r"\s+--tail\s+(\d+)\s*$")
+BYTES_OPTION_PATTERN = re.compile(r"\s+--bytes\s+(\d+)-(\d*)\s*$")
+
+_line_indexes: dict[str, "LineIndex"] = {}
+_line_indexes_lock = threading.Lock()
+
+
+class FileRange:
+    """
+    Which part of a file to read: lines (1-based, inclusive), the last N lines or a byte range
+    """
+
+    def __init__(
+        self,
+        first_line: int | None = None,
+        last_line: int | None = None,
+        tail: int | None = None,
+        start_byte: int | None = None,
+        end_byte: int | None = None,
+    ):
+        self.first_line = first_line
+        self.last_line = last_line
+        self.tail = tail
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+
+
+class FileExcerpt:
+    """
+    Text read from part of a file, and where it came from
+    """
+
+    def __init__(
+        self,
+        text: str,
+        start_byte: int,
+        end_byte: int,
+        size: int,
+        is_truncated: bool,
+        first_line: int | None = None,
+        num_lines: int | None = None,
+        is_tail: bool = False,
+    ):
+        self.text = text
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.size = size
+        self.is_truncated = is_truncated
+        self.first_line = first_line
+        self.num_lines = num_lines
+        self.is_tail = is_tail
+
+    @property
+    def is_whole_file(self) -> bool:
+        return self.start_byte == 0 and self.end_byte == self.size
+
+    @property
+    def line_count(self) -> int:
+        if not self.text:
+            return 0
+
+        return self.text.count("\n") + int(not self.text.endswith("\n"))
+
+    @property
+    def last_line(self) -> int | None:
+        if self.first_line is None:
+            return None
+
+        return self.first_line + max(self.line_count - 1, 0)
+
+    def describe(self) -> str:
+        if self.first_line is not None:
+            of_lines = f" of {self.num_lines:,}" if self.num_lines is not None else ""
+            return f"lines {self.first_line:,}-{self.last_line:,}{of_lines}"
+        elif self.is_tail:
+            return f"last {self.line_count:,} lines"
+        else:
+            return f"bytes {self.start_byte:,}-{self.end_byte:,} of {self.size:,}"
+
+
+class LineIndex:
+    """
+    Sparse index of line start offsets, valid for as long as the file's size and mtime don't change
+    """
+
+    def __init__(self, offsets: list[int], num_lines: int, size: int, mtime_ns: int):
+        self.offsets = offsets
+        self.num_lines = num_lines
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+
+def parse_file_location(location: str) -> tuple[str, FileRange]:
+    """
+    Split the argument to \\file into a path and the range to read, eg.
+    "app.log:1000-2000", "app.log:1000-", "app.log --tail 500", "app.bin --bytes 0-4096"
+    """
+    match = TAIL_OPTION_PATTERN.search(location)
+    if match:
+        return location[: match.start()].strip(), FileRange(tail=int(match.group(1)))
+
+    match = BYTES_OPTION_PATTERN.search(location)
+    if match:
+        end_byte = int(match.group(2)) if match.group(2) else None
+        file_range = FileRange(start_byte=int(match.group(1)), end_byte=end_byte)
+        return location[: match.start()].strip(), file_range
+
+    location = location.strip()
+    match = LINES_SUFFIX_PATTERN.search(location)
+    if match and not Path(location).exists():
+        first_line = int(match.group(1))
+        if match.group(2) is None:
+            last_line = first_line
+        elif match.group(2):
+            last_line = int(match.group(2))
+        else:
+            last_line = None
+
+        if first_line < 1 or (last_line is not None and last_line < first_line):
+            raise ValueError(f"Invalid line range {match.group(0)[1:]!r}")
+
+        return location[: match.start()], FileRange(first_line=first_line, last_line=last_line)
+
+    return location, FileRange()
+
+
+def detect_encoding(sample: bytes) -> str | None:
+    """
+    Guess a file's encoding from its first bytes, returns None if it looks like a binary file
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    # UTF-32's little endian BOM starts with UTF-16's
+    for bom, encoding in WIDE_BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    if b"\x00" in sample:
+        return None
+
+    try:
+        # Incremental so that a character cut off at the end of the sample isn't an error
+        codecs.getincrementaldecoder("utf-8")().decode(sample)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        from charset_normalizer import from_bytes
+    except ImportError:
+        # Only installed because requests depends on it. Any bytes decode as latin-1
+        return "latin-1"
+
+    match = from_bytes(sample).best()
+    return match.encoding if match else None
+
+
+class FileReader:
+    """
+    Reads parts of a text file through mmap, so that only the pages which are read
+    are loaded into memory, however big the file is.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path).expanduser()
+        self.file = open(self.path, "rb")
+        stat = self.path.stat()
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        # Empty files can't be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        encoding = detect_encoding(self.data[:SAMPLE_BYTES])
+        if encoding is None:
+            self.close()
+            raise ValueError(f"{path} looks like a binary file, which can't be read as text")
+        elif encoding in WIDE_ENCODINGS:
+            # Lines are found by searching for b"\n", which is two or four bytes in these
+            self.close()
+            raise ValueError(
+                f"{path} is {encoding.upper()} text, which isn't supported. "
+                f"Convert it to UTF-8 first, eg. iconv -f {encoding.upper()} -t UTF-8"
+            )
+
+        self.encoding = encoding
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+        self.file.close()
+
+    def read(self, file_range: FileRange, max_tokens: int) -> FileExcerpt:
+        """
+        Read a range of the file, cut down to the whole lines that fit in max_tokens
+        """
+        if file_range.tail is not None:
+            tail_start = self.tail_offset(file_range.tail)
+            start, end, text = self.read_between(tail_start, self.size, max_tokens, keep_end=True)
+            excerpt = FileExcerpt(
+                text, start, end, self.size, is_truncated=start > tail_start, is_tail=True
+            )
+            line_index = get_cached_line_index(self)
+            if line_index:
+                excerpt.first_line = line_index.num_lines - excerpt.line_count + 1
+                excerpt.num_lines = line_index.num_lines
+
+            return excerpt
+        elif file_range.start_byte is not None:
+            requested_start = min(file_range.start_byte, self.size)
+            requested_end = min(file_range.end_byte or self.size, self.size)
+            requested_end = max(requested_start, requested_end)
+            start, end, text = self.read_between(requested_start, requested_end, max_tokens)
+            return FileExcerpt(text, start, end, self.size, is_truncated=end < requested_end)
+        elif file_range.first_line is None and self.size <= max_tokens * BYTES_PER_TOKEN:
+            start, end, text = self.read_between(0, self.size, max_tokens)
+            if end == self.size:
+                return FileExcerpt(text, start, end, self.size, is_truncated=False)
+
+        # Otherwise read by line number, indexing the file so that later ranges are quick to find
+        line_index = self.get_line_index()
+        first_line = file_range.first_line or 1
+        if first_line > max(line_index.num_lines, 1):
+            raise ValueError(f"{self.path} only has {line_index.num_lines:,} lines")
+
+        last_line = min(file_range.last_line or line_index.num_lines, line_index.num_lines)
+        requested_end = self.line_offset(last_line)
+        start = self.line_offset(first_line - 1)
+        start, end, text = self.read_between(start, requested_end, max_tokens)
+        return FileExcerpt(
+            text,
+            start,
+            end,
+            self.size,
+            is_truncated=end < requested_end,
+            first_line=first_line,
+            num_lines=line_index.num_lines,
+        )
+
+    def read_between(
+        self, start: int, end: int, max_tokens: int, keep_end: bool = False
+    ) -> tuple[int, int, str]:
+        """
+        Returns (start, end, text) for the bytes between start and end, cut down to whole lines
+        that fit in max_tokens, keeping the first lines or, with keep_end, the last ones.
+        """
+        max_bytes = max_tokens * BYTES_PER_TOKEN
+        while True:
+            if end - start > max_bytes and keep_end:
+                start = self.next_line_offset(end - max_bytes, end)
+            elif end - start > max_bytes:
+                end = self.prev_line_offset(start, start + max_bytes)
+
+            text = self.data[start:end].decode(self.encoding, errors="replace")
+            # Not cached, big chunks of text would clog up count_tokens' cache
+            num_tokens = count_tokens.__wrapped__(text)
+            if num_tokens <= max_tokens:
+                return start, end, text
+
+            max_bytes = int((end - start) * max_tokens / num_tokens * 0.9)
+
+    def prev_line_offset(self, start: int, end: int) -> int:
+        """
+        The start of the line that contains end, or end itself if it's in the first line after start
+        """
+        idx = self.data.rfind(b"\n", start, end)
+        return idx + 1 if idx != -1 else end
+
+    def next_line_offset(self, start: int, end: int) -> int:
+        """
+        The start of the first line after start, or start itself if it's in the last line before end
+        """
+        idx = self.data.find(b"\n", start, end)
+        return idx + 1 if idx != -1 and idx + 1 < end else start
+
+    def tail_offset(self, num_lines: int) -> int:
+        """
+        Offset of the start of the last num_lines lines
+        """
+        end = self.size
+        if self.data[-1:] == b"\n":
+            # The trailing newline ends the last line, it doesn't start a new one
+            end -= 1
+
+        for _ in range(num_lines):
+            idx = self.data.rfind(b"\n", 0, end)
+            if idx == -1:
+                return 0
+
+            end = idx
+
+        return end + 1
+
+    def get_line_index(self) -> LineIndex:
+        line_index = get_cached_line_index(self)
+        if line_index is None:
+            line_index = build_line_index(self)
+            with _line_indexes_lock:
+                if len(_line_indexes) >= MAX_LINE_INDEXES:
+                    _line_indexes.pop(next(iter(_line_indexes)))
+
+                _line_indexes[str(self.path.resolve())] = line_index
+
+        return line_index
+
+    def line_offset(self, line_idx: int) -> int:
+        """
+        Byte offset of the start of a 0-based line, or the file size past the last line
+        """
+        line_index = self.get_line_index()
+        if line_idx >= line_index.num_lines:
+            return self.size
+
+        offset = line_index.offsets[line_idx // LINE_INDEX_STEP]
+        for _ in range(line_idx % LINE_INDEX_STEP):
+            offset = self.data.find(b"\n", offset) + 1
+
+        return offset
+
+
+def get_cached_line_index(reader: FileReader) -> LineIndex | None:
+    line_index = _line_indexes.get(str(reader.path.resolve()))
+    if line_index and (line_index.size, line_index.mtime_ns) == (reader.size, reader.mtime_ns):
+        return line_index
+
+    return None
+
+
+def build_line_index(reader: FileReader) -> LineIndex:
+    if not reader.size:
+        return LineIndex([0], 0, reader.size, reader.mtime_ns)
+
+    # islice skips through the matches in C, far quicker than a Python loop over every line
+    newlines = NEWLINE_PATTERN.finditer(reader.data)
+    offsets = [0]
+    offsets.extend(
+        match.end() for match in islice(newlines, LINE_INDEX_STEP - 1, None, LINE_INDEX_STEP)
+    )
+    # There are fewer than LINE_INDEX_STEP lines after the last indexed offset
+    num_newlines_after = sum(1 for _ in NEWLINE_PATTERN.finditer(reader.data, offsets[-1]))
+    num_newlines = (len(offsets) - 1) * LINE_INDEX_STEP + num_newlines_after
+    is_last_line_unterminated = reader.data[-1:] != b"\n"
+    num_lines = num_newlines + int(is_last_line_unterminated)
+    return LineIndex(offsets, num_lines, reader.size, reader.mtime_ns)
@@ -0,0 +1,157 @@
+import os
+import re
+import tempfile
+import multiprocessing
+from io import BytesIO
+from pathlib import Path
+from typing import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+# Spinning up worker processes only pays off for documents with a lot of pages
+PARALLEL_MIN_PAGES = 16
+PAGES_PER_CHUNK = 8
+MAX_PDF_WORKERS = 8
+PAGE_SELECTOR_PATTERN = re.compile(r"^(\d+)(?:-(\d*))?$")
+
+# Each worker process opens the document once, then extracts the chunks of pages it's given
+_worker_reader = None
+
+
+def split_page_selector(location: str) -> tuple[str, str | None]:
+    """
+    Split a path or URL like "report.pdf#pages=10-20" into ("report.pdf", "10-20")
+    """
+    location, _, fragment = location.partition("#pages=")
+    return location, fragment or None
+
+
+def parse_page_selector(selector: str) -> list[tuple[int, int | None]]:
+    """
+    Parse a selector of 1-based, inclusive page ranges, eg. "10-20", "3", "1-3,7,30-",
+    into (first, last) pairs, where last is None for a range that runs to the end.
+    """
+    page_ranges = []
+    for part in selector.replace(" ", "").split(","):
+        match = PAGE_SELECTOR_PATTERN.match(part)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Invalid page selector {selector!r}, use something like 1-3,7,10-")
+
+        first = int(match.group(1))
+        if match.group(2) is None:
+            last = first
+        elif match.group(2):
+            last = int(match.group(2))
+        else:
+            last = None
+
+        if last is not None and last < first:
+            raise ValueError(f"Invalid page range {part!r}, the last page is before the first")
+
+        page_ranges.append((first, last))
+
+    return page_ranges
+
+
+def select_pages(selector: str | None, num_pages: int) -> list[int]:
+    """
+    The 0-based indexes of the pages picked by a selector, in document order
+    """
+    if not selector:
+        return list(range(num_pages))
+
+    page_idxs = set()
+    for first, last in parse_page_selector(selector):
+        last = num_pages if last is None else min(last, num_pages)
+        page_idxs.update(range(first - 1, last))
+
+    if not page_idxs:
+        raise ValueError(f"No pages match {selector!r}, the document has {num_pages} pages")
+
+    return sorted(page_idxs)
+
+
+def is_pdf_file(path: str | Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+
+def count_pages(source: bytes | Path) -> int:
+    return len(open_reader(source).pages)
+
+
+def extract_pdf_text(source: bytes | Path, selector: str | None = None) -> str:
+    page_idxs = select_pages(selector, count_pages(source))
+    return "\n\n".join(text for _, text in iter_pdf_pages(source, page_idxs))
+
+
+def iter_pdf_pages(
+    source: bytes | Path, page_idxs: list[int], max_workers: int | None = None
+) -> Iterator[tuple[int, str]]:
+    """
+    Yields (page index, text) for the given pages in order, as soon as each one is ready.
+    Large documents are split into chunks of pages which are extracted in a process pool.
+    """
+    max_workers = max_workers or min(os.cpu_count() or 1, MAX_PDF_WORKERS)
+    if len(page_idxs) < PARALLEL_MIN_PAGES or max_workers == 1:
+        reader = open_reader(source)
+        for page_idx in page_idxs:
+            yield page_idx, reader.pages[page_idx].extract_text()
+
+        return
+
+    chunks = [
+        page_idxs[idx : idx + PAGES_PER_CHUNK] for idx in range(0, len(page_idxs), PAGES_PER_CHUNK)
+    ]
+    tmp_path = None
+    if isinstance(source, bytes):
+        # Workers open the document from a file, rather than each being sent a pickled copy of it
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(source)
+
+        source = tmp_path = Path(f.name)
+
+    executor = ProcessPoolExecutor(
+        max_workers=min(max_workers, len(chunks)),
+        mp_context=get_mp_context(),
+        initializer=init_worker,
+        initargs=(source,),
+    )
+    try:
+        for pages in executor.map(extract_worker_pages, chunks):
+            yield from pages
+    finally:
+        # Don't wait for the remaining chunks if the caller has stopped reading,
+        # unless a worker that's still starting up could need the temporary file
+        executor.shutdown(wait=tmp_path is not None, cancel_futures=True)
+        if tmp_path:
+            tmp_path.unlink(missing_ok=True)
+
+
+def get_mp_context():
+    """
+    Forking copies only the calling thread, so a child forked while another thread holds a lock,
+    eg. one of the web fetch threads this can be called from, can deadlock.
+    Workers are started from a fresh interpreter instead.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+
+    return multiprocessing.get_context("spawn")
+
+
+def open_reader(source: bytes | Path):
+    from pypdf import PdfReader
+
+    if isinstance(source, bytes):
+        return PdfReader(BytesIO(source))
+    else:
+        return PdfReader(source)
+
+
+def init_worker(source: bytes | Path):
+    global _worker_reader
+    _worker_reader = open_reader(source)
+
+
+def extract_worker_pages(page_idxs: list[int]) -> list[tuple[int, str]]:
+    return [(page_idx, _worker_reader.pages[page_idx].extract_text()) for page_idx in page_idxs]
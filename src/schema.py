@@ -19,11 +19,35 @@ class Role(str, enum.Enum):
     System = "system"
 
 
+class ModelRoute(str, enum.Enum):
+    """
+    Kinds of vendor call, each sent to a model tier by the MODEL_ROUTES setting
+    """
+
+    Chat = "chat"
+    CommandExtraction = "command_extraction"
+    Compression = "compression"
+    TaskGeneration = "task_generation"
+
+
 class ChatMessage(BaseModel):
     role: Role
     content: str
 
 
+class CommandProposal(BaseModel):
+    explanation: str
+    command: str | None
+    # False if the model didn't follow the schema and this was parsed from free text
+    structured: bool = True
+
+    def to_text(self) -> str:
+        if self.command:
+            return f"{self.explanation}\n\n```\n{self.command}\n```"
+        else:
+            return self.explanation
+
+
 class SshConfig(BaseModel):
     host: str
     username: str
@@ -0,0 +1,349 @@
+import os
+import re
+import time
+import hashlib
+from pathlib import Path
+from functools import cache
+from typing import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from .settings import CONFIG_DIR
+from .cache import SqliteStore
+
+SEARCH_INDEX_FILE = CONFIG_DIR / "index.sqlite3"
+MAX_FILE_BYTES = 1024 * 1024
+CHUNK_MAX_LINES = 60
+CHUNK_MAX_CHARS = 2000
+WRITE_BATCH_SIZE = 500
+IGNORED_DIRS = {"node_modules", "__pycache__", "venv", "site-packages", "dist", "build", "target"}
+QUERY_TERM_PATTERN = re.compile(r"\w+")
+
+
+class SearchResult:
+    def __init__(self, path: str, first_line: int, last_line: int, text: str, score: float):
+        self.path = path
+        self.first_line = first_line
+        self.last_line = last_line
+        self.text = text
+        self.score = score
+
+    @property
+    def location(self) -> str:
+        return f"{self.path}:{self.first_line}-{self.last_line}"
+
+
+class IndexSummary:
+    def __init__(self):
+        self.num_files = 0
+        self.num_indexed = 0
+        self.num_unchanged = 0
+        self.num_skipped = 0
+        self.num_removed = 0
+        self.num_chunks = 0
+
+
+class SearchIndex(SqliteStore):
+    """
+    BM25 full text index over chunks of local text files, using SQLite's FTS5
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        content_hash TEXT,
+        indexed_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS chunks (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        first_line INTEGER NOT NULL,
+        last_line INTEGER NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path);
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        text, content='chunks', content_rowid='id', tokenize='porter unicode61'
+    );
+    CREATE TRIGGER IF NOT EXISTS chunks_insert AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS chunks_delete AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END;
+    """
+
+    def get_files(self, root: str) -> dict[str, tuple[int, int, str | None]]:
+        """
+        (mtime_ns, size, content_hash) of the indexed files under a directory
+        """
+        # Paths under root sort between "root/" and "root0", since "0" comes after "/"
+        prefix = root if root.endswith(os.sep) else root + os.sep
+        rows = self.conn.execute(
+            "SELECT path, mtime_ns, size, content_hash FROM files WHERE path > ? AND path < ?",
+            (prefix, prefix[:-1] + chr(ord(os.sep) + 1)),
+        )
+        return {path: (mtime_ns, size, content_hash) for path, mtime_ns, size, content_hash in rows}
+
+    def write_files(self, file_results: list[dict]):
+        """
+        Save the results of indexing files in a single transaction
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for result in file_results:
+                    if result["chunks"] is not None or result["content_hash"] is None:
+                        # Changed, or no longer readable as text
+                        self.conn.execute("DELETE FROM chunks WHERE path = ?", (result["path"],))
+
+                    if result["chunks"]:
+                        self.conn.executemany(
+                            "INSERT INTO chunks (path, first_line, last_line, text) "
+                            "VALUES (?, ?, ?, ?)",
+                            [(result["path"], *chunk) for chunk in result["chunks"]],
+                        )
+
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                        (
+                            result["path"],
+                            result["mtime_ns"],
+                            result["size"],
+                            result["content_hash"],
+                            now,
+                        ),
+                    )
+
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def remove_files(self, paths: list[str]):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for path in paths:
+                    self.conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+                    self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def search(self, query: str, limit: int) -> list[SearchResult]:
+        terms = QUERY_TERM_PATTERN.findall(query)
+        if not terms:
+            return []
+
+        # Quote each term so that user input can't be read as FTS5 query syntax
+        match_query = " OR ".join(f'"{term}"' for term in terms)
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT chunks.path, chunks.first_line, chunks.last_line, chunks.text, matches.rank
+                FROM (
+                    SELECT rowid, rank FROM chunks_fts WHERE chunks_fts MATCH ?
+                    ORDER BY rank LIMIT ?
+                ) AS matches
+                JOIN chunks ON chunks.id = matches.rowid
+                ORDER BY matches.rank
+                """,
+                (match_query, limit),
+            ).fetchall()
+
+        # FTS5's rank is the negated BM25 score, lower is better
+        return [
+            SearchResult(path, first, last, text, -rank) for path, first, last, text, rank in rows
+        ]
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[tuple[str, int, int, str]]:
+        """
+        Yields (path, first line, last line, text) for every chunk, a batch at a time
+        """
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT id, path, first_line, last_line, text FROM chunks "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                ).fetchall()
+
+            if not rows:
+                return
+
+            for _, path, first_line, last_line, text in rows:
+                yield path, first_line, last_line, text
+
+            last_id = rows[-1][0]
+
+    def get_stats(self) -> dict[str, int]:
+        with self.lock:
+            num_files = self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            num_chunks = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+        return {"files": num_files, "chunks": num_chunks}
+
+
+@cache
+def get_search_index() -> SearchIndex:
+    return SearchIndex(SEARCH_INDEX_FILE)
+
+
+def index_directory(
+    root: str | Path,
+    max_workers: int | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> IndexSummary:
+    """
+    Bring the index up to date with the text files under a directory.
+    Files whose mtime and size haven't changed are skipped without being read,
+    and files whose content hash hasn't changed are not re-chunked.
+    """
+    search_index = get_search_index()
+    root = str(Path(root).expanduser().resolve())
+    summary = IndexSummary()
+    indexed_files = search_index.get_files(root)
+    found_paths = set()
+    changed_files = []
+    for path, stat in walk_files(root):
+        found_paths.add(path)
+        indexed = indexed_files.get(path)
+        if indexed and indexed[:2] == (stat.st_mtime_ns, stat.st_size):
+            summary.num_unchanged += 1
+        else:
+            known_hash = indexed[2] if indexed else None
+            changed_files.append((path, stat.st_mtime_ns, stat.st_size, known_hash))
+
+    summary.num_files = len(found_paths)
+    removed_paths = [path for path in indexed_files if path not in found_paths]
+    if removed_paths:
+        search_index.remove_files(removed_paths)
+        summary.num_removed = len(removed_paths)
+
+    def save(batch: list[dict]):
+        for result in batch:
+            if result["chunks"] is None and result["content_hash"] is None:
+                summary.num_skipped += 1
+            elif result["chunks"] is None:
+                summary.num_unchanged += 1
+            else:
+                summary.num_indexed += 1
+                summary.num_chunks += len(result["chunks"])
+
+        search_index.write_files(batch)
+
+    batch = []
+    num_done = summary.num_unchanged
+    for result in map_files(index_file, changed_files, max_workers):
+        batch.append(result)
+        num_done += 1
+        if on_progress:
+            on_progress(num_done, summary.num_files)
+
+        if len(batch) >= WRITE_BATCH_SIZE:
+            save(batch)
+            batch = []
+
+    if batch:
+        save(batch)
+
+    return summary
+
+
+def walk_files(root: str) -> Iterator[tuple[str, os.stat_result]]:
+    """
+    Yields (path, stat) for files under root, skipping hidden files and dependency folders
+    """
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [
+            name for name in dir_names if not name.startswith(".") and name not in IGNORED_DIRS
+        ]
+        for name in file_names:
+            if name.startswith("."):
+                continue
+
+            path = os.path.join(dir_path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            if stat.st_size <= MAX_FILE_BYTES:
+                yield path, stat
+
+
+def map_files(func, files: list[tuple], max_workers: int | None) -> Iterator[dict]:
+    if len(files) < 64 or max_workers == 1:
+        # Not worth starting worker processes for
+        yield from (func(*file) for file in files)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(func, *zip(*files), chunksize=32)
+
+
+def index_file(path: str, mtime_ns: int, size: int, known_hash: str | None) -> dict:
+    """
+    Read and chunk one file. Runs in a worker process.
+    chunks is None if the file is unchanged, or can't be indexed as text.
+    """
+    from .files import detect_encoding
+
+    result = {
+        "path": path,
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "content_hash": None,
+        "chunks": None,
+    }
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return result
+
+    encoding = detect_encoding(data[:8192])
+    if encoding is None:
+        return result
+
+    result["content_hash"] = hashlib.sha256(data).hexdigest()
+    if result["content_hash"] != known_hash:
+        result["chunks"] = chunk_text(data.decode(encoding, errors="replace"))
+
+    return result
+
+
+def chunk_text(text: str) -> list[tuple[int, int, str]]:
+    """
+    Split text into (first line, last line, text) chunks of whole lines
+    """
+    chunks = []
+    lines = []
+    num_chars = 0
+    first_line = 1
+    # Only "\n" ends a line, as in FileReader, so that line numbers can be read back with \file.
+    # splitlines() would also split on form feeds, \x1c-\x1e, \x85 and \u2028.
+    text_lines = text.split("\n")
+    if text.endswith("\n"):
+        text_lines.pop()
+
+    for line_num, line in enumerate(text_lines, start=1):
+        line = line.removesuffix("\r")
+        if lines and (len(lines) >= CHUNK_MAX_LINES or num_chars + len(line) > CHUNK_MAX_CHARS):
+            chunks.append((first_line, line_num - 1, "\n".join(lines)))
+            lines, num_chars, first_line = [], 0, line_num
+
+        # Very long lines, eg. minified code, are cut off rather than split
+        lines.append(line[:CHUNK_MAX_CHARS])
+        num_chars += len(lines[-1]) + 1
+
+    if lines and any(line.strip() for line in lines):
+        chunks.append((first_line, first_line + len(lines) - 1, "\n".join(lines)))
+
+    return [chunk for chunk in chunks if chunk[2].strip()]
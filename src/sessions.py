@@ -0,0 +1,234 @@
+import os
+import json
+import gzip
+import time
+import secrets
+from pathlib import Path
+
+from .settings import CONFIG_DIR
+from .schema import ChatState, ChatMessage, ChatMode, SshConfig
+
+SESSIONS_DIR = CONFIG_DIR / "sessions"
+LATEST_SESSION = "latest"
+# Modes that need something which isn't saved, like a live ssh connection, resume as chat
+RESUMABLE_MODES = {ChatMode.Chat, ChatMode.Shell}
+# Compact a log once it has this many events more than it has messages
+COMPACT_MIN_EXTRA_EVENTS = 64
+
+
+class SessionLog:
+    """
+    Append-only JSONL log of a chat session, with one event per line:
+    a message, a mode switch, an ssh config change, or a snapshot of the whole history
+    when it has been replaced, eg. by \\clear or \\compress.
+    Each turn appends only what changed, so saving costs the same however long the chat is.
+    """
+
+    def __init__(self, path: Path, header: dict | None = None):
+        self.path = path
+        self.session_id = path.name.split(".")[0]
+        # Only written when the log file is first created
+        self.header = header or {}
+        self.file = None
+        self.num_messages = 0
+        self.last_message = None
+        self.mode = ChatMode.Chat
+        self.ssh_config = None
+
+    def track(self, state: ChatState):
+        """
+        Treat the state as already saved, only later changes to it are logged
+        """
+        self.num_messages = len(state.messages)
+        self.last_message = state.messages[-1] if state.messages else None
+        self.mode = state.mode
+        self.ssh_config = state.ssh_config
+
+    def record(self, state: ChatState):
+        """
+        Log whatever changed in the state since it was last recorded
+        """
+        events = []
+        messages = state.messages
+        is_appended = len(messages) >= self.num_messages and (
+            self.num_messages == 0 or messages[self.num_messages - 1] is self.last_message
+        )
+        if is_appended:
+            for message in messages[self.num_messages :]:
+                events.append({"type": "message", **message.model_dump(mode="json")})
+        else:
+            events.append(
+                {"type": "snapshot", "messages": [m.model_dump(mode="json") for m in messages]}
+            )
+
+        if state.mode != self.mode:
+            events.append({"type": "mode", "mode": state.mode.value})
+
+        if state.ssh_config != self.ssh_config:
+            ssh_config = state.ssh_config.model_dump() if state.ssh_config else None
+            events.append({"type": "ssh", "ssh_config": ssh_config})
+
+        self.track(state)
+        if events:
+            self.write(events)
+
+    def write(self, events: list[dict]):
+        if self.file is None:
+            # Created on the first write, so chats that are quit straight away leave nothing behind
+            is_new = not self.path.exists()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8")
+            if is_new:
+                events = [{"type": "start", "created_at": time.time(), **self.header}, *events]
+
+        now = time.time()
+        lines = [json.dumps({"t": now, **event}, ensure_ascii=False) + "\n" for event in events]
+        self.file.write("".join(lines))
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def new_session(vendor_name: str, model: str) -> SessionLog:
+    session_id = time.strftime("%Y%m%d-%H%M%S-") + secrets.token_hex(2)
+    header = {"vendor": vendor_name, "model": model}
+    return SessionLog(SESSIONS_DIR / f"{session_id}.jsonl", header)
+
+
+def find_session(session_id: str) -> Path:
+    """
+    Path of a session's log, which may have been compressed, or the most recently used one
+    """
+    if session_id == LATEST_SESSION:
+        paths = [*SESSIONS_DIR.glob("*.jsonl"), *SESSIONS_DIR.glob("*.jsonl.gz")]
+        if not paths:
+            raise FileNotFoundError("There are no saved chat sessions")
+
+        return max(paths, key=lambda path: path.stat().st_mtime)
+
+    for path in (SESSIONS_DIR / f"{session_id}.jsonl", SESSIONS_DIR / f"{session_id}.jsonl.gz"):
+        if path.exists():
+            return path
+
+    raise FileNotFoundError(f"There is no chat session {session_id!r} in {SESSIONS_DIR}")
+
+
+def replay_session(path: Path) -> tuple[ChatState, dict, int]:
+    """
+    Rebuild a session's state from its log.
+    Returns the state, the log's header and the number of events in it.
+    """
+    state = ChatState(
+        mode=ChatMode.Chat, messages=[], ssh_config=None, task_thread=[], task_slug=None
+    )
+    header = {}
+    num_events = 0
+    open_log = gzip.open if path.suffix == ".gz" else open
+    with open_log(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of a log can be cut short if ask was killed while writing it
+                continue
+
+            num_events += 1
+            event_type = event.get("type")
+            if event_type == "message":
+                state.messages.append(ChatMessage(role=event["role"], content=event["content"]))
+            elif event_type == "snapshot":
+                state.messages = [ChatMessage(**message) for message in event["messages"]]
+            elif event_type == "mode":
+                state.mode = ChatMode(event["mode"])
+            elif event_type == "ssh":
+                ssh_config = event["ssh_config"]
+                state.ssh_config = SshConfig(**ssh_config) if ssh_config else None
+            elif event_type == "start":
+                header = {k: v for k, v in event.items() if k not in ("t", "type")}
+
+    return state, header, num_events
+
+
+def write_compacted(path: Path, state: ChatState, header: dict, compress: bool = False):
+    """
+    Replace a log with the fewest events that rebuild the same state
+    """
+    now = time.time()
+    events = [
+        {"t": now, "type": "start", **header},
+        {
+            "t": now,
+            "type": "snapshot",
+            "messages": [m.model_dump(mode="json") for m in state.messages],
+        },
+        {"t": now, "type": "mode", "mode": state.mode.value},
+    ]
+    if state.ssh_config:
+        events.append({"t": now, "type": "ssh", "ssh_config": state.ssh_config.model_dump()})
+
+    open_log = gzip.open if compress else open
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open_log(tmp_path, "wt", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    tmp_path.replace(path)
+
+
+def resume_session(session_id: str, is_logged: bool = True) -> tuple[ChatState, SessionLog]:
+    """
+    Load a saved session so that the chat can carry on from where it was left,
+    appending to the same log. Without is_logged the log is left as it is.
+    """
+    path = find_session(session_id)
+    state, header, num_events = replay_session(path)
+    if state.mode not in RESUMABLE_MODES:
+        state.mode = ChatMode.Chat
+        # There's no ssh connection any more, so nothing to show as connected
+        state.ssh_config = None
+
+    log_path = path.with_suffix("") if path.suffix == ".gz" else path
+    if not is_logged:
+        return state, SessionLog(log_path)
+
+    if path != log_path or num_events > len(state.messages) + COMPACT_MIN_EXTRA_EVENTS:
+        # Compressed logs can't be appended to, so they're written out again uncompressed
+        write_compacted(log_path, state, header)
+        if path != log_path:
+            path.unlink()
+
+    log = SessionLog(log_path)
+    log.track(state)
+    return state, log
+
+
+def compress_old_sessions(max_age_days: float, exclude: Path | None = None) -> int:
+    """
+    Compact and gzip logs that haven't been written to in a while.
+    Returns the number of logs compressed.
+    """
+    if not SESSIONS_DIR.exists():
+        return 0
+
+    cutoff = time.time() - max_age_days * 24 * 60 * 60
+    num_compressed = 0
+    for path in SESSIONS_DIR.glob("*.jsonl"):
+        try:
+            if path == exclude or path.stat().st_mtime > cutoff:
+                continue
+
+            state, header, _ = replay_session(path)
+            gz_path = path.with_name(path.name + ".gz")
+            write_compacted(gz_path, state, header, compress=True)
+            # Keep the last used time, so that --resume latest still finds the right session
+            os.utime(gz_path, (path.stat().st_atime, path.stat().st_mtime))
+            path.unlink()
+            num_compressed += 1
+        except OSError:
+            # eg. another ask process compressed it first
+            continue
+
+    return num_compressed
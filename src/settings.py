@@ -7,6 +7,7 @@ from rich import print as rich_print
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
+from .trace import span
 
 CONFIG_DIR = Path.home() / ".ask"
 CONFIG_FILE = CONFIG_DIR / "config.json"
@@ -15,7 +16,8 @@ TASKS_DIR = CONFIG_DIR / "tasks"
 
 @cache
 def load_settings():
-    return Settings()
+    with span("load_settings", cat="settings"):
+        return Settings()
 
 
 @cache
@@ -52,9 +54,76 @@ class Settings(BaseSettings):
         default_factory=lambda: load_config().get("ANTHROPIC_API_KEY")
         or os.getenv("ANTHROPIC_API_KEY")
     )
+    # Point the vendor clients at a proxy or a stand-in server, eg. bench/fake_vendor.py
+    ANTHROPIC_BASE_URL: str | None = Field(
+        default_factory=lambda: load_config().get("ANTHROPIC_BASE_URL")
+        or os.getenv("ANTHROPIC_BASE_URL")
+    )
+    OPENAI_BASE_URL: str | None = Field(
+        default_factory=lambda: load_config().get("OPENAI_BASE_URL") or os.getenv("OPENAI_BASE_URL")
+    )
     DALLE_IMAGE_OPENER: str | None = Field(
         default_factory=lambda: load_config().get("DALLE_IMAGE_OPENER")
     )
+    # Replays the answer to a repeated request, so only worth turning on when answers needn't vary
+    RESPONSE_CACHE: bool = Field(default_factory=lambda: load_config().get("RESPONSE_CACHE", False))
+    RESPONSE_CACHE_TTL: int = Field(
+        default_factory=lambda: load_config().get("RESPONSE_CACHE_TTL", 24 * 60 * 60)
+    )
+    RESPONSE_CACHE_MAX_BYTES: int = Field(
+        default_factory=lambda: load_config().get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    WEB_CACHE: bool = Field(default_factory=lambda: load_config().get("WEB_CACHE", True))
+    WEB_CACHE_MAX_AGE: int = Field(
+        default_factory=lambda: load_config().get("WEB_CACHE_MAX_AGE", 0)
+    )
+    WEB_CACHE_MAX_BYTES: int = Field(
+        default_factory=lambda: load_config().get("WEB_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+    )
+    WEB_MAX_BYTES: int = Field(
+        default_factory=lambda: load_config().get("WEB_MAX_BYTES", 32 * 1024 * 1024)
+    )
+    CONTEXT_TOKEN_BUDGET: int = Field(
+        default_factory=lambda: load_config().get("CONTEXT_TOKEN_BUDGET", 32_000)
+    )
+    FILE_TOKEN_BUDGET: int = Field(
+        default_factory=lambda: load_config().get("FILE_TOKEN_BUDGET", 8_000)
+    )
+    CHAT_SESSIONS: bool = Field(default_factory=lambda: load_config().get("CHAT_SESSIONS", True))
+    CHAT_SESSION_COMPRESS_DAYS: int = Field(
+        default_factory=lambda: load_config().get("CHAT_SESSION_COMPRESS_DAYS", 7)
+    )
+    USAGE_TRACKING: bool = Field(default_factory=lambda: load_config().get("USAGE_TRACKING", True))
+    EMBEDDER: str | None = Field(default_factory=lambda: load_config().get("EMBEDDER"))
+    VENDOR_CONCURRENCY: int = Field(
+        default_factory=lambda: load_config().get("VENDOR_CONCURRENCY", 8)
+    )
+    # Model tier for each kind of call, eg. {"compression": "fast", "chat": "default"}
+    MODEL_ROUTES: dict[str, str] = Field(
+        default_factory=lambda: load_config().get("MODEL_ROUTES", {})
+    )
+    VENDOR_MAX_RETRIES: int = Field(
+        default_factory=lambda: load_config().get("VENDOR_MAX_RETRIES", 3)
+    )
+    # Send a second request when the first is slower than the model's p95 latency
+    VENDOR_HEDGING: bool = Field(default_factory=lambda: load_config().get("VENDOR_HEDGING", False))
+    # Use the other vendor when one is down, if both API keys are set
+    VENDOR_FAILOVER: bool = Field(
+        default_factory=lambda: load_config().get("VENDOR_FAILOVER", True)
+    )
+    # Start conversations with whichever vendor has been answering fastest, if both keys are set
+    ADAPTIVE_ROUTING: bool = Field(
+        default_factory=lambda: load_config().get("ADAPTIVE_ROUTING", False)
+    )
+    # Seconds before a shell command is killed, 0 for no limit
+    SHELL_TIMEOUT: int = Field(default_factory=lambda: load_config().get("SHELL_TIMEOUT", 300))
+    # How much of a shell command's output is sent to the model, split between its start and end
+    SHELL_OUTPUT_MAX_BYTES: int = Field(
+        default_factory=lambda: load_config().get("SHELL_OUTPUT_MAX_BYTES", 16 * 1024)
+    )
+    SHELL_OUTPUT_MAX_LINES: int = Field(
+        default_factory=lambda: load_config().get("SHELL_OUTPUT_MAX_LINES", 200)
+    )
 
     def model_post_init(self, *args, **kwargs):
         super().model_post_init(*args, **kwargs)
@@ -0,0 +1,269 @@
+"""
+Run shell commands with their output streamed as it arrives, keeping only the start and end
+of long outputs for the model.
+"""
+
+import os
+import sys
+import time
+import queue
+import signal
+import threading
+import subprocess as sp
+from collections import deque
+from itertools import groupby
+from typing import Callable, IO
+
+from .trace import span
+
+# Longest line read in one go, longer ones arrive in pieces
+CHUNK_SIZE = 64 * 1024
+POLL_INTERVAL = 0.05
+# Time a command gets to exit after SIGTERM before it's sent SIGKILL, and to close its
+# output once it has exited
+KILL_GRACE = 2.0
+
+# Called with ("stdout" or "stderr", text) as the command writes it
+OutputCallback = Callable[[str, str], None]
+
+
+class OutputBuffer:
+    """
+    The first and last lines of a stream, each up to half of max_bytes and max_lines
+    """
+
+    def __init__(self, max_bytes: int, max_lines: int):
+        self.head_bytes = max_bytes // 2
+        self.head_lines = max_lines // 2
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.tail_lines = max_lines - self.head_lines
+        self.head: list[bytes] = []
+        self.tail: deque[bytes] = deque()
+        self.num_head_bytes = 0
+        self.num_tail_bytes = 0
+        self.num_bytes = 0
+        self.num_lines = 0
+        self.is_head_full = False
+
+    def add(self, line: bytes):
+        self.num_bytes += len(line)
+        if line.endswith(b"\n"):
+            self.num_lines += 1
+
+        if not self.is_head_full:
+            space = self.head_bytes - self.num_head_bytes
+            if len(self.head) < self.head_lines and len(line) <= space:
+                self.head.append(line)
+                self.num_head_bytes += len(line)
+                return
+
+            self.is_head_full = True
+
+        self.tail.append(line[-self.tail_bytes :] if self.tail_bytes else b"")
+        self.num_tail_bytes += len(self.tail[-1])
+        while self.tail and (
+            len(self.tail) > self.tail_lines or self.num_tail_bytes > self.tail_bytes
+        ):
+            self.num_tail_bytes -= len(self.tail.popleft())
+
+    @property
+    def num_omitted_bytes(self) -> int:
+        return self.num_bytes - self.num_head_bytes - self.num_tail_bytes
+
+    def get_text(self) -> str:
+        head = b"".join(self.head).decode(errors="replace")
+        tail = b"".join(self.tail).decode(errors="replace")
+        if not self.num_omitted_bytes:
+            return head + tail
+
+        num_omitted_lines = self.num_lines - sum(line.endswith(b"\n") for line in self.head)
+        num_omitted_lines -= sum(line.endswith(b"\n") for line in self.tail)
+        omitted = f"[... {num_omitted_lines} lines, {self.num_omitted_bytes} bytes truncated ...]"
+        return f"{head}\n{omitted}\n{tail}"
+
+
+class CommandResult:
+    """
+    Exit code, truncated output and timing of a shell command
+    """
+
+    def __init__(self, command: str, max_bytes: int, max_lines: int):
+        self.command = command
+        self.stdout = OutputBuffer(max_bytes, max_lines)
+        self.stderr = OutputBuffer(max_bytes, max_lines)
+        self.exit_code: int | None = None
+        self.duration = 0.0
+        self.is_timed_out = False
+        self.is_cancelled = False
+
+    @property
+    def num_bytes(self) -> int:
+        return self.stdout.num_bytes + self.stderr.num_bytes
+
+    @property
+    def is_truncated(self) -> bool:
+        return bool(self.stdout.num_omitted_bytes or self.stderr.num_omitted_bytes)
+
+    def to_text(self) -> str:
+        text = f"Command: {self.command}\n\nExit Code: {self.exit_code}"
+        text += f"\nDuration: {self.duration:.1f}s"
+        if self.is_timed_out:
+            text += "\n\nThe command timed out and was killed."
+        elif self.is_cancelled:
+            text += "\n\nThe command was cancelled by the user and killed."
+
+        if self.stdout.num_bytes:
+            text += f"\n\nStdout:\n{self.stdout.get_text()}"
+        if self.stderr.num_bytes:
+            text += f"\n\nStderr:\n{self.stderr.get_text()}"
+
+        return text
+
+
+def run_command(
+    command: str,
+    timeout: float | None,
+    max_bytes: int,
+    max_lines: int,
+    on_output: OutputCallback | None = None,
+) -> CommandResult:
+    """
+    Run a shell command, passing its output to on_output as it arrives.
+    The command is killed along with any processes it started if it runs for longer than
+    timeout seconds, or on Ctrl-C.
+    """
+    result = CommandResult(command, max_bytes, max_lines)
+    with span("shell command", cat="shell") as command_span:
+        start_time = time.perf_counter()
+        proc = sp.Popen(
+            command,
+            shell=True,
+            stdin=sp.DEVNULL,
+            stdout=sp.PIPE,
+            stderr=sp.PIPE,
+            # Its own process group, so it can be killed with everything it started
+            start_new_session=True,
+        )
+        # Pipes are drained on threads so that neither fills up and blocks the command
+        lines = queue.Queue()
+        readers = [
+            threading.Thread(target=read_lines, args=(name, stream, lines), daemon=True)
+            for name, stream in (("stdout", proc.stdout), ("stderr", proc.stderr))
+        ]
+        for reader in readers:
+            reader.start()
+
+        deadline = None if timeout is None else start_time + timeout
+        try:
+            exited_at = None
+            while any(reader.is_alive() for reader in readers) or not lines.empty():
+                now = time.perf_counter()
+                if deadline is not None and now > deadline:
+                    result.is_timed_out = True
+                    kill_process_group(proc)
+                    break
+
+                if exited_at is None and proc.poll() is not None:
+                    exited_at = now
+                elif exited_at is not None and now - exited_at > KILL_GRACE:
+                    # Something it started in the background still has its output open,
+                    # leave it be
+                    break
+
+                handle_lines(lines, result, on_output)
+
+            proc.wait(timeout=None if deadline is None else max(deadline - time.perf_counter(), 0))
+        except sp.TimeoutExpired:
+            # The command closed its output but is still running
+            result.is_timed_out = True
+            kill_process_group(proc)
+        except KeyboardInterrupt:
+            result.is_cancelled = True
+            kill_process_group(proc)
+
+        handle_lines(lines, result, on_output, block=False)
+        result.exit_code = proc.returncode
+        result.duration = time.perf_counter() - start_time
+        command_span.set(
+            exit_code=result.exit_code,
+            num_bytes=result.num_bytes,
+            is_truncated=result.is_truncated,
+            is_timed_out=result.is_timed_out,
+            is_cancelled=result.is_cancelled,
+        )
+
+    return result
+
+
+def read_lines(name: str, stream: IO[bytes], lines: queue.Queue):
+    with stream:
+        for line in iter(lambda: stream.readline(CHUNK_SIZE), b""):
+            lines.put((name, line))
+
+
+def handle_lines(
+    lines: queue.Queue, result: CommandResult, on_output: OutputCallback | None, block=True
+):
+    """
+    Buffer and pass on all the lines that have arrived, waiting briefly for one if block
+    """
+    batch = []
+    try:
+        batch.append(lines.get(timeout=POLL_INTERVAL) if block else lines.get_nowait())
+        while True:
+            batch.append(lines.get_nowait())
+    except queue.Empty:
+        pass
+
+    for name, line in batch:
+        getattr(result, name).add(line)
+
+    if on_output:
+        # Printed a run of lines at a time, as printing each line is slow for chatty commands
+        for name, run in groupby(batch, key=lambda item: item[0]):
+            on_output(name, b"".join(line for _, line in run).decode(errors="replace"))
+
+
+def kill_process_group(proc: sp.Popen):
+    """
+    Stop a command and the processes it started, forcefully if it doesn't exit in time
+    """
+    if sys.platform == "win32":
+        proc.kill()
+        proc.wait()
+        return
+
+    pgid = proc.pid
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        # Everything in the group has already exited
+        proc.wait()
+        return
+
+    # The shell often exits on SIGTERM while things it started ignore it, so it's the
+    # whole group that gets the grace period, not just the shell
+    deadline = time.perf_counter() + KILL_GRACE
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None and not is_group_running(pgid):
+            return
+
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+    proc.wait()
+
+
+def is_group_running(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Something in the group is running as another user
+        return True
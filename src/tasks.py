@@ -3,8 +3,6 @@ import os
 import json
 import importlib
 
-from jsonschema import validate
-
 from .settings import TASKS_DIR
 from .schema import TaskMeta, TaskTool
 from .web import fetch_text_for_url
@@ -37,6 +35,8 @@ def run_task(slug: str, input_data: dict) -> dict:
 
 
 def load_task_entrypoint(task: TaskMeta, tasks: list[TaskMeta]):
+    from jsonschema import validate
+
     task_module = importlib.import_module(task.slug)
 
     def task_entrypoint(input_data: dict) -> dict:
@@ -0,0 +1,237 @@
+"""
+Tracing and profiling for finding out where `ask` spends its time.
+
+Spans are recorded when ASK_TRACE is set or `--trace` is passed, and saved as a Chrome
+trace-event JSON file that can be opened in https://ui.perfetto.dev or chrome://tracing.
+ASK_TRACE can be a path to write the trace to, otherwise it goes in ~/.ask/traces.
+While tracing is off, `span` returns a shared do-nothing context manager.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import itertools
+import threading
+from pathlib import Path
+
+TRACE_ENV = "ASK_TRACE"
+PROFILE_ENV = "ASK_PROFILE"
+ENABLED_VALUES = {"1", "true", "yes"}
+
+_tracer: "Tracer | None" = None
+_profiler = None
+# Output files are named after the command being run
+_output_name = "ask"
+
+
+class Tracer:
+    """
+    Collects trace events in memory until the process exits
+    """
+
+    def __init__(self, path: Path | None):
+        self.path = path
+        self.start_ns = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = []
+        self.async_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def get_ts(self, ns: int) -> float:
+        return (ns - self.start_ns) / 1000
+
+    def add_span(self, name: str, cat: str, start_ns: int, end_ns: int, args: dict):
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": self.get_ts(start_ns),
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def add_async_span(self, name: str, cat: str, start_ns: int, end_ns: int, args: dict):
+        """
+        Spans that can overlap others on the same thread, eg. concurrent requests in an
+        event loop, are shown on their own tracks
+        """
+        span_id = next(self.async_ids)
+        common = {"name": name, "cat": cat, "id": span_id, "pid": self.pid, "tid": 0}
+        with self.lock:
+            self.events.append({**common, "ph": "b", "ts": self.get_ts(start_ns), "args": args})
+            self.events.append({**common, "ph": "e", "ts": self.get_ts(end_ns)})
+
+    def add_instant(self, name: str, cat: str, args: dict):
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "i",
+            "s": "t",
+            "ts": self.get_ts(time.perf_counter_ns()),
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def save(self) -> Path:
+        path = self.path or get_output_path("traces", ".json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        thread_names = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": thread.ident,
+                "args": {"name": thread.name},
+            }
+            for thread in threading.enumerate()
+        ]
+        with self.lock:
+            trace = {"traceEvents": thread_names + self.events, "displayTimeUnit": "ms"}
+
+        with open(path, "w") as f:
+            json.dump(trace, f)
+
+        return path
+
+
+class Span:
+    def __init__(self, tracer: Tracer, name: str, cat: str, args: dict, is_async: bool):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.is_async = is_async
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+
+        add = self.tracer.add_async_span if self.is_async else self.tracer.add_span
+        add(self.name, self.cat, self.start_ns, time.perf_counter_ns(), self.args)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def mark(self, name: str, **args):
+        self.tracer.add_instant(name, self.cat, args)
+
+
+class NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+    def mark(self, name: str, **args):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+def span(name: str, cat: str = "ask", is_async: bool = False, **args) -> Span | NoSpan:
+    """
+    Time a block of code as a span in the trace, eg.
+
+        with span("extract", cat="web", url=url) as s:
+            ...
+            s.set(num_chars=len(text))
+    """
+    if _tracer is None:
+        return NO_SPAN
+
+    return Span(_tracer, name, cat, args, is_async)
+
+
+def instant(name: str, cat: str = "ask", **args):
+    """
+    Mark a moment in the trace, eg. a retry
+    """
+    if _tracer is not None:
+        _tracer.add_instant(name, cat, args)
+
+
+def is_tracing() -> bool:
+    return _tracer is not None
+
+
+def start_tracing(path: Path | None = None):
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(path)
+        atexit.register(save_trace)
+
+
+def set_output_name(name: str):
+    global _output_name
+    _output_name = name
+
+
+def save_trace():
+    if _tracer is None:
+        return
+
+    path = _tracer.save()
+    print(f"Trace written to {path}", file=sys.stderr)
+
+
+def start_profiling():
+    """
+    Profile the rest of the run with cProfile, saving the stats for `python -m pstats` or snakeviz
+    """
+    global _profiler
+    if _profiler is not None:
+        return
+
+    import cProfile
+
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+    atexit.register(save_profile)
+
+
+def save_profile():
+    _profiler.disable()
+    path = get_output_path("profiles", ".prof")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _profiler.dump_stats(path)
+    print(f"Profile written to {path}", file=sys.stderr)
+
+
+def get_output_path(dir_name: str, suffix: str) -> Path:
+    from .settings import CONFIG_DIR
+
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    return CONFIG_DIR / dir_name / f"{_output_name}-{timestamp}-{os.getpid()}{suffix}"
+
+
+def start_from_env():
+    """
+    Start tracing and profiling if they're turned on by environment variables
+    """
+    trace_value = os.getenv(TRACE_ENV, "")
+    if trace_value.lower() in ENABLED_VALUES:
+        start_tracing()
+    elif trace_value and trace_value.lower() not in {"0", "false", "no"}:
+        start_tracing(Path(trace_value).expanduser())
+
+    if os.getenv(PROFILE_ENV, "").lower() in ENABLED_VALUES:
+        start_profiling()
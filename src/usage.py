@@ -0,0 +1,314 @@
+import math
+import time
+import sqlite3
+from functools import cache
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+from .settings import CONFIG_DIR, load_settings
+from .cache import SqliteStore
+from .trace import span, is_tracing
+
+USAGE_FILE = CONFIG_DIR / "usage.sqlite3"
+USAGE_GROUPS = ("day", "model", "action", "route")
+NO_ACTION = "-"
+
+# Which part of ask is making vendor calls, eg. "ChatAction" or "batch"
+_current_action: ContextVar[str | None] = ContextVar("current_action", default=None)
+# What kind of call it is, see ModelRoute
+_current_route: ContextVar[str | None] = ContextVar("current_route", default=None)
+# Called with each finished call, eg. to keep the router's view of vendor health up to date
+_call_observers: list[Callable[["CallRecord"], None]] = []
+
+
+class UsageStore(SqliteStore):
+    """
+    One row per vendor API call: tokens, cost and latency, and what made the call
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS calls (
+        id INTEGER PRIMARY KEY,
+        started_at REAL NOT NULL,
+        vendor TEXT NOT NULL,
+        model TEXT NOT NULL,
+        action TEXT,
+        input_tokens INTEGER NOT NULL,
+        output_tokens INTEGER NOT NULL,
+        cache_read_tokens INTEGER NOT NULL,
+        cache_write_tokens INTEGER NOT NULL,
+        cost REAL,
+        wall_ms REAL NOT NULL,
+        ttfb_ms REAL,
+        is_error INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS calls_started_at ON calls (started_at);
+    """
+    migrations = ("ALTER TABLE calls ADD COLUMN route TEXT",)
+
+    def add(self, call: "CallRecord"):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO calls (started_at, vendor, model, action, route, input_tokens, "
+                "output_tokens, cache_read_tokens, cache_write_tokens, cost, wall_ms, ttfb_ms, "
+                "is_error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    call.started_at,
+                    call.vendor,
+                    call.model,
+                    call.action,
+                    call.route,
+                    call.input_tokens,
+                    call.output_tokens,
+                    call.cache_read_tokens,
+                    call.cache_write_tokens,
+                    call.cost,
+                    call.wall_ms,
+                    call.ttfb_ms,
+                    int(call.is_error),
+                ),
+            )
+
+    def get_calls(self, since: float) -> list[tuple]:
+        """
+        (started_at, model, action, input_tokens, output_tokens, cost, wall_ms, ttfb_ms, is_error,
+        route) of calls made since a time
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT started_at, model, action, input_tokens, output_tokens, cost, wall_ms, "
+                "ttfb_ms, is_error, route FROM calls WHERE started_at >= ? ORDER BY started_at",
+                (since,),
+            ).fetchall()
+
+    def get_wall_ms(self, model: str, since: float) -> list[float]:
+        """
+        Wall times of a model's successful calls made since a time
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT wall_ms FROM calls WHERE model = ? AND started_at >= ? AND is_error = 0",
+                (model, since),
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def prune(self, before: float) -> int:
+        with self.lock:
+            return self.conn.execute("DELETE FROM calls WHERE started_at < ?", (before,)).rowcount
+
+
+class CallRecord:
+    """
+    Usage and timing of a single vendor API call
+    """
+
+    def __init__(self, vendor: str, model: str, price=None):
+        self.vendor = vendor
+        self.model = model
+        self.price = price
+        self.action = _current_action.get()
+        self.route = _current_route.get()
+        self.started_at = time.time()
+        self.start_time = time.perf_counter()
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.wall_ms = 0.0
+        self.ttfb_ms = None
+        self.is_error = False
+        self.span = None
+
+    def mark_first_byte(self):
+        if self.ttfb_ms is None:
+            self.ttfb_ms = (time.perf_counter() - self.start_time) * 1000
+            if self.span:
+                self.span.mark("first byte", model=self.model)
+
+    def set_usage(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ):
+        """
+        input_tokens includes the tokens read from and written to the prompt cache
+        """
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
+
+    @property
+    def cost(self) -> float | None:
+        if self.price is None:
+            return None
+
+        return self.price.get_cost(
+            self.input_tokens, self.output_tokens, self.cache_read_tokens, self.cache_write_tokens
+        )
+
+    def finish(self):
+        self.wall_ms = (time.perf_counter() - self.start_time) * 1000
+        if not self.is_error:
+            # Without streaming nothing arrives until the whole response is ready
+            self.mark_first_byte()
+
+
+class UsageSummary:
+    def __init__(self, group: str):
+        self.group = group
+        self.num_calls = 0
+        self.num_errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.wall_ms = []
+        self.ttfb_ms = []
+
+
+@contextmanager
+def track_call(vendor: str, model: str, price=None) -> Iterator[CallRecord]:
+    """
+    Time a vendor API call and save its usage once it's done, whether or not it succeeded
+    """
+    call = CallRecord(vendor, model, price)
+    # Concurrent calls in an event loop overlap, so they go on their own tracks
+    is_async = is_tracing() and is_in_event_loop()
+    call.span = span(
+        f"{vendor} {model}", cat="vendor", is_async=is_async, action=call.action, route=call.route
+    )
+    with call.span:
+        try:
+            yield call
+        except Exception:
+            call.is_error = True
+            raise
+        finally:
+            call.finish()
+            call.span.set(
+                input_tokens=call.input_tokens,
+                output_tokens=call.output_tokens,
+                ttfb_ms=call.ttfb_ms,
+                is_error=call.is_error,
+            )
+            save_call(call)
+            for observer in _call_observers:
+                observer(call)
+
+
+def add_call_observer(observer: Callable[[CallRecord], None]):
+    if observer not in _call_observers:
+        _call_observers.append(observer)
+
+
+@contextmanager
+def current_action(name: str):
+    """
+    Attribute vendor calls made inside this block to an action
+    """
+    token = _current_action.set(name)
+    try:
+        yield
+    finally:
+        _current_action.reset(token)
+
+
+@contextmanager
+def current_route(route: str):
+    """
+    Attribute vendor calls made inside this block to a route, eg. "compression"
+    """
+    token = _current_route.set(route)
+    try:
+        yield
+    finally:
+        _current_route.reset(token)
+
+
+def is_in_event_loop() -> bool:
+    import asyncio
+
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def set_default_action(name: str):
+    _current_action.set(name)
+
+
+@cache
+def get_usage_store() -> UsageStore | None:
+    try:
+        if not load_settings().USAGE_TRACKING:
+            return None
+
+        return UsageStore(USAGE_FILE)
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+def save_call(call: CallRecord):
+    usage_store = get_usage_store()
+    if usage_store is None:
+        return
+
+    try:
+        usage_store.add(call)
+    except sqlite3.Error:
+        # Usage tracking should never fail the request
+        pass
+
+
+def summarize_usage(group_by: str, since: float) -> list[UsageSummary]:
+    """
+    Totals and latencies of the calls made since a time, grouped by day, model, action or route
+    """
+    usage_store = get_usage_store()
+    if usage_store is None:
+        return []
+
+    summaries: dict[str, UsageSummary] = {}
+    for row in usage_store.get_calls(since):
+        started_at, model, action, input_tokens, output_tokens, cost, wall_ms, ttfb_ms = row[:8]
+        if group_by == "day":
+            group = time.strftime("%Y-%m-%d", time.localtime(started_at))
+        elif group_by == "model":
+            group = model
+        elif group_by == "route":
+            group = row[9] or NO_ACTION
+        else:
+            group = action or NO_ACTION
+
+        summary = summaries.get(group)
+        if summary is None:
+            summary = summaries[group] = UsageSummary(group)
+
+        summary.num_calls += 1
+        summary.num_errors += row[8]
+        summary.input_tokens += input_tokens
+        summary.output_tokens += output_tokens
+        summary.cost += cost or 0.0
+        summary.wall_ms.append(wall_ms)
+        if ttfb_ms is not None:
+            summary.ttfb_ms.append(ttfb_ms)
+
+    return list(summaries.values())
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """
+    Nearest rank percentile
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
@@ -0,0 +1,289 @@
+import ast
+import struct
+import hashlib
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from .settings import CONFIG_DIR
+from .cache import SqliteStore
+from .embeddings import Embedder
+
+VECTORS_DIR = CONFIG_DIR / "vectors"
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+# Fixed size, so that the header can be rewritten in place as rows are appended
+NPY_HEADER_BYTES = 128
+EMBED_BATCH_SIZE = 64
+SEARCH_BATCH_ROWS = 65536
+
+
+class VectorResult:
+    def __init__(self, path: str, first_line: int, last_line: int, text: str, score: float):
+        self.path = path
+        self.first_line = first_line
+        self.last_line = last_line
+        self.text = text
+        self.score = score
+
+    @property
+    def location(self) -> str:
+        return f"{self.path}:{self.first_line}-{self.last_line}"
+
+
+class VectorMetadata(SqliteStore):
+    """
+    What each row of a vector file is an embedding of
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS vectors (
+        row INTEGER PRIMARY KEY,
+        key TEXT NOT NULL,
+        path TEXT NOT NULL,
+        first_line INTEGER NOT NULL,
+        last_line INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        is_deleted INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS vectors_key ON vectors (key);
+    """
+
+
+class VectorStore:
+    """
+    Float32 vectors in a .npy file, which is memory mapped for search and appended to in place,
+    with a SQLite table of what each row is. Rows of deleted chunks are skipped when searching
+    and dropped when there are more of them than live rows.
+    """
+
+    def __init__(self, dir_path: Path, dimensions: int):
+        dir_path.mkdir(parents=True, exist_ok=True)
+        self.path = dir_path / "vectors.npy"
+        self.dimensions = dimensions
+        self.metadata = VectorMetadata(dir_path / "vectors.sqlite3")
+        self.lock = self.metadata.lock
+        if not self.path.exists():
+            with open(self.path, "wb") as f:
+                f.write(build_npy_header(0, dimensions))
+
+    def get_num_rows(self) -> int:
+        with open(self.path, "rb") as f:
+            num_rows, dimensions = read_npy_shape(f)
+
+        if dimensions != self.dimensions:
+            raise ValueError(f"{self.path} has {dimensions} dimensions, not {self.dimensions}")
+
+        return num_rows
+
+    def get_keys(self) -> set[str]:
+        rows = self.metadata.conn.execute("SELECT key FROM vectors WHERE is_deleted = 0")
+        return {key for (key,) in rows}
+
+    def append(self, vectors: np.ndarray, items: list[tuple[str, str, int, int, str]]):
+        """
+        Add rows of vectors, with a (key, path, first line, last line, text) item for each row
+        """
+        conn = self.metadata.conn
+        with self.lock, open(self.path, "r+b") as f:
+            num_rows = self.get_num_rows()
+            # Drop anything left over from an append that was interrupted
+            f.truncate(NPY_HEADER_BYTES + num_rows * self.dimensions * 4)
+            conn.execute("DELETE FROM vectors WHERE row >= ?", (num_rows,))
+            f.seek(0, 2)
+            f.write(vectors.astype(np.float32).tobytes())
+            f.flush()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO vectors (row, key, path, first_line, last_line, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(num_rows + idx, *item) for idx, item in enumerate(items)],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            # The new rows only count once the header says they're there
+            f.seek(0)
+            f.write(build_npy_header(num_rows + len(items), self.dimensions))
+
+    def delete(self, keys: list[str]):
+        conn = self.metadata.conn
+        with self.lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "UPDATE vectors SET is_deleted = 1 WHERE key = ?", [(k,) for k in keys]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def search(self, query_vector: np.ndarray, limit: int) -> list[VectorResult]:
+        """
+        Rows with the highest cosine similarity to the query, scored in batches of rows
+        so that memory use doesn't grow with the size of the store
+        """
+        num_rows = self.get_num_rows()
+        if not num_rows:
+            return []
+
+        is_live = np.zeros(num_rows, dtype=bool)
+        live_rows = self.metadata.conn.execute(
+            "SELECT row FROM vectors WHERE is_deleted = 0 AND row < ?", (num_rows,)
+        )
+        is_live[[row for (row,) in live_rows]] = True
+        matrix = np.memmap(
+            self.path,
+            dtype=np.float32,
+            mode="r",
+            offset=NPY_HEADER_BYTES,
+            shape=(num_rows, self.dimensions),
+        )
+        query_vector = query_vector.astype(np.float32).reshape(-1)
+        best_rows, best_scores = [], []
+        for start in range(0, num_rows, SEARCH_BATCH_ROWS):
+            scores = matrix[start : start + SEARCH_BATCH_ROWS] @ query_vector
+            scores[~is_live[start : start + SEARCH_BATCH_ROWS]] = -np.inf
+            top_idxs = np.argpartition(-scores, min(limit, len(scores) - 1))[:limit]
+            best_rows.extend(start + top_idxs)
+            best_scores.extend(scores[top_idxs])
+
+        ranked = sorted(zip(best_scores, best_rows), reverse=True)[:limit]
+        results = []
+        for score, row in ranked:
+            if score == -np.inf:
+                break
+
+            path, first_line, last_line, text = self.metadata.conn.execute(
+                "SELECT path, first_line, last_line, text FROM vectors WHERE row = ?", (int(row),)
+            ).fetchone()
+            results.append(VectorResult(path, first_line, last_line, text, float(score)))
+
+        return results
+
+    def compact(self) -> bool:
+        """
+        Rewrite the vector file without deleted rows, if they've come to outnumber live ones
+        """
+        conn = self.metadata.conn
+        with self.lock:
+            num_rows = self.get_num_rows()
+            live_rows = [
+                row
+                for (row,) in conn.execute(
+                    "SELECT row FROM vectors WHERE is_deleted = 0 AND row < ? ORDER BY row",
+                    (num_rows,),
+                )
+            ]
+            if len(live_rows) * 2 >= num_rows:
+                return False
+
+            matrix = np.memmap(
+                self.path,
+                dtype=np.float32,
+                mode="r",
+                offset=NPY_HEADER_BYTES,
+                shape=(num_rows, self.dimensions),
+            )
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(build_npy_header(len(live_rows), self.dimensions))
+                for start in range(0, len(live_rows), SEARCH_BATCH_ROWS):
+                    f.write(matrix[live_rows[start : start + SEARCH_BATCH_ROWS]].tobytes())
+
+            del matrix
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM vectors WHERE is_deleted = 1 OR row >= ?", (num_rows,))
+                # Renumber in order, via negative numbers so rows don't clash along the way
+                conn.executemany(
+                    "UPDATE vectors SET row = ? WHERE row = ?",
+                    [(-new_row - 1, row) for new_row, row in enumerate(live_rows)],
+                )
+                conn.execute("UPDATE vectors SET row = -row - 1")
+                tmp_path.replace(self.path)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return True
+
+
+def build_npy_header(num_rows: int, dimensions: int) -> bytes:
+    header = f"{{'descr': '<f4', 'fortran_order': False, 'shape': ({num_rows}, {dimensions}), }}"
+    # Magic, version, the length of the header and then the header, padded to a fixed size
+    header_len = NPY_HEADER_BYTES - len(NPY_MAGIC) - 2
+    header = header.ljust(header_len - 1) + "\n"
+    return NPY_MAGIC + struct.pack("<H", header_len) + header.encode("latin1")
+
+
+def read_npy_shape(f) -> tuple[int, int]:
+    f.seek(0)
+    prefix = f.read(len(NPY_MAGIC) + 2)
+    if prefix[: len(NPY_MAGIC)] != NPY_MAGIC:
+        raise ValueError(f"{f.name} isn't a .npy file written by this tool")
+
+    (header_len,) = struct.unpack("<H", prefix[len(NPY_MAGIC) :])
+    header = ast.literal_eval(f.read(header_len).decode("latin1"))
+    return header["shape"]
+
+
+def get_vector_store(embedder: Embedder) -> VectorStore:
+    return VectorStore(VECTORS_DIR / embedder.name, embedder.dimensions)
+
+
+def get_chunk_key(path: str, first_line: int, last_line: int, text: str) -> str:
+    return hashlib.sha256(f"{path}:{first_line}-{last_line}\n{text}".encode()).hexdigest()
+
+
+def embed_search_index(
+    embedder: Embedder, on_progress: Callable[[int, int], None] | None = None
+) -> tuple[int, int]:
+    """
+    Embed the chunks of `ask index`'s search index that aren't in the vector store yet,
+    in batches that are saved as they're done, so an interrupted run picks up where it left off.
+    Returns the number of chunks embedded and removed.
+    """
+    from .search import get_search_index
+
+    store = get_vector_store(embedder)
+    search_index = get_search_index()
+    stored_keys = store.get_keys()
+    seen_keys = set()
+    batch = []
+    num_embedded = 0
+    num_chunks = search_index.get_stats()["chunks"]
+
+    def save(batch):
+        vectors = embedder.embed([item[-1] for item in batch])
+        store.append(vectors, batch)
+
+    for num_done, (path, first_line, last_line, text) in enumerate(search_index.iter_chunks(), 1):
+        key = get_chunk_key(path, first_line, last_line, text)
+        seen_keys.add(key)
+        if key not in stored_keys:
+            batch.append((key, path, first_line, last_line, text))
+
+        if len(batch) >= EMBED_BATCH_SIZE:
+            save(batch)
+            num_embedded += len(batch)
+            batch = []
+
+        if on_progress:
+            on_progress(num_done, num_chunks)
+
+    if batch:
+        save(batch)
+        num_embedded += len(batch)
+
+    removed_keys = list(stored_keys - seen_keys)
+    if removed_keys:
+        store.delete(removed_keys)
+        store.compact()
+
+    return num_embedded, len(removed_keys)
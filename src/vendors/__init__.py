@@ -1,2 +1,14 @@
-from . import openai
-from . import anthropic
+import importlib
+
+from src.trace import span
+
+VENDOR_MODULES = ("openai", "anthropic")
+
+
+def __getattr__(name: str):
+    # Only import a vendor (and its SDK) when it is first used.
+    if name in VENDOR_MODULES:
+        with span(f"import {name}", cat="import"):
+            return importlib.import_module(f".{name}", __name__)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
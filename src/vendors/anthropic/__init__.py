@@ -1,2 +1,17 @@
-from .prompt import answer_query, chat
-from .models import MODEL_OPTIONS, DEFAULT_MODEL_OPTION, MODEL_NAME
+from .prompt import (
+    answer_query,
+    chat,
+    stream_answer_query,
+    stream_chat,
+    aanswer_query,
+    achat,
+    propose_command,
+    get_prompt_cache_usage,
+)
+from .models import (
+    MODEL_OPTIONS,
+    MODEL_CLASSES,
+    DEFAULT_MODEL_OPTION,
+    FAST_MODEL_OPTION,
+    MODEL_NAME,
+)
@@ -1,3 +1,6 @@
+from ..base import ModelPrice
+
+
 class ClaudeModel:
     Sonnet = "claude-3-5-sonnet-latest"
     Haiku = "claude-3-5-haiku-20241022"
@@ -5,7 +8,20 @@ class ClaudeModel:
 
 MODEL_NAME = "Claude"
 DEFAULT_MODEL_OPTION = "haiku"
+# Cheapest and quickest, for mechanical steps like extracting a command
+FAST_MODEL_OPTION = "haiku"
 MODEL_OPTIONS = {
     "sonnet": ClaudeModel.Sonnet,
     "haiku": ClaudeModel.Haiku,
 }
+# Options that are interchangeable across vendors share a quality class
+MODEL_CLASSES = {
+    "sonnet": "strong",
+    "haiku": "fast",
+}
+
+# https://www.anthropic.com/pricing
+MODEL_PRICES = {
+    ClaudeModel.Sonnet: ModelPrice(3.00, 15.00, cache_read=0.30, cache_write=3.75),
+    ClaudeModel.Haiku: ModelPrice(0.80, 4.00, cache_read=0.08, cache_write=1.00),
+}
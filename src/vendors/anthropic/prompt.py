@@ -1,44 +1,268 @@
 from functools import cache
+from typing import Iterator
 
+import json
 import anthropic
 
 from src.settings import load_settings
-from src.schema import ChatMessage, Role
+from src.schema import ChatMessage, Role, CommandProposal
+from src.cache import get_response_cache_key, load_cached_response, save_cached_response
+from src.context import count_tokens
+from src.usage import track_call, CallRecord
+from src.trace import span
+from ..resilience import resilient
+from ..base import (
+    per_event_loop,
+    get_request_semaphore,
+    parse_command_proposal,
+    PromptCacheUsage,
+    COMMAND_PROPOSAL_SCHEMA,
+)
+from .models import MODEL_PRICES
 
+VENDOR = "anthropic"
 
+# Prompts shorter than this can't be cached, so there's no point marking them
+MIN_CACHE_TOKENS = 1024
+
+prompt_cache_usage = PromptCacheUsage()
+
+
+@resilient(VENDOR, anthropic.APIError)
 def answer_query(prompt: str, model: str) -> str:
     client = get_client()
-    try:
+    cache_key = get_response_cache_key(
+        VENDOR, client.base_url, model, 1024, [ChatMessage(role=Role.User, content=prompt)]
+    )
+    cached_text = load_cached_response(cache_key)
+    if cached_text is not None:
+        return cached_text
+
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
         message = client.messages.create(
             model=model,
             max_tokens=1024,
             messages=[{"role": "user", "content": prompt}],
         )
-        return message.content[0].text
-    except anthropic.InternalServerError as e:
-        return "Request failed - Anthropic is broken"
+        record_usage(message.usage, call)
+
+    text = message.content[0].text
+    save_cached_response(cache_key, text)
+    return text
+
+
+def stream_answer_query(prompt: str, model: str) -> Iterator[str]:
+    messages = [ChatMessage(role=Role.User, content=prompt)]
+    yield from stream_chat(messages, model, max_tokens=1024)
 
 
+@resilient(VENDOR, anthropic.APIError)
 def chat(messages: list[ChatMessage], model: str, max_tokens: int = 1024) -> ChatMessage:
     client = get_client()
-    messages = [
-        ChatMessage(role=Role.User, content=m.content) if m.role == Role.System else m
-        for m in messages
-    ]
-    try:
+    cache_key = get_response_cache_key(VENDOR, client.base_url, model, max_tokens, messages)
+    content = load_cached_response(cache_key)
+    if content is not None:
+        return ChatMessage(role=Role.Asssistant, content=content)
+
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
         message = client.messages.create(
             model=model,
             max_tokens=max_tokens,
-            messages=[m.model_dump() for m in messages],
+            **get_message_params(messages),
         )
-        content = message.content[0].text
-    except anthropic.InternalServerError:
-        content = "Request failed - Anthropic is broken"
+        record_usage(message.usage, call)
 
+    content = message.content[0].text
+    save_cached_response(cache_key, content)
     return ChatMessage(role=Role.Asssistant, content=content)
 
 
+async def aanswer_query(prompt: str, model: str) -> str:
+    messages = [ChatMessage(role=Role.User, content=prompt)]
+    message = await achat(messages, model, max_tokens=1024)
+    return message.content
+
+
+@resilient(VENDOR, anthropic.APIError)
+async def achat(messages: list[ChatMessage], model: str, max_tokens: int = 1024) -> ChatMessage:
+    client = get_async_client()
+    cache_key = get_response_cache_key(VENDOR, client.base_url, model, max_tokens, messages)
+    content = load_cached_response(cache_key)
+    if content is not None:
+        return ChatMessage(role=Role.Asssistant, content=content)
+
+    async with get_request_semaphore():
+        # Timed once a slot is free, so that queueing isn't counted as vendor latency
+        with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+            message = await client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                **get_message_params(messages),
+            )
+            record_usage(message.usage, call)
+
+    content = message.content[0].text
+    save_cached_response(cache_key, content)
+    return ChatMessage(role=Role.Asssistant, content=content)
+
+
+@resilient(VENDOR, anthropic.APIError)
+def stream_chat(messages: list[ChatMessage], model: str, max_tokens: int = 1024) -> Iterator[str]:
+    """
+    Like `chat` but yields the text of the response as it is generated
+    """
+    client = get_client()
+    cache_key = get_response_cache_key(VENDOR, client.base_url, model, max_tokens, messages)
+    cached_text = load_cached_response(cache_key)
+    if cached_text is not None:
+        yield cached_text
+        return
+
+    chunks = []
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+        with client.messages.stream(
+            model=model,
+            max_tokens=max_tokens,
+            **get_message_params(messages),
+        ) as stream:
+            for text in stream.text_stream:
+                call.mark_first_byte()
+                chunks.append(text)
+                yield text
+
+            record_usage(stream.get_final_message().usage, call)
+
+    save_cached_response(cache_key, "".join(chunks))
+
+
+@resilient(VENDOR, anthropic.APIError)
+def propose_command(
+    messages: list[ChatMessage], model: str, max_tokens: int = 1024
+) -> CommandProposal:
+    """
+    Ask for a shell command and its explanation in one request, using a forced tool call
+    """
+    client = get_client()
+    cache_key = get_response_cache_key(
+        f"{VENDOR}:propose_command", client.base_url, model, max_tokens, messages
+    )
+    cached_json = load_cached_response(cache_key)
+    if cached_json is not None:
+        return CommandProposal.model_validate_json(cached_json)
+
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+        message = client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            tools=[
+                {
+                    "name": "propose_command",
+                    "description": "Propose a shell command to achieve the user's goal",
+                    "input_schema": COMMAND_PROPOSAL_SCHEMA,
+                }
+            ],
+            tool_choice={"type": "tool", "name": "propose_command"},
+            **get_message_params(messages),
+        )
+        record_usage(message.usage, call)
+
+    for block in message.content:
+        if block.type == "tool_use":
+            try:
+                proposal = CommandProposal(
+                    explanation=block.input.get("explanation") or "",
+                    command=block.input.get("command") or None,
+                )
+                save_cached_response(cache_key, proposal.model_dump_json())
+                return proposal
+            except (AttributeError, ValueError):
+                break
+
+    text = "\n".join(block.text for block in message.content if block.type == "text")
+    if not text:
+        text = "\n".join(
+            json.dumps(block.input) for block in message.content if block.type == "tool_use"
+        )
+
+    return parse_command_proposal(text)
+
+
+def get_message_params(messages: list[ChatMessage]) -> dict:
+    """
+    Builds the system prompt and messages for a request, with prompt cache breakpoints
+    on the system prompt, the latest message and the most recent large message before it.
+    The latest message's breakpoint writes the conversation so far to the cache,
+    which the next turn reads back as its prefix.
+    """
+    system_text = "\n\n".join(m.content for m in messages if m.role == Role.System)
+    messages = [m for m in messages if m.role != Role.System]
+    params = {"messages": [{"role": m.role.value, "content": m.content} for m in messages]}
+    if system_text:
+        params["system"] = [{"type": "text", "text": system_text}]
+        if count_tokens(system_text) >= MIN_CACHE_TOKENS:
+            add_cache_control(params["system"][-1])
+
+    prefix_tokens = count_tokens(system_text) + sum(count_tokens(m.content) for m in messages)
+    if not messages or prefix_tokens < MIN_CACHE_TOKENS:
+        return params
+
+    cache_indices = {len(messages) - 1}
+    for idx in range(len(messages) - 2, -1, -1):
+        if count_tokens(messages[idx].content) >= MIN_CACHE_TOKENS:
+            cache_indices.add(idx)
+            break
+
+    for idx in cache_indices:
+        message_param = params["messages"][idx]
+        content_block = {"type": "text", "text": message_param["content"]}
+        add_cache_control(content_block)
+        message_param["content"] = [content_block]
+
+    return params
+
+
+def add_cache_control(content_block: dict):
+    content_block["cache_control"] = {"type": "ephemeral"}
+
+
+def record_usage(usage, call: CallRecord):
+    if usage is None:
+        return
+
+    # Input tokens don't include tokens read from or written to the prompt cache
+    cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+    input_tokens = usage.input_tokens + cache_read_tokens + cache_write_tokens
+    prompt_cache_usage.add(
+        input_tokens=input_tokens,
+        cache_read_tokens=cache_read_tokens,
+        cache_write_tokens=cache_write_tokens,
+    )
+    call.set_usage(input_tokens, usage.output_tokens, cache_read_tokens, cache_write_tokens)
+
+
+def get_prompt_cache_usage() -> PromptCacheUsage:
+    return prompt_cache_usage
+
+
 @cache
 def get_client():
     settings = load_settings()
-    return anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+    with span("anthropic client", cat="vendor"):
+        # Retried by `resilient` instead, which can also fail over to the other vendor
+        return anthropic.Anthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            base_url=settings.ANTHROPIC_BASE_URL,
+            max_retries=0,
+        )
+
+
+@per_event_loop
+def get_async_client():
+    settings = load_settings()
+    with span("anthropic async client", cat="vendor"):
+        return anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            base_url=settings.ANTHROPIC_BASE_URL,
+            max_retries=0,
+        )
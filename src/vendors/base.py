@@ -0,0 +1,193 @@
+import re
+import json
+import asyncio
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Protocol, TypeVar
+from weakref import WeakKeyDictionary
+
+from src.settings import load_settings
+from src.schema import ChatMessage, CommandProposal
+
+T = TypeVar("T")
+
+COMMAND_PROPOSAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "explanation": {
+            "type": "string",
+            "description": "Brief (1-2 sentence) explanation of the command, or why there isn't one",
+        },
+        "command": {
+            "type": ["string", "null"],
+            "description": "A single shell command to run, or null if no command is appropriate",
+        },
+    },
+    "required": ["explanation", "command"],
+    "additionalProperties": False,
+}
+CODE_BLOCK_PATTERN = re.compile(r"```[\w-]*\n(.*?)```", re.DOTALL)
+
+# Overrides VENDOR_CONCURRENCY, eg. for `ask batch --jobs`
+_request_concurrency: ContextVar[int | None] = ContextVar("request_concurrency", default=None)
+
+
+class Vendor(Protocol):
+    """
+    Interface shared by the vendor packages (src.vendors.anthropic, src.vendors.openai)
+    so that callers can use either, sync or async, without caring which one they have.
+    """
+
+    MODEL_NAME: str
+    DEFAULT_MODEL_OPTION: str
+    FAST_MODEL_OPTION: str
+    MODEL_OPTIONS: dict[str, str]
+    MODEL_CLASSES: dict[str, str]
+
+    def answer_query(self, prompt: str, model: str) -> str: ...
+
+    def chat(
+        self, messages: list[ChatMessage], model: str, max_tokens: int = 1024
+    ) -> ChatMessage: ...
+
+    def stream_answer_query(self, prompt: str, model: str) -> Iterator[str]: ...
+
+    def stream_chat(
+        self, messages: list[ChatMessage], model: str, max_tokens: int = 1024
+    ) -> Iterator[str]: ...
+
+    async def aanswer_query(self, prompt: str, model: str) -> str: ...
+
+    async def achat(
+        self, messages: list[ChatMessage], model: str, max_tokens: int = 1024
+    ) -> ChatMessage: ...
+
+    def propose_command(
+        self, messages: list[ChatMessage], model: str, max_tokens: int = 1024
+    ) -> CommandProposal: ...
+
+    def get_prompt_cache_usage(self) -> "PromptCacheUsage": ...
+
+
+class PromptCacheUsage:
+    """
+    Running total of input tokens, and how many of them hit the vendor's prompt cache
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.input_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+
+    def add(self, input_tokens: int, cache_read_tokens: int, cache_write_tokens: int = 0):
+        with self.lock:
+            self.input_tokens += input_tokens
+            self.cache_read_tokens += cache_read_tokens
+            self.cache_write_tokens += cache_write_tokens
+
+    @property
+    def hit_rate(self) -> float:
+        return self.cache_read_tokens / self.input_tokens if self.input_tokens else 0.0
+
+
+class ModelPrice:
+    """
+    US dollars per million tokens. Cached input tokens are billed at their own rates.
+    """
+
+    def __init__(
+        self,
+        input: float,
+        output: float,
+        cache_read: float | None = None,
+        cache_write: float | None = None,
+    ):
+        self.input = input
+        self.output = output
+        self.cache_read = input if cache_read is None else cache_read
+        self.cache_write = input if cache_write is None else cache_write
+
+    def get_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
+        """
+        input_tokens includes the tokens read from and written to the prompt cache
+        """
+        uncached_tokens = input_tokens - cache_read_tokens - cache_write_tokens
+        total = (
+            uncached_tokens * self.input
+            + cache_read_tokens * self.cache_read
+            + cache_write_tokens * self.cache_write
+            + output_tokens * self.output
+        )
+        return total / 1_000_000
+
+
+def per_event_loop(func: Callable[[], T]) -> Callable[[], T]:
+    """
+    Like functools.cache, but caches one value per running event loop.
+    Async clients and their connection pools can't be shared between loops.
+    """
+    values: WeakKeyDictionary = WeakKeyDictionary()
+
+    @wraps(func)
+    def wrapper() -> T:
+        loop = asyncio.get_running_loop()
+        if loop not in values:
+            values[loop] = func()
+
+        return values[loop]
+
+    return wrapper
+
+
+@per_event_loop
+def get_request_semaphore() -> asyncio.Semaphore:
+    """
+    Limits concurrent async vendor requests in the current event loop
+    """
+    settings = load_settings()
+    return asyncio.Semaphore(_request_concurrency.get() or settings.VENDOR_CONCURRENCY)
+
+
+@contextmanager
+def request_concurrency(limit: int):
+    """
+    Limit concurrent async vendor requests to limit in event loops started inside this block
+    """
+    token = _request_concurrency.set(limit)
+    try:
+        yield
+    finally:
+        _request_concurrency.reset(token)
+
+
+def parse_command_proposal(text: str) -> CommandProposal:
+    """
+    Fallback for responses that don't follow COMMAND_PROPOSAL_SCHEMA:
+    accepts the schema's JSON, otherwise uses the last fenced code block as the command.
+    """
+    try:
+        data = json.loads(text)
+        return CommandProposal(
+            explanation=data.get("explanation") or "",
+            command=data.get("command") or None,
+            structured=False,
+        )
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        pass
+
+    code_blocks = CODE_BLOCK_PATTERN.findall(text)
+    if not code_blocks:
+        return CommandProposal(explanation=text.strip(), command=None, structured=False)
+
+    command = code_blocks[-1].strip()
+    explanation = CODE_BLOCK_PATTERN.sub("", text).strip()
+    return CommandProposal(explanation=explanation, command=command or None, structured=False)
@@ -1,3 +1,19 @@
-from .prompt import answer_query, chat
-from .models import MODEL_OPTIONS, DEFAULT_MODEL_OPTION, MODEL_NAME
-from .image import get_image_url
+from .prompt import (
+    answer_query,
+    chat,
+    stream_answer_query,
+    stream_chat,
+    aanswer_query,
+    achat,
+    propose_command,
+    get_prompt_cache_usage,
+)
+from .models import (
+    MODEL_OPTIONS,
+    MODEL_CLASSES,
+    DEFAULT_MODEL_OPTION,
+    FAST_MODEL_OPTION,
+    MODEL_NAME,
+)
+from .image import get_image_url, aget_image_url
+from .embedding import get_embeddings, EMBEDDING_MODEL
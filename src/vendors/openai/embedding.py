@@ -0,0 +1,17 @@
+from openai import APIError
+
+from src.usage import track_call
+from ..resilience import resilient
+from .prompt import get_client, VENDOR
+from .models import EMBEDDING_MODEL, MODEL_PRICES
+
+
+# Anthropic has no embeddings to fail over to
+@resilient(VENDOR, APIError, failover=False)
+def get_embeddings(texts: list[str], model: str = EMBEDDING_MODEL) -> list[list[float]]:
+    client = get_client()
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+        response = client.embeddings.create(model=model, input=texts)
+        call.set_usage(response.usage.prompt_tokens, 0)
+
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
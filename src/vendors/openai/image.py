@@ -1,9 +1,23 @@
-from .prompt import get_client
+from .prompt import get_client, get_async_client
+from ..base import get_request_semaphore
 
 
 def get_image_url(prompt: str) -> str:
     client = get_client()
-    response = client.images.generate(
+    response = client.images.generate(**get_image_params(prompt))
+    return response.data[0].url
+
+
+async def aget_image_url(prompt: str) -> str:
+    client = get_async_client()
+    async with get_request_semaphore():
+        response = await client.images.generate(**get_image_params(prompt))
+
+    return response.data[0].url
+
+
+def get_image_params(prompt: str) -> dict:
+    return dict(
         model="dall-e-3",
         prompt=prompt,
         style="vivid",
@@ -11,4 +25,3 @@ def get_image_url(prompt: str) -> str:
         quality="hd",
         n=1,
     )
-    return response.data[0].url
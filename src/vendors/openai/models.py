@@ -1,3 +1,6 @@
+from ..base import ModelPrice
+
+
 class GPTModel:
     FourOh = "gpt-4o"
     FourOhMini = "gpt-4o-mini"
@@ -5,7 +8,22 @@ class GPTModel:
 
 MODEL_NAME = "GPT"
 DEFAULT_MODEL_OPTION = "4o"
+# Cheapest and quickest, for mechanical steps like extracting a command
+FAST_MODEL_OPTION = "4o-mini"
 MODEL_OPTIONS = {
     "4o": GPTModel.FourOh,
     "4o-mini": GPTModel.FourOhMini,
 }
+# Options that are interchangeable across vendors share a quality class
+MODEL_CLASSES = {
+    "4o": "strong",
+    "4o-mini": "fast",
+}
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# https://openai.com/api/pricing
+MODEL_PRICES = {
+    GPTModel.FourOh: ModelPrice(2.50, 10.00, cache_read=1.25),
+    GPTModel.FourOhMini: ModelPrice(0.15, 0.60, cache_read=0.075),
+    EMBEDDING_MODEL: ModelPrice(0.02, 0.00),
+}
@@ -1,32 +1,249 @@
+import json
 from functools import cache
+from typing import Iterator
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, APIError
 
 
 from src.settings import load_settings
-from src.schema import ChatMessage, Role
+from src.schema import ChatMessage, Role, CommandProposal
+from src.cache import get_response_cache_key, load_cached_response, save_cached_response
+from src.usage import track_call, CallRecord
+from src.trace import span
+from ..resilience import resilient
+from ..base import (
+    per_event_loop,
+    get_request_semaphore,
+    parse_command_proposal,
+    PromptCacheUsage,
+    COMMAND_PROPOSAL_SCHEMA,
+)
+from .models import MODEL_PRICES
 
+VENDOR = "openai"
 
+prompt_cache_usage = PromptCacheUsage()
+
+
+@resilient(VENDOR, APIError)
 def answer_query(prompt: str, model: str) -> str:
     client = get_client()
-    chat_completion = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}], model=model
+    cache_key = get_response_cache_key(
+        VENDOR, client.base_url, model, None, [ChatMessage(role=Role.User, content=prompt)]
     )
-    return chat_completion.choices[0].message.content
+    cached_text = load_cached_response(cache_key)
+    if cached_text is not None:
+        return cached_text
+
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+        chat_completion = client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}], model=model
+        )
+        record_usage(chat_completion.usage, call)
 
+    text = chat_completion.choices[0].message.content
+    save_cached_response(cache_key, text)
+    return text
 
+
+@resilient(VENDOR, APIError)
+def stream_answer_query(prompt: str, model: str) -> Iterator[str]:
+    client = get_client()
+    cache_key = get_response_cache_key(
+        VENDOR, client.base_url, model, None, [ChatMessage(role=Role.User, content=prompt)]
+    )
+    cached_text = load_cached_response(cache_key)
+    if cached_text is not None:
+        yield cached_text
+        return
+
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+        stream = client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        yield from iter_deltas(stream, cache_key, call)
+
+
+@resilient(VENDOR, APIError)
 def chat(messages: list[ChatMessage], model: str, max_tokens: int = 1024) -> ChatMessage:
     client = get_client()
-    chat_completion = client.chat.completions.create(
-        messages=[m.model_dump() for m in messages],
-        model=model,
-        max_tokens=max_tokens,
+    cache_key = get_response_cache_key(VENDOR, client.base_url, model, max_tokens, messages)
+    content = load_cached_response(cache_key)
+    if content is not None:
+        return ChatMessage(role=Role.Asssistant, content=content)
+
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+        chat_completion = client.chat.completions.create(
+            messages=[m.model_dump() for m in messages],
+            model=model,
+            max_tokens=max_tokens,
+        )
+        record_usage(chat_completion.usage, call)
+
+    content = chat_completion.choices[0].message.content
+    save_cached_response(cache_key, content)
+    return ChatMessage(role=Role.Asssistant, content=content)
+
+
+@resilient(VENDOR, APIError)
+async def aanswer_query(prompt: str, model: str) -> str:
+    client = get_async_client()
+    cache_key = get_response_cache_key(
+        VENDOR, client.base_url, model, None, [ChatMessage(role=Role.User, content=prompt)]
     )
+    cached_text = load_cached_response(cache_key)
+    if cached_text is not None:
+        return cached_text
+
+    async with get_request_semaphore():
+        # Timed once a slot is free, so that queueing isn't counted as vendor latency
+        with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+            chat_completion = await client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}], model=model
+            )
+            record_usage(chat_completion.usage, call)
+
+    text = chat_completion.choices[0].message.content
+    save_cached_response(cache_key, text)
+    return text
+
+
+@resilient(VENDOR, APIError)
+async def achat(messages: list[ChatMessage], model: str, max_tokens: int = 1024) -> ChatMessage:
+    client = get_async_client()
+    cache_key = get_response_cache_key(VENDOR, client.base_url, model, max_tokens, messages)
+    content = load_cached_response(cache_key)
+    if content is not None:
+        return ChatMessage(role=Role.Asssistant, content=content)
+
+    async with get_request_semaphore():
+        with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+            chat_completion = await client.chat.completions.create(
+                messages=[m.model_dump() for m in messages],
+                model=model,
+                max_tokens=max_tokens,
+            )
+            record_usage(chat_completion.usage, call)
+
     content = chat_completion.choices[0].message.content
+    save_cached_response(cache_key, content)
     return ChatMessage(role=Role.Asssistant, content=content)
 
 
+@resilient(VENDOR, APIError)
+def stream_chat(messages: list[ChatMessage], model: str, max_tokens: int = 1024) -> Iterator[str]:
+    """
+    Like `chat` but yields the text of the response as it is generated
+    """
+    client = get_client()
+    cache_key = get_response_cache_key(VENDOR, client.base_url, model, max_tokens, messages)
+    cached_text = load_cached_response(cache_key)
+    if cached_text is not None:
+        yield cached_text
+        return
+
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+        stream = client.chat.completions.create(
+            messages=[m.model_dump() for m in messages],
+            model=model,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        yield from iter_deltas(stream, cache_key, call)
+
+
+@resilient(VENDOR, APIError)
+def propose_command(
+    messages: list[ChatMessage], model: str, max_tokens: int = 1024
+) -> CommandProposal:
+    """
+    Ask for a shell command and its explanation in one request, using structured outputs
+    """
+    client = get_client()
+    cache_key = get_response_cache_key(
+        f"{VENDOR}:propose_command", client.base_url, model, max_tokens, messages
+    )
+    cached_json = load_cached_response(cache_key)
+    if cached_json is not None:
+        return CommandProposal.model_validate_json(cached_json)
+
+    with track_call(VENDOR, model, MODEL_PRICES.get(model)) as call:
+        chat_completion = client.chat.completions.create(
+            messages=[m.model_dump() for m in messages],
+            model=model,
+            max_tokens=max_tokens,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "propose_command",
+                    "schema": COMMAND_PROPOSAL_SCHEMA,
+                    "strict": True,
+                },
+            },
+        )
+        record_usage(chat_completion.usage, call)
+
+    text = chat_completion.choices[0].message.content or ""
+    try:
+        data = json.loads(text)
+        proposal = CommandProposal(
+            explanation=data.get("explanation") or "",
+            command=data.get("command") or None,
+        )
+    except (json.JSONDecodeError, AttributeError, ValueError):
+        return parse_command_proposal(text)
+
+    save_cached_response(cache_key, proposal.model_dump_json())
+    return proposal
+
+
+def iter_deltas(stream, cache_key: str, call: CallRecord) -> Iterator[str]:
+    chunks = []
+    for chunk in stream:
+        if chunk.usage:
+            record_usage(chunk.usage, call)
+
+        if chunk.choices and chunk.choices[0].delta.content:
+            call.mark_first_byte()
+            chunks.append(chunk.choices[0].delta.content)
+            yield chunk.choices[0].delta.content
+
+    save_cached_response(cache_key, "".join(chunks))
+
+
+def record_usage(usage, call: CallRecord):
+    if usage is None:
+        return
+
+    # Prompt tokens include cached tokens, OpenAI caches prompts automatically
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    prompt_cache_usage.add(input_tokens=usage.prompt_tokens, cache_read_tokens=cached_tokens)
+    call.set_usage(usage.prompt_tokens, usage.completion_tokens or 0, cached_tokens)
+
+
+def get_prompt_cache_usage() -> PromptCacheUsage:
+    return prompt_cache_usage
+
+
 @cache
 def get_client():
     settings = load_settings()
-    return OpenAI(api_key=settings.OPENAI_API_KEY)
+    with span("openai client", cat="vendor"):
+        # Retried by `resilient` instead, which can also fail over to the other vendor
+        return OpenAI(
+            api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0
+        )
+
+
+@per_event_loop
+def get_async_client():
+    settings = load_settings()
+    with span("openai async client", cat="vendor"):
+        return AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0
+        )
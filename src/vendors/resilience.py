@@ -0,0 +1,391 @@
+"""
+Retries, hedged requests and failover for vendor calls.
+
+Vendor functions are wrapped with `resilient`, which retries transient errors (rate limits,
+overloads, 5xx, dropped connections) with jittered exponential backoff, waiting at least as
+long as a retry-after header asks. With VENDOR_HEDGING on, a non-streamed call that takes
+longer than the model's usual p95 latency gets a second identical request, and whichever
+answers first wins. The slower request is cancelled for async calls, and left to finish in
+the background otherwise. If the vendor is still failing and both API keys are set, the
+call is made with the other vendor instead.
+"""
+
+import time
+import queue
+import random
+import asyncio
+import inspect
+import itertools
+import threading
+import contextvars
+import email.utils
+from functools import cache, wraps
+from typing import Callable
+
+from src.settings import load_settings
+from src.trace import instant
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Worth trying the other vendor for, but not worth retrying
+FAILOVER_STATUSES = {401, 403}
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_MAX = 8.0  # seconds
+# Give up on a vendor rather than wait longer than this for it
+MAX_RETRY_AFTER = 60.0  # seconds
+HEDGE_MIN_CALLS = 20
+HEDGE_HISTORY_DAYS = 7
+VENDOR_NAMES = ("anthropic", "openai")
+
+# Set while a call is being made with the other vendor, so that it doesn't fail back
+_in_failover = contextvars.ContextVar("in_failover", default=False)
+
+
+class VendorError(Exception):
+    """
+    A vendor call that failed after retrying, and after failing over if that was possible
+    """
+
+
+def resilient(vendor_name: str, api_error: type[Exception], failover: bool = True):
+    """
+    Retry a vendor function's transient errors and fail over to the other vendor.
+    api_error is the SDK's base class for errors from the API, eg. anthropic.APIError.
+    The function must take the model as its second argument.
+    Streams are only retried until their first chunk has been yielded.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.isgeneratorfunction(func):
+            return wraps(func)(make_stream_wrapper(func, vendor_name, api_error, failover))
+        elif inspect.iscoroutinefunction(func):
+            return wraps(func)(make_async_wrapper(func, vendor_name, api_error, failover))
+        else:
+            return wraps(func)(make_sync_wrapper(func, vendor_name, api_error, failover))
+
+    return decorator
+
+
+def make_sync_wrapper(func, vendor_name: str, api_error: type[Exception], failover: bool):
+    def wrapper(*args, **kwargs):
+        can_fail_over = failover and not _in_failover.get()
+        model = get_model(args, kwargs)
+        hedge_delay = get_hedge_delay(model)
+        for attempt in itertools.count():
+            try:
+                if hedge_delay is None:
+                    return func(*args, **kwargs)
+                else:
+                    return run_hedged(func, args, kwargs, hedge_delay, vendor_name, model)
+            except api_error as e:
+                delay = get_retry_delay(e, attempt)
+                if delay is None:
+                    error = e
+                    break
+
+                mark_retry(vendor_name, model, attempt, delay, e)
+                time.sleep(delay)
+
+        fallback = get_fallback(vendor_name, func.__name__, model, error) if can_fail_over else None
+        if fallback is None:
+            raise VendorError(describe_error(vendor_name, error)) from error
+
+        fallback_func, fallback_model = fallback
+        fallback_args, fallback_kwargs = replace_model(args, kwargs, fallback_model)
+        token = _in_failover.set(True)
+        try:
+            return fallback_func(*fallback_args, **fallback_kwargs)
+        finally:
+            _in_failover.reset(token)
+
+    return wrapper
+
+
+def make_async_wrapper(func, vendor_name: str, api_error: type[Exception], failover: bool):
+    async def wrapper(*args, **kwargs):
+        can_fail_over = failover and not _in_failover.get()
+        model = get_model(args, kwargs)
+        hedge_delay = get_hedge_delay(model)
+        for attempt in itertools.count():
+            try:
+                if hedge_delay is None:
+                    return await func(*args, **kwargs)
+                else:
+                    return await arun_hedged(func, args, kwargs, hedge_delay, vendor_name, model)
+            except api_error as e:
+                delay = get_retry_delay(e, attempt)
+                if delay is None:
+                    error = e
+                    break
+
+                mark_retry(vendor_name, model, attempt, delay, e)
+                await asyncio.sleep(delay)
+
+        fallback = get_fallback(vendor_name, func.__name__, model, error) if can_fail_over else None
+        if fallback is None:
+            raise VendorError(describe_error(vendor_name, error)) from error
+
+        fallback_func, fallback_model = fallback
+        fallback_args, fallback_kwargs = replace_model(args, kwargs, fallback_model)
+        token = _in_failover.set(True)
+        try:
+            return await fallback_func(*fallback_args, **fallback_kwargs)
+        finally:
+            _in_failover.reset(token)
+
+    return wrapper
+
+
+def make_stream_wrapper(func, vendor_name: str, api_error: type[Exception], failover: bool):
+    def wrapper(*args, **kwargs):
+        can_fail_over = failover and not _in_failover.get()
+        model = get_model(args, kwargs)
+        for attempt in itertools.count():
+            is_started = False
+            try:
+                for chunk in func(*args, **kwargs):
+                    is_started = True
+                    yield chunk
+
+                return
+            except api_error as e:
+                # Text that has been shown can't be taken back, so it's too late to retry
+                delay = None if is_started else get_retry_delay(e, attempt)
+                if delay is None:
+                    error = e
+                    break
+
+                mark_retry(vendor_name, model, attempt, delay, e)
+                time.sleep(delay)
+
+        fallback = None
+        if can_fail_over and not is_started:
+            fallback = get_fallback(vendor_name, func.__name__, model, error)
+
+        if fallback is None:
+            raise VendorError(describe_error(vendor_name, error)) from error
+
+        fallback_func, fallback_model = fallback
+        fallback_args, fallback_kwargs = replace_model(args, kwargs, fallback_model)
+        chunks = fallback_func(*fallback_args, **fallback_kwargs)
+        # The guard is only held until the fallback's first chunk, as a context variable
+        # set in a generator would otherwise leak into the caller between chunks
+        token = _in_failover.set(True)
+        try:
+            first_chunks = list(itertools.islice(chunks, 1))
+        finally:
+            _in_failover.reset(token)
+
+        yield from first_chunks
+        yield from chunks
+
+    return wrapper
+
+
+def run_hedged(func, args: tuple, kwargs: dict, delay: float, vendor_name: str, model: str):
+    """
+    Call a function, and call it again in parallel if the first call is slower than the delay.
+    Returns the first result, or raises the last error if both fail.
+
+    The SDKs' blocking calls can't be interrupted, so the slower request is left behind:
+    its daemon thread runs until the response arrives, the result is thrown away, and its
+    tokens are still recorded in the usage store. It doesn't hold up the process exiting.
+    """
+    results = queue.Queue()
+
+    def start():
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(run,), daemon=True)
+        thread.start()
+
+    def run():
+        try:
+            results.put((True, func(*args, **kwargs)))
+        except Exception as e:
+            results.put((False, e))
+
+    start()
+    num_started = 1
+    try:
+        is_ok, value = results.get(timeout=delay)
+    except queue.Empty:
+        instant("hedge", cat="vendor", vendor=vendor_name, model=model, delay=delay)
+        start()
+        num_started += 1
+        is_ok, value = results.get()
+
+    if not is_ok and num_started > 1:
+        is_ok, value = results.get()
+
+    if not is_ok:
+        raise value
+
+    return value
+
+
+async def arun_hedged(func, args: tuple, kwargs: dict, delay: float, vendor_name: str, model: str):
+    """
+    Like `run_hedged`, but the slower request is cancelled
+    """
+    tasks = {asyncio.ensure_future(func(*args, **kwargs))}
+    done, pending = await asyncio.wait(tasks, timeout=delay)
+    if not done:
+        instant("hedge", cat="vendor", vendor=vendor_name, model=model, delay=delay)
+        pending.add(asyncio.ensure_future(func(*args, **kwargs)))
+
+    error = None
+    try:
+        while True:
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+
+                error = task.exception()
+
+            if not pending:
+                raise error
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def get_retry_delay(error: Exception, attempt: int) -> float | None:
+    """
+    Seconds to wait before retrying, or None if the call shouldn't be retried
+    """
+    status_code = getattr(error, "status_code", None)
+    # Connection errors and timeouts have no status
+    is_retryable = status_code is None or status_code in RETRYABLE_STATUSES
+    if not is_retryable or attempt >= load_settings().VENDOR_MAX_RETRIES:
+        return None
+
+    retry_after = get_retry_after(error)
+    if retry_after is None:
+        # Full jitter, so that clients which failed together don't retry together
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+    elif retry_after > MAX_RETRY_AFTER:
+        return None
+    else:
+        return retry_after + random.uniform(0, BACKOFF_BASE)
+
+
+def get_retry_after(error: Exception) -> float | None:
+    """
+    Seconds the vendor asked us to wait, from retry-after-ms or retry-after
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+
+    # retry-after can also be an HTTP date
+    try:
+        retry_at = email.utils.parsedate_to_datetime(headers.get("retry-after", ""))
+        return max(retry_at.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@cache
+def get_hedge_delay(model: str | None) -> float | None:
+    """
+    Seconds to wait for a response before hedging, the p95 latency of the model's recent
+    calls, or None if hedging is off or there aren't enough calls to go on
+    """
+    from src.usage import get_usage_store, percentile
+
+    if model is None or not load_settings().VENDOR_HEDGING:
+        return None
+
+    usage_store = get_usage_store()
+    if usage_store is None:
+        return None
+
+    since = time.time() - HEDGE_HISTORY_DAYS * 24 * 60 * 60
+    wall_ms = usage_store.get_wall_ms(model, since)
+    if len(wall_ms) < HEDGE_MIN_CALLS:
+        return None
+
+    return percentile(wall_ms, 95) / 1000
+
+
+def get_fallback(
+    vendor_name: str, func_name: str, model: str | None, error: Exception
+) -> tuple[Callable, str] | None:
+    """
+    The other vendor's version of a function and the closest model it has,
+    if both API keys are set and the error is one the other vendor might not have
+    """
+    from src import vendors
+
+    settings = load_settings()
+    status_code = getattr(error, "status_code", None)
+    is_vendor_fault = status_code is None or status_code in RETRYABLE_STATUSES | FAILOVER_STATUSES
+    if not settings.VENDOR_FAILOVER or not is_vendor_fault or model is None:
+        return None
+
+    if not (settings.ANTHROPIC_API_KEY and settings.OPENAI_API_KEY):
+        return None
+
+    vendor = getattr(vendors, vendor_name)
+    other_name = next(name for name in VENDOR_NAMES if name != vendor_name)
+    other_vendor = getattr(vendors, other_name)
+    fallback_func = getattr(other_vendor, func_name, None)
+    if fallback_func is None:
+        return None
+
+    fallback_model = get_matching_model(vendor, other_vendor, model)
+    instant("failover", cat="vendor", vendor=vendor_name, to=other_name, model=fallback_model)
+    return fallback_func, fallback_model
+
+
+def get_matching_model(vendor, other_vendor, model: str) -> str:
+    """
+    The other vendor's model in the same quality class, or its default model
+    """
+    options = {model: option for option, model in vendor.MODEL_OPTIONS.items()}
+    quality = vendor.MODEL_CLASSES.get(options.get(model))
+    for option, other_quality in other_vendor.MODEL_CLASSES.items():
+        if other_quality == quality:
+            return other_vendor.MODEL_OPTIONS[option]
+
+    return other_vendor.MODEL_OPTIONS[other_vendor.DEFAULT_MODEL_OPTION]
+
+
+def get_model(args: tuple, kwargs: dict) -> str | None:
+    return args[1] if len(args) > 1 else kwargs.get("model")
+
+
+def replace_model(args: tuple, kwargs: dict, model: str) -> tuple[tuple, dict]:
+    if len(args) > 1:
+        return (args[0], model, *args[2:]), kwargs
+
+    return args, {**kwargs, "model": model}
+
+
+def mark_retry(vendor_name: str, model: str | None, attempt: int, delay: float, error: Exception):
+    instant(
+        "retry",
+        cat="vendor",
+        vendor=vendor_name,
+        model=model,
+        attempt=attempt + 1,
+        delay=round(delay, 3),
+        error=type(error).__name__,
+    )
+
+
+def describe_error(vendor_name: str, error: Exception) -> str:
+    status_code = getattr(error, "status_code", None)
+    status = f" ({status_code})" if status_code else ""
+    return f"{vendor_name.title()} request failed{status}: {error}"
@@ -0,0 +1,294 @@
+"""
+Opt-in choice of vendor and model by recent performance.
+
+Without ADAPTIVE_ROUTING, Anthropic is used if its key is set and OpenAI otherwise.
+With it on and both keys set, new conversations go to whichever vendor's model in the
+same quality class (see MODEL_CLASSES) has had the lowest time to first token,
+allowing for errors, as an EWMA over recent calls. Health is kept in ~/.ask/router.json
+along with a copy of each vendor's model options, so that choosing doesn't mean importing
+every vendor's SDK.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import importlib
+import threading
+from functools import cache
+from pathlib import Path
+
+from src.settings import CONFIG_DIR, load_settings
+from src.usage import CallRecord, add_call_observer
+from src.trace import instant
+
+ROUTER_FILE = CONFIG_DIR / "router.json"
+VENDOR_NAMES = ("anthropic", "openai")
+EWMA_ALPHA = 0.2
+# Error rates fade while a pair isn't used, so a vendor that has recovered gets another go
+ERROR_HALF_LIFE = 30 * 60  # seconds
+# Calls seen before a pair's health is trusted
+MIN_CALLS = 3
+# Chance of trying another pair, to learn about it or see whether it has recovered
+EXPLORE_RATE = 0.1
+# Only move away from the usual vendor when another is clearly better
+SWITCH_MARGIN = 0.8
+
+
+class PairHealth:
+    """
+    EWMA of time to first token and error rate for one vendor's model
+    """
+
+    def __init__(
+        self,
+        vendor: str,
+        model: str,
+        ttft_ms: float | None = None,
+        error_rate: float = 0.0,
+        num_calls: int = 0,
+        num_chosen: int = 0,
+        updated_at: float = 0.0,
+    ):
+        self.vendor = vendor
+        self.model = model
+        self.ttft_ms = ttft_ms
+        self.error_rate = error_rate
+        self.num_calls = num_calls
+        self.num_chosen = num_chosen
+        self.updated_at = updated_at
+
+    def observe(self, ttft_ms: float | None, is_error: bool, now: float):
+        self.error_rate = get_ewma(self.get_error_rate(now), float(is_error))
+        if not is_error and ttft_ms is not None:
+            self.ttft_ms = ttft_ms if self.ttft_ms is None else get_ewma(self.ttft_ms, ttft_ms)
+
+        self.num_calls += 1
+        self.updated_at = now
+
+    def get_error_rate(self, now: float) -> float:
+        age = max(now - self.updated_at, 0.0)
+        return self.error_rate * 0.5 ** (age / ERROR_HALF_LIFE)
+
+    def get_score(self, now: float) -> float | None:
+        """
+        Expected wait in ms, counting failed calls as wasted time. Lower is better.
+        """
+        if self.ttft_ms is None or self.num_calls < MIN_CALLS:
+            return None
+
+        return self.ttft_ms / max(1.0 - self.get_error_rate(now), 0.05)
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class VendorRouter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pairs: dict[str, PairHealth] = {}
+        # Model options of each vendor, as in its models.py
+        self.catalogs: dict[str, dict] = {}
+        self.last_decision: dict | None = None
+        self.changed_keys = set()
+        self.is_changed = False
+        data = self.read()
+        self.pairs = {key: PairHealth(**pair) for key, pair in data.get("pairs", {}).items()}
+        self.catalogs = data.get("catalogs", {})
+        self.last_decision = data.get("last_decision")
+
+    def read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def observe(self, call: CallRecord):
+        with self.lock:
+            model = get_model_name(call.model)
+            key = get_pair_key(call.vendor, model)
+            pair = self.pairs.get(key)
+            if pair is None:
+                pair = self.pairs[key] = PairHealth(call.vendor, model)
+
+            pair.observe(call.ttfb_ms, call.is_error, time.time())
+            self.changed_keys.add(key)
+            self.is_changed = True
+            # The vendor has just been used, so its models are already imported
+            vendor = sys.modules.get(f"src.vendors.{call.vendor}")
+            if vendor is not None and call.vendor not in self.catalogs:
+                self.catalogs[call.vendor] = get_catalog(vendor)
+
+    def get_catalog(self, vendor_name: str) -> dict:
+        catalog = self.catalogs.get(vendor_name)
+        if catalog is None:
+            vendor = importlib.import_module(f"src.vendors.{vendor_name}")
+            catalog = self.catalogs[vendor_name] = get_catalog(vendor)
+            self.is_changed = True
+
+        return catalog
+
+    def get_option(self, vendor_name: str, model: str) -> str | None:
+        for option, option_model in self.catalogs.get(vendor_name, {}).get("options", {}).items():
+            if option_model == model:
+                return option
+
+        return None
+
+    def get_pair(self, vendor_name: str, option: str) -> PairHealth:
+        model = self.get_catalog(vendor_name)["options"][option]
+        key = get_pair_key(vendor_name, model)
+        pair = self.pairs.get(key)
+        if pair is None:
+            pair = self.pairs[key] = PairHealth(vendor_name, model)
+
+        return pair
+
+    def get_updated_at(self, vendor_name: str, option: str) -> float:
+        pair = self.get_pair(vendor_name, option)
+        if pair.num_calls < MIN_CALLS:
+            return 0.0
+
+        return pair.updated_at
+
+    def select(self, vendor_names: list[str]) -> tuple[str, str]:
+        """
+        Pick a vendor name and model option, preferring the first vendor's default option
+        """
+        now = time.time()
+        default_name = vendor_names[0]
+        default_option = self.get_catalog(default_name)["default_option"]
+        quality = self.get_catalog(default_name)["classes"].get(default_option)
+        candidates = [(default_name, default_option)]
+        for name in vendor_names:
+            catalog = self.get_catalog(name)
+            for option, option_quality in catalog["classes"].items():
+                if option_quality == quality and (name, option) not in candidates:
+                    candidates.append((name, option))
+
+        with self.lock:
+            scores = {
+                candidate: self.get_pair(*candidate).get_score(now) for candidate in candidates
+            }
+            known = {candidate: score for candidate, score in scores.items() if score is not None}
+            default = (default_name, default_option)
+            choice, reason = default, "default"
+            if default in known:
+                best = min(known, key=known.get)
+                if known[best] < known[default] * SWITCH_MARGIN:
+                    choice, reason = best, "healthier"
+
+            others = [candidate for candidate in candidates if candidate != choice]
+            if others and random.random() < EXPLORE_RATE:
+                # Pairs without enough calls first, then the one heard from least recently
+                choice = min(others, key=lambda candidate: self.get_updated_at(*candidate))
+                reason = "explore"
+
+            name, option = choice
+            pair = self.get_pair(name, option)
+            pair.num_chosen += 1
+            self.changed_keys.add(get_pair_key(pair.vendor, pair.model))
+            self.is_changed = True
+            self.last_decision = {
+                "at": now,
+                "vendor": name,
+                "option": option,
+                "reason": reason,
+                "scores": {
+                    f"{name}/{option}": None if score is None else round(score)
+                    for (name, option), score in scores.items()
+                },
+            }
+
+        instant("choose vendor", cat="router", **self.last_decision)
+        return name, option
+
+    def save(self):
+        """
+        Write out what changed in this process, keeping other processes' updates to other pairs
+        """
+        with self.lock:
+            if not self.is_changed:
+                return
+
+            data = self.read()
+            pairs = data.get("pairs", {})
+            for key in self.changed_keys:
+                pairs[key] = self.pairs[key].to_dict()
+
+            data["pairs"] = pairs
+            data["catalogs"] = {**data.get("catalogs", {}), **self.catalogs}
+            if self.last_decision:
+                data["last_decision"] = self.last_decision
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+
+        tmp_path.replace(self.path)
+
+
+def select_vendor():
+    """
+    The vendor module and model option to start a conversation with, None if no key is set
+    """
+    from src import vendors
+
+    settings = load_settings()
+    vendor_names = [
+        name
+        for name, api_key in zip(
+            VENDOR_NAMES, (settings.ANTHROPIC_API_KEY, settings.OPENAI_API_KEY)
+        )
+        if api_key
+    ]
+    if not vendor_names:
+        return None
+
+    if not settings.ADAPTIVE_ROUTING or len(vendor_names) < 2:
+        vendor = getattr(vendors, vendor_names[0])
+        return vendor, vendor.DEFAULT_MODEL_OPTION
+
+    vendor_name, model_option = get_router().select(vendor_names)
+    vendor = getattr(vendors, vendor_name)
+    if model_option not in vendor.MODEL_OPTIONS:
+        # The saved options are from an older version of ask
+        return vendor, vendor.DEFAULT_MODEL_OPTION
+
+    return vendor, model_option
+
+
+@cache
+def get_router() -> VendorRouter:
+    router = VendorRouter(ROUTER_FILE)
+    add_call_observer(router.observe)
+    atexit.register(router.save)
+    return router
+
+
+def get_catalog(vendor) -> dict:
+    return {
+        "default_option": vendor.DEFAULT_MODEL_OPTION,
+        "options": {
+            option: get_model_name(model) for option, model in vendor.MODEL_OPTIONS.items()
+        },
+        "classes": dict(vendor.MODEL_CLASSES),
+    }
+
+
+def get_model_name(model) -> str:
+    # Model enums are stored by value, as in the usage store
+    return getattr(model, "value", model)
+
+
+def get_pair_key(vendor_name: str, model: str) -> str:
+    return f"{vendor_name}/{model}"
+
+
+def get_ewma(average: float, value: float) -> float:
+    return (1 - EWMA_ALPHA) * average + EWMA_ALPHA * value
@@ -0,0 +1,52 @@
+"""
+Sends each kind of vendor call to a model tier, so that mechanical steps like extracting
+a command or compressing history don't run on the model picked for chatting.
+
+MODEL_ROUTES maps a route (see ModelRoute) to a tier: "default" for the model being chatted
+with, "fast" for the vendor's FAST_MODEL_OPTION, or the name of one of its MODEL_OPTIONS.
+Calls are logged with their route, so `ask stats --by route` shows how each one performs.
+"""
+
+from contextlib import contextmanager
+from typing import Iterator
+
+from src.settings import load_settings
+from src.schema import ModelRoute
+from src.usage import current_route
+
+DEFAULT_TIER = "default"
+FAST_TIER = "fast"
+
+DEFAULT_ROUTES = {
+    ModelRoute.Chat: DEFAULT_TIER,
+    ModelRoute.CommandExtraction: FAST_TIER,
+    ModelRoute.Compression: FAST_TIER,
+    ModelRoute.TaskGeneration: DEFAULT_TIER,
+}
+
+
+def get_route_option(vendor, model_option: str, route: ModelRoute) -> str:
+    """
+    The model option to use for a kind of call, given the one being chatted with
+    """
+    tier = load_settings().MODEL_ROUTES.get(route.value, DEFAULT_ROUTES[route])
+    if tier == FAST_TIER:
+        return vendor.FAST_MODEL_OPTION
+    elif tier in vendor.MODEL_OPTIONS:
+        return tier
+    else:
+        # The default tier, or an option of the other vendor
+        return model_option
+
+
+@contextmanager
+def use_route(vendor, model_option: str, route: ModelRoute) -> Iterator[str]:
+    """
+    Yields the model option for a kind of call, and logs the calls made in this block
+    under the route, eg.
+
+        with use_route(vendor, model_option, ModelRoute.Compression) as model_option:
+            vendor.chat(messages, vendor.MODEL_OPTIONS[model_option])
+    """
+    with current_route(route.value):
+        yield get_route_option(vendor, model_option, route)
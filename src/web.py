@@ -1,19 +1,86 @@
-import json
-from io import BytesIO
+import time
+import hashlib
+from functools import cache, partial
+from typing import Callable, Iterator
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from bs4 import BeautifulSoup
-from trafilatura import extract
-from pypdf import PdfReader
+from requests.adapters import HTTPAdapter
 
+from .pdf import split_page_selector, parse_page_selector, extract_pdf_text
+from .trace import span
 
 REQUESTS_HEADERS = {
     "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36",
 }
+MAX_CONNECTIONS_PER_HOST = 4
+MAX_CONCURRENT_FETCHES = 8
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+HTML_MIME_TYPES = ("text/html", "application/xhtml+xml")
+TEXT_MIME_TYPES = ("application/json", "application/xml", "application/javascript")
+HTML_MARKERS = (b"<!doctype html", b"<html", b"<head", b"<body")
 
+# Called with (url, bytes downloaded so far, total bytes if known)
+ProgressCallback = Callable[[str, int, int | None], None]
 
-def fetch_text_for_url(url: str) -> str | None:
+
+@cache
+def get_session() -> requests.Session:
+    """
+    Shared session so connections are kept alive between fetches.
+    Blocks when a host already has MAX_CONNECTIONS_PER_HOST connections in use.
+    """
+    session = requests.Session()
+    session.headers.update(REQUESTS_HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=MAX_CONCURRENT_FETCHES * 2,
+        pool_maxsize=MAX_CONNECTIONS_PER_HOST,
+        pool_block=True,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_texts_for_urls(
+    urls: list[str],
+    max_workers: int = MAX_CONCURRENT_FETCHES,
+    max_age: int | None = None,
+    pages: str | None = None,
+    on_progress: ProgressCallback | None = None,
+) -> Iterator[tuple[str, str | None]]:
+    """
+    Fetch many URLs concurrently, yielding (url, text) pairs in input order
+    """
+
+    def fetch(url: str) -> str | None:
+        return fetch_text_for_url(url, max_age=max_age, pages=pages, on_progress=on_progress)
+
+    if len(urls) <= 1:
+        for url in urls:
+            yield url, fetch(url)
+
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        yield from zip(urls, executor.map(fetch, urls))
+
+
+def fetch_text_for_url(
+    url: str,
+    max_age: int | None = None,
+    max_bytes: int | None = None,
+    pages: str | None = None,
+    on_progress: ProgressCallback | None = None,
+) -> str | None:
+    """
+    Fetch a page's text. Pages are cached on disk: a cached page younger than max_age
+    seconds is used without touching the network, older ones are revalidated.
+    Downloads bigger than max_bytes are abandoned, on_progress is called as chunks arrive.
+    For PDFs, only the pages picked by `pages` or a "#pages=10-20" URL suffix are extracted.
+    """
     # Validate URL format
     if not url.startswith(("http://", "https://")):
         url = "http://" + url
@@ -22,30 +89,206 @@ def fetch_text_for_url(url: str) -> str | None:
     if not all([parsed_url.scheme, parsed_url.netloc]):
         return "Error: Invalid URL format. Please provide a valid URL (e.g., http://example.com)"
 
+    # The page selector stays in the URL so that each selection is cached separately
+    if pages and "#pages=" not in url:
+        url = f"{url}#pages={pages}"
+
+    request_url, pages = split_page_selector(url)
+    if pages:
+        try:
+            parse_page_selector(pages)
+        except ValueError as e:
+            return f"Error: {e}"
+
+    from .cache import get_page_cache
+
+    page_cache = get_page_cache()
+    cached_page = page_cache.get(url) if page_cache else None
+    if cached_page:
+        if max_age is None:
+            max_age = get_web_setting("WEB_CACHE_MAX_AGE", 0)
+
+        if cached_page["fetched_at"] >= time.time() - max_age:
+            page_cache.touch(url, is_revalidated=False)
+            return cached_page["text"]
+
+    headers = {}
+    if cached_page and cached_page["etag"]:
+        headers["if-none-match"] = cached_page["etag"]
+    if cached_page and cached_page["last_modified"]:
+        headers["if-modified-since"] = cached_page["last_modified"]
+
+    if max_bytes is None:
+        max_bytes = get_web_setting("WEB_MAX_BYTES", DEFAULT_MAX_BYTES)
+
     try:
-        resp = requests.get(url, timeout=30, headers=REQUESTS_HEADERS)
-        resp.raise_for_status()
+        with (
+            span("fetch", cat="web", url=request_url) as fetch_span,
+            get_session().get(request_url, timeout=30, headers=headers, stream=True) as resp,
+        ):
+            fetch_span.set(status=resp.status_code)
+            if resp.status_code == 304 and cached_page:
+                page_cache.touch(url, is_revalidated=True)
+                return cached_page["text"]
+
+            resp.raise_for_status()
+            content_type = resp.headers.get("content-type")
+            progress_callback = partial(on_progress, url) if on_progress else None
+            body = read_body(resp, max_bytes, progress_callback)
+    except ResponseTooLarge as e:
+        size_mb, max_mb = e.num_bytes / 2**20, max_bytes / 2**20
+        return f"Error: The response is too large ({size_mb:.1f}MB, the limit is {max_mb:.1f}MB)"
     except requests.ConnectionError:
+        if cached_page:
+            # Offline, a stale copy is better than nothing
+            return cached_page["text"]
+
         return "Error: Could not connect to the server. Please check if the URL is correct and the server is accessible."
     except requests.Timeout:
+        if cached_page:
+            return cached_page["text"]
+
         return "Error: The request timed out. Please try again later."
     except requests.HTTPError as e:
         return f"Error: HTTP {e.response.status_code} - Failed to fetch the page"
     except Exception as e:
         return f"Error: An unexpected error occurred: {str(e)}"
 
-    if resp.headers["content-type"] == "application/pdf":
-        buffer = BytesIO(resp.content)
-        reader = PdfReader(buffer)
-        text_pages = []
-        for page in reader.pages:
-            text_pages.append(page.extract_text())
+    body_hash = hashlib.sha256(body).hexdigest()
+    if cached_page and cached_page["body_hash"] == body_hash:
+        # Page hasn't changed, no need to extract the text again
+        page_cache.touch(url, is_revalidated=True)
+        return cached_page["text"]
+
+    content_kind = sniff_content_kind(content_type, body)
+    if content_kind is None:
+        return f"Error: Can't extract text from {content_type or 'binary'} content"
+
+    try:
+        with span("extract", cat="web", url=request_url, kind=content_kind, num_bytes=len(body)):
+            text = extract_text(body, content_kind, content_type, pages)
+    except ValueError as e:
+        # No pages matched the selector
+        return f"Error: {e}"
+
+    if page_cache and text is not None:
+        page_cache.set(
+            url,
+            etag=resp.headers.get("etag"),
+            last_modified=resp.headers.get("last-modified"),
+            body_hash=body_hash,
+            text=text,
+        )
+
+    return text
 
-        return "\n\n".join(text_pages)
 
+class ResponseTooLarge(Exception):
+    def __init__(self, num_bytes: int):
+        super().__init__(f"Response is at least {num_bytes} bytes")
+        self.num_bytes = num_bytes
+
+
+def read_body(
+    resp: requests.Response,
+    max_bytes: int,
+    on_progress: Callable[[int, int | None], None] | None = None,
+) -> bytes:
+    """
+    Read a streamed response in chunks, giving up as soon as it's bigger than max_bytes
+    """
+    content_length = resp.headers.get("content-length", "")
+    total_bytes = int(content_length) if content_length.isdigit() else None
+    if total_bytes is not None and total_bytes > max_bytes:
+        raise ResponseTooLarge(total_bytes)
+
+    body = bytearray()
+    for chunk in resp.iter_content(CHUNK_SIZE):
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise ResponseTooLarge(len(body))
+
+        if on_progress:
+            on_progress(len(body), total_bytes)
+
+    return bytes(body)
+
+
+def sniff_content_kind(content_type: str | None, body: bytes) -> str | None:
+    """
+    Work out whether a response is "pdf", "html" or "text" from its content type header
+    and its first bytes, which win when the two disagree. Returns None for other binary data.
+    """
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+    head = body[:1024].lstrip().lower()
+    if head.startswith(b"%pdf-"):
+        return "pdf"
+    elif head.startswith(HTML_MARKERS):
+        # eg. an error page served with the content type of the file that was asked for
+        return "html"
+    elif mime_type in HTML_MIME_TYPES:
+        return "html"
+    elif mime_type == "application/pdf":
+        return "pdf"
+    elif mime_type.startswith("text/") or mime_type in TEXT_MIME_TYPES:
+        return "text"
+    elif b"\x00" not in head:
+        # No content type worth trusting, but it doesn't look binary
+        return "text"
+    else:
+        return None
+
+
+def extract_text(
+    body: bytes, content_kind: str, content_type: str | None, pages: str | None = None
+) -> str | None:
+    if content_kind == "pdf":
+        return extract_pdf_text(body, pages)
+    elif content_kind == "html":
+        # Trafilatura works out the encoding from the page itself
+        return extract_html_text(body)
     else:
-        html = resp.text
-        cleaned_html = BeautifulSoup(html, "html5lib").prettify()
-        contents_raw = extract(cleaned_html, output_format="json")
-        contents = json.loads(contents_raw)
-        return contents["text"]
+        return decode_text(body, content_type)
+
+
+def extract_html_text(html: str | bytes) -> str | None:
+    """
+    Extract the main text of a HTML page. Trafilatura parses the raw HTML with lxml,
+    which is fast and copes with most pages. Badly broken markup can trip it up, so only then
+    do we fall back to cleaning the page with the slower html5lib parser and trying again.
+    """
+    from trafilatura import extract
+
+    text = extract(html, output_format="txt", include_comments=False)
+    if text:
+        return text
+
+    from bs4 import BeautifulSoup
+
+    cleaned_html = BeautifulSoup(html, "html5lib").prettify()
+    return extract(cleaned_html, output_format="txt", include_comments=False)
+
+
+def decode_text(body: bytes, content_type: str | None) -> str:
+    charset = "utf-8"
+    for param in (content_type or "").split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            charset = value.strip().strip('"')
+
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def get_web_setting(name: str, default):
+    """
+    Fetching works without any API keys, in which case settings can't be loaded
+    """
+    from .settings import load_settings
+
+    try:
+        return getattr(load_settings(), name)
+    except ValueError:
+        return default
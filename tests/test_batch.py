@@ -0,0 +1,53 @@
+import io
+import json
+import asyncio
+from types import SimpleNamespace
+
+from click.testing import CliRunner
+
+from src.cli.batch import batch, run_batch
+from src.vendors import base
+from src.vendors.base import get_request_semaphore, request_concurrency
+
+
+def test_jobs_must_be_positive():
+    for jobs in ("0", "-2"):
+        result = CliRunner().invoke(batch, ["--jobs", jobs], input="")
+        assert result.exit_code == 2
+        assert "--jobs" in result.output
+
+
+def test_request_concurrency_sets_the_vendor_limit(monkeypatch):
+    monkeypatch.setattr(base, "load_settings", lambda: SimpleNamespace(VENDOR_CONCURRENCY=8))
+
+    async def get_limit() -> int:
+        return get_request_semaphore()._value
+
+    with request_concurrency(3):
+        assert asyncio.run(get_limit()) == 3
+
+    assert asyncio.run(get_limit()) == 8
+
+
+def test_run_batch_limits_in_flight_requests():
+    num_running = 0
+    max_running = 0
+
+    async def achat(messages, model, max_tokens):
+        nonlocal num_running, max_running
+        num_running += 1
+        max_running = max(max_running, num_running)
+        await asyncio.sleep(0.01)
+        num_running -= 1
+        return SimpleNamespace(content=messages[0].content.upper())
+
+    input_file = io.StringIO(
+        "".join(json.dumps({"id": str(i), "prompt": f"q{i}"}) + "\n" for i in range(10))
+    )
+    output_file = io.StringIO()
+    vendor = SimpleNamespace(achat=achat)
+    summary = asyncio.run(run_batch(input_file, output_file, vendor, "model", 3, {"0"}))
+    results = [json.loads(line) for line in output_file.getvalue().splitlines()]
+    assert sorted(result["output"] for result in results) == sorted(f"Q{i}" for i in range(1, 10))
+    assert (summary.num_ok, summary.num_skipped) == (9, 1)
+    assert max_running == 3
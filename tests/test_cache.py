@@ -0,0 +1,33 @@
+from src.cache import ResponseCache, get_response_cache_key
+from src.schema import ChatMessage, Role
+
+
+def test_cache_key_includes_base_url():
+    messages = [ChatMessage(role=Role.User, content="hello")]
+    fake_key = get_response_cache_key("openai", "http://127.0.0.1:8900", "gpt-4o", 1024, messages)
+    real_key = get_response_cache_key("openai", "https://api.openai.com", "gpt-4o", 1024, messages)
+    assert fake_key != real_key
+
+
+def test_reads_are_written_with_the_next_write(tmp_path):
+    response_cache = ResponseCache(tmp_path / "responses.sqlite3", ttl=60, max_bytes=1024)
+    response_cache.set("a", "first")
+    changes = response_cache.conn.total_changes
+    assert response_cache.get("a") == "first"
+    assert response_cache.get("b") is None
+    assert response_cache.conn.total_changes == changes
+
+    counters = response_cache.get_counters()
+    assert counters["hits"] == 1
+    assert counters["misses"] == 1
+    assert response_cache.get_counters()["hits"] == 1
+
+
+def test_recently_read_responses_are_evicted_last(tmp_path):
+    response_cache = ResponseCache(tmp_path / "responses.sqlite3", ttl=60, max_bytes=10)
+    response_cache.set("a", "aaaa")
+    response_cache.set("b", "bbbb")
+    response_cache.get("a")
+    response_cache.set("c", "cccc")
+    assert response_cache.get("a") == "aaaa"
+    assert response_cache.get("b") is None
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+from rich.console import Console
+
+from src import context
+from src.vendors import routing
+from src.vendors.resilience import VendorError
+from src.schema import ChatMessage, ChatMode, ChatState, CommandProposal, Role
+from src.cli.chat.actions import ChatAction, ShellAction
+from src.cli.chat.actions import shell as shell_action
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    settings = SimpleNamespace(MODEL_ROUTES={}, CONTEXT_TOKEN_BUDGET=32_000)
+    monkeypatch.setattr(routing, "load_settings", lambda: settings)
+    monkeypatch.setattr(context, "load_settings", lambda: settings)
+    monkeypatch.setattr(shell_action, "get_system_info", lambda: "Linux")
+    return settings
+
+
+def make_vendor(**methods) -> SimpleNamespace:
+    return SimpleNamespace(
+        MODEL_NAME="Fake",
+        MODEL_OPTIONS={"small": "fake-small"},
+        FAST_MODEL_OPTION="small",
+        **methods,
+    )
+
+
+def make_state(mode: ChatMode) -> ChatState:
+    messages = [
+        ChatMessage(role=Role.User, content="hi"),
+        ChatMessage(role=Role.Asssistant, content="hello"),
+    ]
+    return ChatState(mode=mode, messages=messages, ssh_config=None, task_thread=[], task_slug=None)
+
+
+def test_failed_stream_leaves_no_unanswered_message():
+    def stream_chat(messages, model):
+        assert messages[-1].content == "tell me a story"
+        yield "Once upon "
+        raise VendorError("Anthropic request failed (529)")
+
+    action = ChatAction(Console(), make_vendor(stream_chat=stream_chat), "small")
+    state = make_state(ChatMode.Chat)
+    with pytest.raises(VendorError):
+        action.run("tell me a story", state)
+
+    assert [m.content for m in state.messages] == ["hi", "hello"]
+
+
+def test_answered_chat_is_added_to_history():
+    def stream_chat(messages, model):
+        yield "Once upon "
+        yield "a time"
+
+    action = ChatAction(Console(), make_vendor(stream_chat=stream_chat), "small")
+    state = action.run("tell me a story", make_state(ChatMode.Chat))
+    assert [(m.role, m.content) for m in state.messages[2:]] == [
+        (Role.User, "tell me a story"),
+        (Role.Asssistant, "Once upon a time"),
+    ]
+
+
+def test_failed_command_proposal_leaves_no_unanswered_message():
+    def propose_command(messages, model) -> CommandProposal:
+        assert "list the files" in messages[-1].content
+        raise VendorError("Anthropic request failed (529)")
+
+    action = ShellAction(Console(), make_vendor(propose_command=propose_command), "small")
+    state = make_state(ChatMode.Shell)
+    with pytest.raises(VendorError):
+        action.run("list the files", state)
+
+    assert [m.content for m in state.messages] == ["hi", "hello"]
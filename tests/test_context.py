@@ -0,0 +1,68 @@
+from src.context import (
+    PINNED_MESSAGES,
+    count_message_tokens,
+    count_tokens,
+    fit_context,
+    truncate_message,
+)
+from src.schema import ChatMessage, Role
+
+BUDGET = 4000
+
+
+def make_messages(num_messages: int, num_words: int = 100) -> list[ChatMessage]:
+    return [
+        ChatMessage(
+            role=Role.User if idx % 2 == 0 else Role.Asssistant,
+            content=f"message {idx} " + "word " * num_words,
+        )
+        for idx in range(num_messages)
+    ]
+
+
+def test_messages_under_budget_are_unchanged():
+    messages = make_messages(10)
+    assert fit_context(messages, BUDGET) is messages
+
+
+def test_oldest_messages_are_dropped_with_a_note():
+    messages = make_messages(60)
+    fitted = fit_context(messages, BUDGET)
+    assert count_message_tokens(fitted) <= BUDGET
+    assert fitted[-PINNED_MESSAGES:] == messages[-PINNED_MESSAGES:]
+
+    note, first_kept = fitted[0], fitted[1]
+    num_omitted = messages.index(first_kept)
+    assert note.content.startswith(f"[{num_omitted} earlier messages")
+    assert fitted[1:] == messages[num_omitted:]
+
+
+def test_kept_prefix_only_changes_every_few_turns():
+    messages = make_messages(40)
+    first_kept = []
+    for _ in range(40):
+        fitted = fit_context(messages, BUDGET)
+        assert count_message_tokens(fitted) <= BUDGET
+        first_kept.append(fitted[1])
+        messages.append(ChatMessage(role=Role.User, content="another " + "word " * 100))
+
+    num_changes = sum(1 for a, b in zip(first_kept, first_kept[1:]) if a is not b)
+    # ~100 tokens a message and chunks of ~1000, dropping one a turn would change it 39 times
+    assert 0 < num_changes <= 5
+
+
+def test_huge_recent_messages_are_truncated():
+    messages = make_messages(3) + make_messages(1, num_words=10_000)
+    fitted = fit_context(messages, BUDGET)
+    assert count_message_tokens(fitted) <= BUDGET
+    assert "chars truncated" in fitted[-1].content
+    assert fitted[-1].content.startswith("message 0 word")
+
+
+def test_truncate_message_keeps_head_and_tail():
+    message = ChatMessage(role=Role.User, content="start " + "word " * 1000 + "end")
+    truncated = truncate_message(message, 100)
+    assert count_tokens(truncated.content) <= 100
+    assert truncated.content.startswith("start ")
+    assert truncated.content.endswith(" end")
+    assert truncate_message(truncated, 1000) is truncated
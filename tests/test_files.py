@@ -0,0 +1,103 @@
+import sys
+import codecs
+
+import pytest
+
+from src import files
+from src.files import FileRange, FileReader, detect_encoding, parse_file_location
+
+LINES = [f"line {i}\n" for i in range(1, 3001)]
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("".join(LINES))
+    return path
+
+
+def test_parse_file_location():
+    path, file_range = parse_file_location("app.log:1000-2000")
+    assert path == "app.log"
+    assert (file_range.first_line, file_range.last_line) == (1000, 2000)
+
+    path, file_range = parse_file_location("app.log --tail 500")
+    assert path == "app.log"
+    assert file_range.tail == 500
+
+    path, file_range = parse_file_location("app.bin --bytes 0-4096")
+    assert path == "app.bin"
+    assert (file_range.start_byte, file_range.end_byte) == (0, 4096)
+
+
+def test_reads_line_ranges(log_path):
+    with FileReader(log_path) as reader:
+        # Past the first indexed offset, so the index has to be used
+        excerpt = reader.read(FileRange(first_line=2500, last_line=2502), max_tokens=1000)
+        assert excerpt.text == "".join(LINES[2499:2502])
+        assert excerpt.describe() == "lines 2,500-2,502 of 3,000"
+        assert not excerpt.is_truncated
+
+        excerpt = reader.read(FileRange(first_line=2999), max_tokens=1000)
+        assert excerpt.text == "".join(LINES[2998:])
+        assert excerpt.last_line == 3000
+
+        with pytest.raises(ValueError, match="only has 3,000 lines"):
+            reader.read(FileRange(first_line=3001), max_tokens=1000)
+
+
+def test_line_range_is_cut_to_whole_lines(log_path):
+    with FileReader(log_path) as reader:
+        excerpt = reader.read(FileRange(first_line=1, last_line=1000), max_tokens=20)
+        assert excerpt.is_truncated
+        assert excerpt.text.endswith("\n")
+        assert excerpt.text == "".join(LINES[: excerpt.line_count])
+
+
+def test_reads_tail_and_bytes(log_path):
+    with FileReader(log_path) as reader:
+        excerpt = reader.read(FileRange(tail=2), max_tokens=1000)
+        assert excerpt.text == "line 2999\nline 3000\n"
+
+        excerpt = reader.read(FileRange(start_byte=7, end_byte=21), max_tokens=1000)
+        assert excerpt.text == "line 2\nline 3\n"
+
+
+def test_rejects_binary_files(tmp_path):
+    path = tmp_path / "app.bin"
+    path.write_bytes(b"\x7fELF\x02\x01\x01\x00\x00\x00")
+    with pytest.raises(ValueError, match="looks like a binary file"):
+        FileReader(path)
+
+
+def test_detects_encodings():
+    assert detect_encoding(codecs.BOM_UTF8 + b"hi") == "utf-8-sig"
+    assert detect_encoding("héllo".encode()) == "utf-8"
+    # Cut off in the middle of a character
+    assert detect_encoding("héllo".encode()[:2]) == "utf-8"
+    assert detect_encoding("hi".encode("utf-16")) == "utf-16"
+    assert detect_encoding("hi".encode("utf-32")) == "utf-32"
+
+
+def test_falls_back_to_latin_1_without_charset_normalizer(monkeypatch):
+    monkeypatch.setitem(sys.modules, "charset_normalizer", None)
+    assert detect_encoding("café crème".encode("latin-1")) == "latin-1"
+
+
+def test_rejects_utf_16_with_a_clear_error(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("hello\nworld\n", encoding="utf-16")
+    with pytest.raises(ValueError, match="UTF-16 text, which isn't supported"):
+        FileReader(path)
+
+
+def test_line_index_is_rebuilt_when_file_changes(log_path, monkeypatch):
+    monkeypatch.setattr(files, "_line_indexes", {})
+    with FileReader(log_path) as reader:
+        assert reader.read(FileRange(first_line=3000), max_tokens=100).text == LINES[-1]
+
+    log_path.write_text("".join(LINES) + "line 3001\n")
+    with FileReader(log_path) as reader:
+        excerpt = reader.read(FileRange(first_line=3001), max_tokens=100)
+        assert excerpt.text == "line 3001\n"
+        assert excerpt.num_lines == 3001
@@ -0,0 +1,108 @@
+from io import BytesIO
+
+import pytest
+from rich.console import Console
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from src import pdf
+from src.cli.chat.actions import ReadFileAction
+from src.cli.chat.actions import read_file
+from src.pdf import extract_pdf_text, iter_pdf_pages, parse_page_selector, select_pages
+
+NUM_PAGES = 20
+
+
+def make_pdf(num_pages: int) -> bytes:
+    writer = PdfWriter()
+    font = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+    for idx in range(num_pages):
+        page = writer.add_blank_page(200, 200)
+        contents = DecodedStreamObject()
+        contents.set_data(f"BT /F1 12 Tf 20 100 Td (Page {idx + 1}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(contents)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+@pytest.fixture(scope="module")
+def pdf_bytes() -> bytes:
+    return make_pdf(NUM_PAGES)
+
+
+def test_parse_page_selector():
+    assert parse_page_selector("1-3, 7,30-") == [(1, 3), (7, 7), (30, None)]
+    for selector in ("0", "5-2", "a-b"):
+        with pytest.raises(ValueError):
+            parse_page_selector(selector)
+
+
+def test_select_pages():
+    assert select_pages(None, 3) == [0, 1, 2]
+    assert select_pages("2-3,1,9-", 10) == [0, 1, 2, 8, 9]
+    with pytest.raises(ValueError, match="No pages match"):
+        select_pages("5-", 3)
+
+
+def test_extracts_pages_in_order(pdf_bytes):
+    assert extract_pdf_text(pdf_bytes, "2-3") == "Page 2\n\nPage 3"
+
+
+def test_worker_processes_are_not_forked():
+    assert pdf.get_mp_context().get_start_method() != "fork"
+
+
+def test_parallel_extraction_matches_serial(pdf_bytes, tmp_path, monkeypatch):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(pdf_bytes)
+    page_idxs = list(range(NUM_PAGES))
+    serial = list(iter_pdf_pages(path, page_idxs, max_workers=1))
+    assert serial == [(idx, f"Page {idx + 1}") for idx in page_idxs]
+    assert list(iter_pdf_pages(path, page_idxs, max_workers=2)) == serial
+
+    # Documents in memory are handed to the workers through a temporary file
+    tmp_dir = tmp_path / "tmp"
+    tmp_dir.mkdir()
+    monkeypatch.setattr(pdf.tempfile, "tempdir", str(tmp_dir))
+    assert list(iter_pdf_pages(pdf_bytes, page_idxs, max_workers=2)) == serial
+    assert list(tmp_dir.iterdir()) == []
+
+
+def test_read_pdf_action_joins_pages_once(pdf_bytes, tmp_path, monkeypatch):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(pdf_bytes)
+    previews = []
+    action = ReadFileAction(Console())
+    monkeypatch.setattr(action, "print_preview", lambda path, text: previews.append(text))
+    monkeypatch.setattr(pdf, "PARALLEL_MIN_PAGES", NUM_PAGES + 1)
+    monkeypatch.setattr(read_file, "PREVIEW_CHARS", 20)
+    text = action.read_pdf(str(path), "1-5")
+    assert text == "\n\n".join(f"Page {idx}" for idx in range(1, 6))
+    # Shown as soon as there's enough to preview, once
+    assert previews == ["Page 1\n\nPage 2\n\nPage 3\n\nPage 4"]
+
+
+def test_read_pdf_action_with_no_pages(tmp_path, monkeypatch):
+    path = tmp_path / "empty.pdf"
+    writer = PdfWriter()
+    with open(path, "wb") as f:
+        writer.write(f)
+
+    previews = []
+    action = ReadFileAction(Console())
+    monkeypatch.setattr(action, "print_preview", lambda path, text: previews.append(text))
+    assert action.read_pdf(str(path), None) == ""
+    assert previews == [""]
@@ -0,0 +1,185 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src import vendors
+from src.vendors import resilience
+from src.vendors.resilience import resilient, VendorError
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code: int | None, headers: dict | None = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = None if headers is None else SimpleNamespace(headers=headers)
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = SimpleNamespace(
+        VENDOR_MAX_RETRIES=3,
+        VENDOR_HEDGING=False,
+        VENDOR_FAILOVER=True,
+        ANTHROPIC_API_KEY="anthropic-key",
+        OPENAI_API_KEY=None,
+    )
+    monkeypatch.setattr(resilience, "load_settings", lambda: settings)
+    monkeypatch.setattr(resilience, "get_hedge_delay", lambda model: None)
+    return settings
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(resilience.time, "sleep", sleeps.append)
+    # The longest delay full jitter allows
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    return sleeps
+
+
+def make_flaky(errors: list[Exception]):
+    calls = []
+
+    @resilient("anthropic", FakeAPIError)
+    def answer_query(prompt: str, model: str) -> str:
+        calls.append(model)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+
+        return f"answer from {model}"
+
+    return answer_query, calls
+
+
+def test_retries_retryable_errors(settings, sleeps):
+    answer_query, calls = make_flaky([FakeAPIError(529), FakeAPIError(None)])
+    assert answer_query("hi", "claude") == "answer from claude"
+    assert len(calls) == 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_does_not_retry_client_errors(settings, sleeps):
+    answer_query, calls = make_flaky([FakeAPIError(400)])
+    with pytest.raises(VendorError, match=r"\(400\)"):
+        answer_query("hi", "claude")
+
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+def test_gives_up_after_max_retries(settings, sleeps):
+    answer_query, calls = make_flaky([FakeAPIError(503)] * 10)
+    with pytest.raises(VendorError):
+        answer_query("hi", "claude")
+
+    assert len(calls) == settings.VENDOR_MAX_RETRIES + 1
+
+
+def test_backoff_schedule(settings, sleeps):
+    settings.VENDOR_MAX_RETRIES = 10
+    error = FakeAPIError(429)
+    delays = [resilience.get_retry_delay(error, attempt) for attempt in range(7)]
+    assert delays == [0.5, 1.0, 2.0, 4.0, 8.0, 8.0, 8.0]
+
+
+def test_backoff_waits_for_retry_after(settings, monkeypatch):
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: low)
+    assert resilience.get_retry_delay(FakeAPIError(429, {"retry-after": "3"}), 0) == 3.0
+    assert resilience.get_retry_delay(FakeAPIError(429, {"retry-after-ms": "250"}), 0) == 0.25
+    # Longer than it's worth waiting for
+    assert resilience.get_retry_delay(FakeAPIError(429, {"retry-after": "600"}), 0) is None
+
+
+def test_hedge_fires_after_delay():
+    calls = []
+
+    def answer_query(prompt: str, model: str) -> str:
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            time.sleep(2)
+            return "slow"
+
+        return "fast"
+
+    start_time = time.perf_counter()
+    assert (
+        resilience.run_hedged(answer_query, ("hi", "claude"), {}, 0.1, "anthropic", "claude")
+        == "fast"
+    )
+    assert len(calls) == 2
+    assert calls[1] - start_time >= 0.1
+    assert time.perf_counter() - start_time < 1
+
+
+def test_no_hedge_when_first_call_is_quick():
+    calls = []
+
+    def answer_query(prompt: str, model: str) -> str:
+        calls.append(model)
+        return "quick"
+
+    assert (
+        resilience.run_hedged(answer_query, ("hi", "claude"), {}, 1, "anthropic", "claude")
+        == "quick"
+    )
+    assert len(calls) == 1
+
+
+def test_async_hedge_cancels_slower_request():
+    is_cancelled = []
+
+    async def achat(messages: list, model: str) -> str:
+        if not is_cancelled:
+            is_cancelled.append(False)
+            try:
+                await asyncio.sleep(2)
+            except asyncio.CancelledError:
+                is_cancelled[0] = True
+                raise
+
+        return "fast"
+
+    async def run():
+        result = await resilience.arun_hedged(
+            achat, ([], "claude"), {}, 0.05, "anthropic", "claude"
+        )
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "fast"
+    assert is_cancelled == [True]
+
+
+def test_fails_over_to_other_vendor(settings, sleeps, monkeypatch):
+    settings.OPENAI_API_KEY = "openai-key"
+    answer_query, calls = make_flaky([FakeAPIError(529)] * 10)
+    fallback_calls = []
+
+    def openai_answer_query(prompt: str, model: str) -> str:
+        fallback_calls.append(model)
+        return f"answer from {model}"
+
+    anthropic = SimpleNamespace(
+        MODEL_OPTIONS={"sonnet": "claude-sonnet", "haiku": "claude-haiku"},
+        MODEL_CLASSES={"sonnet": "strong", "haiku": "fast"},
+        DEFAULT_MODEL_OPTION="haiku",
+    )
+    openai = SimpleNamespace(
+        MODEL_OPTIONS={"4o": "gpt-4o", "4o-mini": "gpt-4o-mini"},
+        MODEL_CLASSES={"4o": "strong", "4o-mini": "fast"},
+        DEFAULT_MODEL_OPTION="4o",
+        answer_query=openai_answer_query,
+    )
+    monkeypatch.setattr(vendors, "anthropic", anthropic, raising=False)
+    monkeypatch.setattr(vendors, "openai", openai, raising=False)
+    assert answer_query("hi", "claude-haiku") == "answer from gpt-4o-mini"
+    assert len(calls) == settings.VENDOR_MAX_RETRIES + 1
+    assert fallback_calls == ["gpt-4o-mini"]
+
+
+def test_no_failover_without_other_key(settings, sleeps):
+    answer_query, calls = make_flaky([FakeAPIError(529)] * 10)
+    with pytest.raises(VendorError, match="Anthropic request failed"):
+        answer_query("hi", "claude-haiku")
@@ -0,0 +1,92 @@
+import json
+
+from src.vendors import router as router_module
+from src.vendors.router import VendorRouter, MIN_CALLS
+
+CATALOGS = {
+    "anthropic": {
+        "default_option": "haiku",
+        "options": {"haiku": "claude-haiku"},
+        "classes": {"haiku": "fast"},
+    },
+    "openai": {
+        "default_option": "4o",
+        "options": {"4o": "gpt-4o", "4o-mini": "gpt-4o-mini", "3.5": "gpt-3.5"},
+        "classes": {"4o": "strong", "4o-mini": "fast", "3.5": "fast"},
+    },
+}
+
+
+def make_router(tmp_path, pairs: dict) -> VendorRouter:
+    path = tmp_path / "router.json"
+    data = {
+        "catalogs": CATALOGS,
+        "pairs": {
+            key: {"vendor": key.split("/")[0], "model": key.split("/")[1], **pair}
+            for key, pair in pairs.items()
+        },
+    }
+    path.write_text(json.dumps(data))
+    return VendorRouter(path)
+
+
+def healthy(updated_at: float) -> dict:
+    return {"ttft_ms": 500.0, "num_calls": MIN_CALLS, "updated_at": updated_at}
+
+
+def test_explore_picks_pair_heard_from_least_recently(tmp_path, monkeypatch):
+    router = make_router(
+        tmp_path,
+        {
+            "anthropic/claude-haiku": healthy(300.0),
+            "openai/gpt-4o-mini": healthy(200.0),
+            "openai/gpt-3.5": healthy(100.0),
+        },
+    )
+    monkeypatch.setattr(router_module.random, "random", lambda: 0.0)
+    assert router.select(["anthropic", "openai"]) == ("openai", "3.5")
+    assert router.last_decision["reason"] == "explore"
+
+
+def test_explore_prefers_pair_without_enough_calls(tmp_path, monkeypatch):
+    router = make_router(
+        tmp_path,
+        {
+            "anthropic/claude-haiku": healthy(300.0),
+            "openai/gpt-4o-mini": {**healthy(200.0), "num_calls": MIN_CALLS - 1},
+            "openai/gpt-3.5": healthy(100.0),
+        },
+    )
+    monkeypatch.setattr(router_module.random, "random", lambda: 0.0)
+    assert router.select(["anthropic", "openai"]) == ("openai", "4o-mini")
+
+
+def test_select_keeps_default_unless_another_is_clearly_better(tmp_path, monkeypatch):
+    router = make_router(
+        tmp_path,
+        {
+            "anthropic/claude-haiku": healthy(300.0),
+            "openai/gpt-4o-mini": {**healthy(300.0), "ttft_ms": 450.0},
+            "openai/gpt-3.5": {**healthy(300.0), "ttft_ms": 100.0},
+        },
+    )
+    monkeypatch.setattr(router_module.random, "random", lambda: 1.0)
+    assert router.select(["anthropic", "openai"]) == ("openai", "3.5")
+    assert router.last_decision["reason"] == "healthier"
+
+
+def test_vendor_health_survives_stale_router_file(tmp_path, monkeypatch):
+    from src.cli import stats
+
+    path = tmp_path / "router.json"
+    data = {
+        # No classes, and no catalog at all for openai
+        "catalogs": {"anthropic": {"options": {"haiku": "claude-haiku"}}},
+        "pairs": {
+            "anthropic/claude-haiku": {"vendor": "anthropic", "model": "claude-haiku"},
+            "openai/gpt-4o": {"vendor": "openai", "model": "gpt-4o"},
+        },
+    }
+    path.write_text(json.dumps(data))
+    monkeypatch.setattr(router_module, "ROUTER_FILE", path)
+    stats.print_vendor_health()
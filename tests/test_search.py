@@ -0,0 +1,84 @@
+import os
+
+from src import search
+from src.search import SearchIndex, chunk_text
+
+
+def index_texts(search_index: SearchIndex, texts: dict[str, str]):
+    search_index.write_files(
+        [
+            {
+                "path": path,
+                "mtime_ns": 1,
+                "size": len(text),
+                "content_hash": path,
+                "chunks": chunk_text(text),
+            }
+            for path, text in texts.items()
+        ]
+    )
+
+
+def test_chunk_text_only_splits_on_newlines():
+    text = "page one\x0cpage two\r\nsame line\x85too\nlast\n"
+    assert chunk_text(text) == [(1, 3, "page one\x0cpage two\nsame line\x85too\nlast")]
+
+
+def test_chunk_text_line_numbers(monkeypatch):
+    monkeypatch.setattr(search, "CHUNK_MAX_LINES", 3)
+    text = "".join(f"line {i}\n" for i in range(1, 8))
+    assert chunk_text(text) == [
+        (1, 3, "line 1\nline 2\nline 3"),
+        (4, 6, "line 4\nline 5\nline 6"),
+        (7, 7, "line 7"),
+    ]
+
+
+def test_chunk_text_splits_on_size_and_drops_blank_chunks(monkeypatch):
+    monkeypatch.setattr(search, "CHUNK_MAX_CHARS", 10)
+    assert chunk_text("aaaaaa\nbbbbbb\n\n\n") == [(1, 1, "aaaaaa"), (2, 4, "bbbbbb\n\n")]
+    assert chunk_text("\n\n\n") == []
+    # Long lines are cut off
+    assert chunk_text("x" * 25) == [(1, 1, "x" * 10)]
+
+
+def test_search_ranks_better_matches_first(tmp_path):
+    search_index = SearchIndex(tmp_path / "index.sqlite3")
+    index_texts(
+        search_index,
+        {
+            "/notes/ffmpeg.md": "convert webm to gif with ffmpeg\nffmpeg -i in.webm out.gif\n",
+            "/notes/disk.md": "check free disk space with df -h\n",
+            "/notes/misc.md": "ffmpeg is installed with brew\nremember to buy milk\n",
+        },
+    )
+    results = search_index.search("ffmpeg webm gif", limit=10)
+    assert [result.path for result in results] == ["/notes/ffmpeg.md", "/notes/misc.md"]
+    assert results[0].score > results[1].score
+    assert results[0].location == "/notes/ffmpeg.md:1-2"
+    # Stemmed by the porter tokenizer
+    assert [result.path for result in search_index.search("converting", limit=10)] == [
+        "/notes/ffmpeg.md"
+    ]
+    # FTS5 syntax in a query is searched for as words
+    assert search_index.search('NEAR("df" AND', limit=10)[0].path == "/notes/disk.md"
+
+
+def test_removed_files_are_not_found(tmp_path):
+    search_index = SearchIndex(tmp_path / "index.sqlite3")
+    index_texts(search_index, {"/notes/a.md": "alpha\n", "/notes/b.md": "alpha beta\n"})
+    search_index.remove_files(["/notes/a.md"])
+    assert [result.path for result in search_index.search("alpha", limit=10)] == ["/notes/b.md"]
+    assert search_index.get_stats() == {"files": 1, "chunks": 1}
+
+
+def test_get_files_under_root(tmp_path):
+    search_index = SearchIndex(tmp_path / "index.sqlite3")
+    paths = [
+        os.path.join(os.sep, "notes", "a.md"),
+        os.path.join(os.sep, "notes", "sub", "b.md"),
+        os.path.join(os.sep, "notes2", "c.md"),
+    ]
+    index_texts(search_index, {path: "text\n" for path in paths})
+    assert set(search_index.get_files(os.path.join(os.sep, "notes"))) == set(paths[:2])
+    assert set(search_index.get_files(os.sep)) == set(paths)
@@ -0,0 +1,171 @@
+import json
+
+import pytest
+
+from src import sessions
+from src.schema import ChatMessage, ChatMode, ChatState, Role, SshConfig
+from src.sessions import (
+    new_session,
+    replay_session,
+    resume_session,
+    compress_old_sessions,
+    COMPACT_MIN_EXTRA_EVENTS,
+)
+
+
+@pytest.fixture(autouse=True)
+def sessions_dir(tmp_path, monkeypatch):
+    sessions_dir = tmp_path / "sessions"
+    monkeypatch.setattr(sessions, "SESSIONS_DIR", sessions_dir)
+    return sessions_dir
+
+
+def make_state() -> ChatState:
+    return ChatState(
+        mode=ChatMode.Chat, messages=[], ssh_config=None, task_thread=[], task_slug=None
+    )
+
+
+def chat(state: ChatState, text: str):
+    state.messages.append(ChatMessage(role=Role.User, content=text))
+    state.messages.append(ChatMessage(role=Role.Asssistant, content=text.upper()))
+
+
+def test_replay_rebuilds_recorded_state():
+    log = new_session("Claude", "haiku")
+    state = make_state()
+    chat(state, "hello")
+    log.record(state)
+    state.mode = ChatMode.Ssh
+    state.ssh_config = SshConfig(host="example.com", username="me")
+    chat(state, "uptime")
+    log.record(state)
+    # Replaced, eg. by \clear
+    state.messages = [ChatMessage(role=Role.User, content="summary")]
+    log.record(state)
+    chat(state, "after")
+    log.record(state)
+    log.close()
+
+    replayed, header, num_events = replay_session(log.path)
+    assert replayed.messages == state.messages
+    assert replayed.mode == ChatMode.Ssh
+    assert replayed.ssh_config == state.ssh_config
+    assert header["vendor"] == "Claude"
+    assert header["model"] == "haiku"
+    # start, 2 messages, mode, ssh, 2 messages, snapshot, 2 messages
+    assert num_events == 10
+
+
+def test_unchanged_state_writes_nothing():
+    log = new_session("Claude", "haiku")
+    state = make_state()
+    log.record(state)
+    assert not log.path.exists()
+
+    chat(state, "hello")
+    log.record(state)
+    size = log.path.stat().st_size
+    log.record(state)
+    log.close()
+    assert log.path.stat().st_size == size
+
+
+def test_replay_skips_a_line_cut_short():
+    log = new_session("Claude", "haiku")
+    state = make_state()
+    chat(state, "hello")
+    log.record(state)
+    log.close()
+    with open(log.path, "a") as f:
+        f.write('{"t": 1, "type": "message", "role": "us')
+
+    replayed, _, _ = replay_session(log.path)
+    assert replayed.messages == state.messages
+
+
+def test_resume_drops_the_ssh_connection():
+    log = new_session("Claude", "haiku")
+    state = make_state()
+    state.mode = ChatMode.Ssh
+    state.ssh_config = SshConfig(host="example.com", username="me")
+    chat(state, "uptime")
+    log.record(state)
+    log.close()
+
+    resumed, resumed_log = resume_session(log.session_id)
+    assert resumed.mode == ChatMode.Chat
+    assert resumed.ssh_config is None
+    assert resumed.messages == state.messages
+
+    chat(resumed, "more")
+    resumed_log.record(resumed)
+    resumed_log.close()
+    replayed, _, _ = replay_session(log.path)
+    assert replayed.messages == resumed.messages
+
+
+def test_resume_latest_appends_to_the_same_log():
+    first = new_session("Claude", "haiku")
+    state = make_state()
+    chat(state, "first")
+    first.record(state)
+    first.close()
+
+    resumed, log = resume_session(sessions.LATEST_SESSION)
+    assert log.path == first.path
+    chat(resumed, "again")
+    log.record(resumed)
+    log.close()
+    assert [event["type"] for event in map(json.loads, open(first.path))] == ["start"] + [
+        "message"
+    ] * 4
+
+
+def test_resume_without_logging_leaves_the_log_alone(sessions_dir):
+    log = new_session("Claude", "haiku")
+    state = make_state()
+    chat(state, "hello")
+    log.record(state)
+    log.close()
+    assert compress_old_sessions(0) == 1
+    gz_path = sessions_dir / f"{log.session_id}.jsonl.gz"
+    data = gz_path.read_bytes()
+
+    resumed, _ = resume_session(log.session_id, is_logged=False)
+    assert resumed.messages == state.messages
+    assert list(sessions_dir.iterdir()) == [gz_path]
+    assert gz_path.read_bytes() == data
+
+
+def test_resume_compacts_long_logs():
+    log = new_session("Claude", "haiku")
+    state = make_state()
+    for idx in range(COMPACT_MIN_EXTRA_EVENTS + 1):
+        state.mode = ChatMode.Shell if idx % 2 == 0 else ChatMode.Chat
+        log.record(state)
+
+    chat(state, "hello")
+    log.record(state)
+    log.close()
+
+    resumed, _ = resume_session(log.session_id)
+    assert resumed.messages == state.messages
+    assert resumed.mode == ChatMode.Shell
+    # start, snapshot and mode
+    assert len(log.path.read_text().splitlines()) == 3
+
+
+def test_resume_decompresses_old_logs(sessions_dir):
+    log = new_session("Claude", "haiku")
+    state = make_state()
+    chat(state, "hello")
+    log.record(state)
+    log.close()
+    assert compress_old_sessions(0) == 1
+    assert not log.path.exists()
+
+    resumed, resumed_log = resume_session(log.session_id)
+    assert resumed.messages == state.messages
+    assert list(sessions_dir.iterdir()) == [log.path]
+    assert resumed_log.path == log.path
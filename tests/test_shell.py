@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from src import shell
+from src.shell import OutputBuffer, run_command
+
+
+def test_output_buffer_keeps_everything_under_limits():
+    buffer = OutputBuffer(max_bytes=100, max_lines=10)
+    for i in range(5):
+        buffer.add(f"line {i}\n".encode())
+
+    assert buffer.num_omitted_bytes == 0
+    assert buffer.get_text() == "".join(f"line {i}\n" for i in range(5))
+
+
+def test_output_buffer_keeps_head_and_tail_lines():
+    buffer = OutputBuffer(max_bytes=10_000, max_lines=4)
+    for i in range(100):
+        buffer.add(f"{i}\n".encode())
+
+    assert buffer.num_lines == 100
+    assert buffer.get_text() == "0\n1\n\n[... 96 lines, 280 bytes truncated ...]\n98\n99\n"
+
+
+def test_output_buffer_keeps_head_and_tail_bytes():
+    buffer = OutputBuffer(max_bytes=20, max_lines=1000)
+    for i in range(100):
+        buffer.add(f"{i:04}\n".encode())
+
+    text = buffer.get_text()
+    assert text.startswith("0000\n0001\n\n[... 96 lines, 480 bytes truncated ...]\n")
+    assert text.endswith("\n0098\n0099\n")
+    assert buffer.num_bytes == 500
+
+
+def test_output_buffer_trims_long_tail_line():
+    buffer = OutputBuffer(max_bytes=10, max_lines=10)
+    buffer.add(b"a" * 100)
+    assert buffer.get_text().endswith("\n" + "a" * 5)
+    assert buffer.num_omitted_bytes == 95
+
+
+def is_running(pid: int) -> bool:
+    stat_path = Path(f"/proc/{pid}/stat")
+    if Path("/proc").exists():
+        # Killed processes nobody has reaped yet are zombies, not running
+        return stat_path.exists() and stat_path.read_text().split()[2] != "Z"
+
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="process groups are POSIX only")
+@pytest.mark.parametrize(
+    "command",
+    [
+        # Nothing exits on SIGTERM
+        """sh -c 'trap "" TERM; sleep 100 & echo $!; wait'""",
+        # The shell exits on SIGTERM but leaves the sleep behind
+        """sh -c '(trap "" TERM; exec sleep 100) & echo $!; wait'""",
+    ],
+)
+def test_timeout_kills_process_tree(monkeypatch, command):
+    monkeypatch.setattr(shell, "KILL_GRACE", 0.5)
+    result = run_command(command, timeout=0.5, max_bytes=1000, max_lines=10)
+    assert result.is_timed_out
+    pid = int(result.stdout.get_text())
+    # SIGKILL is delivered asynchronously
+    deadline = time.perf_counter() + 1
+    while is_running(pid) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+    assert not is_running(pid)
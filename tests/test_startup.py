@@ -0,0 +1,70 @@
+"""
+Cold start regression tests for the default `ask <question>` command.
+Each check runs in a fresh interpreter so that nothing is already imported.
+"""
+
+import os
+import sys
+import json
+import subprocess as sp
+from pathlib import Path
+
+REPO_DIR = Path(__file__).parent.parent
+
+# Seconds allowed to import the CLI and resolve the default command.
+STARTUP_BUDGET = float(os.getenv("ASK_STARTUP_BUDGET", "1.0"))
+
+HEAVY_MODULES = [
+    "paramiko",
+    "trafilatura",
+    "bs4",
+    "html5lib",
+    "pypdf",
+    "psutil",
+    "jsonschema",
+    "prompt_toolkit",
+    "openai",
+    "anthropic",
+]
+
+RESOLVE_DEFAULT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+from src.cli import cli
+ctx = cli.make_context("ask", ["how", "do", "I", "flatten", "a", "list"])
+cli.get_command(ctx, cli.default_command)
+elapsed = time.perf_counter() - start
+{extra}
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def run_startup_script(extra: str = "") -> dict:
+    result = sp.run(
+        [sys.executable, "-c", RESOLVE_DEFAULT_SCRIPT.format(extra=extra)],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def test_default_command_cold_start_within_budget():
+    result = run_startup_script()
+    assert result["elapsed"] < STARTUP_BUDGET, (
+        f"Resolving the default command took {result['elapsed']:.3f}s "
+        f"(budget {STARTUP_BUDGET:.3f}s)"
+    )
+
+
+def test_default_command_skips_heavy_imports():
+    result = run_startup_script()
+    imported = [m for m in HEAVY_MODULES if m in result["modules"]]
+    assert not imported, f"Heavy modules imported on cold start: {imported}"
+
+
+def test_only_selected_vendor_is_imported():
+    result = run_startup_script(extra="from src import vendors; vendors.anthropic")
+    assert "anthropic" in result["modules"]
+    assert "openai" not in result["modules"]
@@ -0,0 +1,25 @@
+import random
+
+from src.cli.stream import TextTail
+
+
+def test_text_tail_keeps_last_lines():
+    tail = TextTail(3)
+    for delta in ["one\ntw", "o\n", "", "three\nfour", " and more\nfi"]:
+        tail.add(delta)
+
+    assert tail.get_text() == "three\nfour and more\nfi"
+    tail.add("ve\n")
+    assert tail.get_text() == "three\nfour and more\nfive"
+
+
+def test_text_tail_matches_splitting_the_whole_text():
+    rng = random.Random(0)
+    text = "".join(rng.choice(["word ", "x", "\n", "\n\n", "- item\n"]) for _ in range(2000))
+    tail = TextTail(5)
+    idx = 0
+    while idx < len(text):
+        size = rng.randint(1, 12)
+        tail.add(text[idx : idx + size])
+        idx += size
+        assert tail.get_text() == "\n".join(text[:idx].splitlines()[-5:])
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from src import usage
+from src.usage import CallRecord, UsageStore, current_action, current_route, percentile
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def usage_store(tmp_path, monkeypatch):
+    usage_store = UsageStore(tmp_path / "usage.sqlite3")
+    monkeypatch.setattr(usage, "get_usage_store", lambda: usage_store)
+    return usage_store
+
+
+def add_call(
+    usage_store: UsageStore,
+    model: str,
+    started_at: float,
+    wall_ms: float = 1000.0,
+    is_error: bool = False,
+):
+    call = CallRecord("anthropic", model)
+    call.started_at = started_at
+    call.set_usage(input_tokens=100, output_tokens=10)
+    call.wall_ms = wall_ms
+    call.ttfb_ms = wall_ms / 2
+    call.is_error = is_error
+    usage_store.add(call)
+
+
+def test_percentile_is_nearest_rank():
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 95) == 5.0
+    assert percentile(values, 0) == 1.0
+    assert percentile([7.0], 95) == 7.0
+    assert percentile([], 50) is None
+
+
+def test_summarize_usage_groups_calls(usage_store):
+    now = time.time()
+    with current_action("ChatAction"):
+        add_call(usage_store, "claude-haiku", now - 10, wall_ms=100)
+        with current_route("compression"):
+            add_call(usage_store, "claude-haiku", now - 5, wall_ms=300, is_error=True)
+
+    add_call(usage_store, "claude-sonnet", now - 1, wall_ms=200)
+    # Before the time range
+    add_call(usage_store, "claude-sonnet", now - 2 * DAY)
+
+    summaries = {summary.group: summary for summary in usage.summarize_usage("model", now - DAY)}
+    assert set(summaries) == {"claude-haiku", "claude-sonnet"}
+    haiku = summaries["claude-haiku"]
+    assert (haiku.num_calls, haiku.num_errors) == (2, 1)
+    assert (haiku.input_tokens, haiku.output_tokens) == (200, 20)
+    assert haiku.wall_ms == [100, 300]
+    assert haiku.ttfb_ms == [50, 150]
+
+    summaries = {summary.group: summary for summary in usage.summarize_usage("action", now - DAY)}
+    assert {group: summary.num_calls for group, summary in summaries.items()} == {
+        "ChatAction": 2,
+        usage.NO_ACTION: 1,
+    }
+
+    summaries = {summary.group: summary for summary in usage.summarize_usage("route", now - DAY)}
+    assert {group: summary.num_calls for group, summary in summaries.items()} == {
+        usage.NO_ACTION: 2,
+        "compression": 1,
+    }
+
+    summaries = usage.summarize_usage("day", now - 3 * DAY)
+    assert sum(summary.num_calls for summary in summaries) == 4
+    assert time.strftime("%Y-%m-%d", time.localtime(now)) in {s.group for s in summaries}
+
+
+def test_summarize_usage_without_tracking(monkeypatch):
+    monkeypatch.setattr(usage, "get_usage_store", lambda: None)
+    assert usage.summarize_usage("model", 0) == []
+
+
+def test_prune_deletes_old_calls(usage_store):
+    now = time.time()
+    add_call(usage_store, "claude-haiku", now - 40 * DAY)
+    add_call(usage_store, "claude-haiku", now - 31 * DAY)
+    add_call(usage_store, "claude-haiku", now - DAY)
+    assert usage_store.prune(now - 30 * DAY) == 2
+    assert len(usage_store.get_calls(0)) == 1
+    assert usage_store.prune(now - 30 * DAY) == 0
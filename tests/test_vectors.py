@@ -0,0 +1,77 @@
+import numpy as np
+
+from src.embeddings import HashingEmbedder
+from src.vectors import VectorStore, NPY_HEADER_BYTES, get_chunk_key
+
+TEXTS = [
+    "how to flatten a list in python",
+    "convert a webm video to a gif with ffmpeg",
+    "check free disk space on linux",
+    "restaurants in melbourne",
+]
+
+
+def make_store(tmp_path, embedder: HashingEmbedder) -> VectorStore:
+    store = VectorStore(tmp_path / "vectors", embedder.dimensions)
+    items = [
+        (get_chunk_key("notes.md", idx + 1, idx + 1, text), "notes.md", idx + 1, idx + 1, text)
+        for idx, text in enumerate(TEXTS)
+    ]
+    store.append(embedder.embed(TEXTS), items)
+    return store
+
+
+def test_append_writes_a_valid_npy_file(tmp_path):
+    embedder = HashingEmbedder(dimensions=64)
+    store = make_store(tmp_path, embedder)
+    assert store.get_num_rows() == len(TEXTS)
+    matrix = np.load(store.path)
+    assert matrix.shape == (len(TEXTS), 64)
+    assert np.allclose(matrix, embedder.embed(TEXTS))
+
+
+def test_search_ranks_closest_chunk_first(tmp_path):
+    embedder = HashingEmbedder(dimensions=64)
+    store = make_store(tmp_path, embedder)
+    results = store.search(embedder.embed(["ffmpeg webm to gif"])[0], limit=2)
+    assert len(results) == 2
+    assert results[0].text == TEXTS[1]
+    assert results[0].location == "notes.md:2-2"
+    assert results[0].score >= results[1].score
+
+
+def test_search_skips_deleted_chunks(tmp_path):
+    embedder = HashingEmbedder(dimensions=64)
+    store = make_store(tmp_path, embedder)
+    store.delete([get_chunk_key("notes.md", 2, 2, TEXTS[1])])
+    results = store.search(embedder.embed(["ffmpeg webm to gif"])[0], limit=10)
+    assert sorted(result.text for result in results) == sorted(TEXTS[:1] + TEXTS[2:])
+
+
+def test_compact_drops_deleted_rows_once_they_outnumber_live_ones(tmp_path):
+    embedder = HashingEmbedder(dimensions=64)
+    store = make_store(tmp_path, embedder)
+    store.delete([get_chunk_key("notes.md", 1, 1, TEXTS[0])])
+    assert not store.compact()
+    assert store.get_num_rows() == len(TEXTS)
+
+    store.delete([get_chunk_key("notes.md", idx + 1, idx + 1, TEXTS[idx]) for idx in (1, 2)])
+    assert store.compact()
+    assert store.get_num_rows() == 1
+    assert store.get_keys() == {get_chunk_key("notes.md", 4, 4, TEXTS[3])}
+    results = store.search(embedder.embed([TEXTS[3]])[0], limit=5)
+    assert [result.text for result in results] == [TEXTS[3]]
+    assert np.allclose(np.load(store.path), embedder.embed([TEXTS[3]]))
+
+
+def test_append_drops_rows_left_by_an_interrupted_append(tmp_path):
+    embedder = HashingEmbedder(dimensions=64)
+    store = make_store(tmp_path, embedder)
+    # Vectors written but the header never updated
+    with open(store.path, "ab") as f:
+        f.write(np.ones((2, 64), dtype=np.float32).tobytes())
+
+    store.append(embedder.embed(["one more"]), [("key", "notes.md", 9, 9, "one more")])
+    assert store.get_num_rows() == len(TEXTS) + 1
+    assert store.path.stat().st_size == NPY_HEADER_BYTES + (len(TEXTS) + 1) * 64 * 4
+    assert np.load(store.path).shape == (len(TEXTS) + 1, 64)
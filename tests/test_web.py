@@ -0,0 +1,16 @@
+from src.web import sniff_content_kind
+
+
+def test_sniff_trusts_the_content_type_header():
+    assert sniff_content_kind("text/html; charset=utf-8", b"hello") == "html"
+    assert sniff_content_kind("application/pdf", b"\x00\x01binary") == "pdf"
+    assert sniff_content_kind("text/markdown", b"# Title") == "text"
+    assert sniff_content_kind("application/octet-stream", b"plain words") == "text"
+    assert sniff_content_kind("application/octet-stream", b"\x89PNG\x00\x00") is None
+
+
+def test_sniff_first_bytes_win_over_the_header():
+    assert sniff_content_kind("text/html", b"%PDF-1.7\n...") == "pdf"
+    error_page = b"\n  <!DOCTYPE html><html><body>404 Not Found</body></html>"
+    assert sniff_content_kind("application/pdf", error_page) == "html"
+    assert sniff_content_kind("text/plain", b"<html><p>hi</p></html>") == "html"